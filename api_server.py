@@ -0,0 +1,173 @@
+# api_server.py - Headless HTTP job API for the analysis pipeline
+"""Submit MRI images to the four-agent pipeline over HTTP.
+
+Usage:
+    python api_server.py [--host 127.0.0.1] [--port 8600] [--stub-llm]
+
+Endpoints:
+    POST /jobs                  body = raw image or NIfTI volume bytes (?filename=scan.png optional)
+    GET  /jobs/<id>?wait=30     job status; `wait` long-polls until the job finishes
+    GET  /jobs/<id>/results     per-agent results
+    GET  /jobs/<id>/report      final report (text/plain)
+    GET  /jobs/<id>/trace       spans of the job (agents, tools, LLM, Neo4j)
+    GET  /metrics               queue depth, running jobs and per-stage latency
+    GET  /metrics/prometheus    span histograms and LLM tokens (Prometheus text format)
+    GET  /healthz               liveness
+    GET  /readyz                readiness: 503 until the warm-up (LLM, VGG19, agents) finished
+
+Jobs run in the bounded worker pool of pipeline.py
+(BRAINTUMOR_PIPELINE_WORKERS); each job checks out its own set of agents,
+and all workers share the registry's single VGG19 model and LLM clients.
+"""
+import argparse
+import json
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import registry
+import upload_store
+
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+MAX_WAIT_SECONDS = 120
+
+
+class JobAPIHandler(BaseHTTPRequestHandler):
+    """Routes requests to the background pipeline executor."""
+
+    server_version = "BrainTumorAISystem/1.0"
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status: int, text: str, content_type: str = "text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        import pipeline
+        url = urlparse(self.path)
+        if url.path != "/jobs":
+            return self._send_json(404, {"error": "Not found"})
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            return self._send_json(400, {"error": "Empty body: send the image bytes"})
+        if length > MAX_UPLOAD_BYTES:
+            return self._send_json(413, {"error": "Image too large"})
+
+        filename = parse_qs(url.query).get("filename", [None])[0]
+        # Kept in memory under its content hash; no decode/re-encode
+        image_ref = upload_store.store.put(self.rfile.read(length), filename)
+        job_id = pipeline.submit_analysis(image_ref)
+        self._send_json(202, {"job_id": job_id, "status_url": f"/jobs/{job_id}"})
+
+    def do_GET(self):
+        import pipeline
+        url = urlparse(self.path)
+
+        if url.path == "/healthz":
+            return self._send_json(200, {"status": "ok"})
+
+        if url.path == "/readyz":
+            import warmup
+            readiness = warmup.readiness()
+            # Without warm-up (--no-warmup) components load on first use
+            ready = readiness["ready"] or not readiness["started"]
+            return self._send_json(200 if ready else 503, readiness)
+
+        if url.path == "/metrics":
+            return self._send_json(200, {
+                "queue_depth": pipeline.queue_depth(),
+                "running": pipeline.running_jobs(),
+                "workers": pipeline.PIPELINE_WORKERS,
+                "stage_latency": pipeline.stage_latency_summary(),
+            })
+
+        if url.path == "/metrics/prometheus":
+            import tracing
+            return self._send_text(200, tracing.prometheus_text(), "text/plain; version=0.0.4; charset=utf-8")
+
+        match = re.fullmatch(r"/jobs/([0-9a-f]+)(/results|/report|/trace)?", url.path)
+        if not match:
+            return self._send_json(404, {"error": "Not found"})
+
+        job = pipeline.get_job(match.group(1))
+        if job is None:
+            return self._send_json(404, {"error": "Unknown job"})
+
+        view = match.group(2)
+        if view is None:
+            wait = parse_qs(url.query).get("wait", ["0"])[0]
+            try:
+                wait = min(float(wait), MAX_WAIT_SECONDS)
+            except ValueError:
+                return self._send_json(400, {"error": "wait must be a number of seconds"})
+            if wait > 0:
+                job.finished.wait(wait)
+            return self._send_json(200, job.to_dict())
+
+        if view == "/results":
+            return self._send_json(200, {
+                "job_id": job.id,
+                "state": job.state,
+                "results": dict(job.results),
+                "structured": dict(job.structured),
+                "stream_stats": dict(job.stream_stats),
+                "stage_timings": dict(job.stage_timings),
+            })
+
+        if view == "/trace":
+            import tracing
+            return self._send_json(200, {
+                "job_id": job.id,
+                "trace_id": job.trace_id,
+                "spans": tracing.get_trace(job.trace_id) if job.trace_id else [],
+            })
+
+        # /report
+        if job.state != "completed":
+            return self._send_json(409, {"error": f"Report not available, job is {job.state}"})
+        return self._send_text(200, job.final_report or "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP job API for BrainTumorAISystem")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--stub-llm", action="store_true",
+                        help="Replace the Ollama LLM with a deterministic stub (local testing)")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Load the models on the first job instead of at startup")
+    args = parser.parse_args()
+
+    if args.stub_llm:
+        from llm_stub import StubLLM
+        registry.override("llm", StubLLM())
+        print("[INFO] Using stub LLM")
+
+    if not args.no_warmup:
+        import warmup
+        warmup.start()
+
+    server = ThreadingHTTPServer((args.host, args.port), JobAPIHandler)
+    print(f"[INFO] Job API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 import os
+import sys
 import streamlit as st
 from datetime import datetime
-from PIL import Image
 import time
+import html
 from dotenv import load_dotenv
 
 os.environ["CREWAI_TELEMETRY"] = "false"
@@ -12,19 +13,19 @@ load_dotenv()
 # Disable cloud services
 os.environ["GEMINI_API_KEY"] = "------"
 
-# CrewAI imports
-from crew.agents import (
-    classifier_agent,
-    clinical_analyst_agent,
-    recommendations_agent,
-    report_agent
-)
-from crew.tasks import (
-    create_classification_task,
-    create_clinical_analysis_task,
-    create_recommendations_task,
-    create_report_task
-)
+# CrewAI, TensorFlow and the LLM client are loaded lazily on first analysis
+import registry
+import tracing
+import upload_store
+from config import PIPELINE_MODE
+from tools.model_backends import CLASSIFIER_BACKEND, backend_model_path
+from tools.volume_inference import VOLUME_EXTENSIONS, preview_slice
+
+import warmup
+
+# Optional background warm-up so the first analysis does not pay the load cost
+if os.getenv("BRAINTUMOR_WARMUP", "0") == "1":
+    warmup.start()
 
 # Page configuration
 st.set_page_config(
@@ -159,115 +160,201 @@ def init_session_state():
         'results': {},
         'final_report': None,
         'image_path': None,
-        'start_time': None
+        'start_time': None,
+        'stream_stats': {},
+        'job_id': None
     }
     for key, value in defaults.items():
         if key not in st.session_state:
             st.session_state[key] = value
 
 init_session_state()
-import streamlit as st
-from neo4j_connector import driver, get_treatments_for_tumor
-from neo4j_visualizer import render_neo4j_graph
 st.sidebar.title("🧠 Knowledge Graph")
 
 if st.sidebar.button("Test Neo4j Connection"):
     try:
+        from neo4j_connector import driver
         with driver.session() as session:
             msg = session.run("RETURN 'Neo4j connected!' AS msg")
             st.sidebar.success(msg.single()["msg"])
     except Exception as e:
         st.sidebar.error(f"Error: {e}")
 
+graph_focus = st.sidebar.text_input("Focus node", placeholder="e.g. Glioblastome (empty = whole graph)")
+graph_depth = st.sidebar.slider("Hops", min_value=1, max_value=3, value=1)
+graph_limit = st.sidebar.number_input("Max nodes", min_value=10, max_value=500, value=100, step=10)
+
 if st.sidebar.button("Display Neo4j Graph"):
     try:
-        graph_file = render_neo4j_graph()
+        from neo4j_visualizer import render_neo4j_graph
+        html_code = render_neo4j_graph(focus=graph_focus, depth=graph_depth, limit=graph_limit)
         st.success("Graph generated!")
 
         # Display in Streamlit
-        with open(graph_file, "r", encoding="utf-8") as f:
-            html_code = f.read()
         st.components.v1.html(html_code, height=600)
 
     except Exception as e:
         st.error(f"Error: {e}")
 
+WARMUP_ICONS = {"pending": "⏳", "loading": "🔄", "ready": "🔥", "skipped": "➖", "failed": "❌"}
+
+with st.sidebar.expander("⏱️ Startup & cache report"):
+    readiness = warmup.readiness()
+    if readiness["started"]:
+        st.markdown("**Warm-up:** " + ("ready" if readiness["ready"] else "in progress"))
+        for name, status in readiness["components"].items():
+            seconds = f" ({status['seconds']:.1f}s)" if status["seconds"] is not None else ""
+            st.markdown(f"{WARMUP_ICONS[status['state']]} {name}: {status['state']}{seconds}")
+    st.code(registry.startup_report())
+    # Only shown once the classifier has been imported by an analysis
+    classifier_module = sys.modules.get("tools.classifier_tool")
+    if classifier_module is not None:
+        st.json(classifier_module.prediction_cache.stats())
+
 # ===================== Agents =====================
-AGENTS = [
-    {
-        "name": "Image Classification Agent",
-        "task": "Tumor detection via VGG19",
-        "id": "classification",
-        "icon": "🔍",
-        "agent_obj": classifier_agent,
-        "task_creator": lambda: create_classification_task(st.session_state.image_path)
-    },
-    {
-        "name": "Clinical Knowledge Agent",
-        "task": "Medical data synthesis",
-        "id": "clinique",
-        "icon": "📊",
-        "agent_obj": clinical_analyst_agent,
-        "task_creator": lambda: create_clinical_analysis_task(
-            st.session_state.results.get("classification"))
-    },
-    {
-        "name": "Recommendations Agent",
-        "task": "Therapeutic proposal and follow-up",
-        "id": "recommandations",
-        "icon": "💊",
-        "agent_obj": recommendations_agent,
-        "task_creator": lambda: create_recommendations_task(
-            st.session_state.results.get("clinique", "")
-        )
-    },
-    {
-        "name": "Report Writing Agent",
-        "task": "Generation of complete medical report",
-        "id": "rapport",
-        "icon": "📋",
-        "agent_obj": report_agent,
-        "task_creator": lambda: create_report_task(
-            classification_result=st.session_state.results.get("classification", ""),
-            clinical_result=st.session_state.results.get("clinique", ""),
-            recommendations_result=st.session_state.results.get("recommandations", "")
-        )
-    }
-]
-
-def clean_result_text(result_str, agent_id):
-    """Clean and format agent result"""
-    if agent_id == "classification":
-        keywords = ["Diagnosis", "Confidence", "Type"]
-    elif agent_id == "clinique":
-        keywords = ["Type", "Grade", "Prognosis", "Characteristics"]
-    elif agent_id == "recommandations":
-        keywords = ["Urgency", "Treatment", "Follow-up", "Next"]
+# The pipeline runs as a background job that outlives reruns; the page only
+# polls its status object.
+from pipeline import AGENTS, get_job, submit_analysis
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def volume_preview(image_ref):
+    """Middle axial slice of an uploaded volume; the reference is its content hash,
+    so reruns and the progress fragment do not decompress the volume again"""
+    with upload_store.store.pinned_path(image_ref) as path:
+        return preview_slice(path)
+
+def render_token_metrics(stats):
+    """Show time-to-first-token and generation rate of an agent"""
+    ttft = stats.get("ttft") if stats else None
+    rate = stats.get("tokens_per_second") if stats else None
+    col_ttft, col_rate = st.columns(2)
+    col_ttft.metric("Time to first token", f"{ttft:.1f}s" if ttft is not None else "—")
+    col_rate.metric("Tokens/sec", f"{rate:.1f}" if rate is not None else "—")
+
+def render_agent_card(agent, statut):
+    """Render the status card of an agent"""
+    badge_text, badge_class = {
+        "completed": ("✓ COMPLETED", "completed"),
+        "running": ("⚡ RUNNING", "running"),
+        "pending": ("⏳ PENDING", "pending"),
+    }[statut]
+
+    # Carte de l'agent
+    st.markdown(f"""
+    <div class="agent-card agent-{statut}">
+        <div style="display: flex; justify-content: space-between; align-items: center;">
+            <div>
+                <h4 style="margin:0; color:#003366;">
+                    {agent['icon']} {agent['name']}
+                </h4>
+                <p style="margin:5px 0; color:#666; font-size:0.9rem;">{agent['task']}</p>
+            </div>
+            <span class="status-badge {badge_class}">
+                {badge_text}
+            </span>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+def sync_job_results(job):
+    """Copy the results of a job into the session state"""
+    st.session_state.results = dict(job.results)
+    st.session_state.stream_stats = dict(job.stream_stats)
+    st.session_state.current_agent = job.current_agent
+    st.session_state.final_report = job.final_report
+
+@st.fragment(run_every=0.5)
+def render_job_progress():
+    """Poll the running job; only this fragment re-renders while it runs"""
+    job = get_job(st.session_state.job_id)
+    if job is None:
+        st.warning("This analysis is no longer available.")
+        return
+    if job.done:
+        sync_job_results(job)
+        st.session_state.step = "completed" if job.state == "completed" else "failed"
+        st.rerun()
+
+    current_idx = job.current_agent
+
+    # Progress bar
+    st.markdown('<div class="progress-container">', unsafe_allow_html=True)
+    st.progress(current_idx / len(AGENTS))
+    st.metric("Step", f"{min(current_idx + 1, len(AGENTS))} / {len(AGENTS)}")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    # Display all agents
+    for i, agent in enumerate(AGENTS):
+        if i < current_idx:
+            statut = "completed"
+        elif i == current_idx and job.state == "running":
+            statut = "running"
+        else:
+            statut = "pending"
+        render_agent_card(agent, statut)
+
+        # Display result if agent has completed
+        if statut == "completed" and agent['id'] in job.results:
+            st.markdown(
+                f"<div class='result-box'><strong>📄 Result:</strong><br><br>{job.results[agent['id']]}</div>",
+                unsafe_allow_html=True
+            )
+            render_token_metrics(job.stream_stats.get(agent['id']))
+
+        # Tokens of the running agent, as they arrive
+        if statut == "running":
+            token_stream = job.token_stream
+            if token_stream is not None:
+                text = token_stream.text
+                if text:
+                    st.markdown(
+                        f"<div class='result-box'><strong>✍️ Generating...</strong><br><br>{html.escape(text)}</div>",
+                        unsafe_allow_html=True
+                    )
+                render_token_metrics(token_stream.stats())
+
+def render_trace_waterfall(spans):
+    """Draw the spans of a trace as a waterfall (one bar per span)"""
+    if not spans:
+        st.caption("No trace recorded yet.")
+        return
+    t0 = min(s["start"] for s in spans)
+    total = max(s["start"] + (s["duration"] or 0) for s in spans) - t0 or 1e-9
+    depth = {}
+    for s in spans:  # Sorted by start, so parents come first
+        depth[s["span_id"]] = depth.get(s["parent_id"], -1) + 1
+
+    rows = []
+    for s in spans:
+        offset = (s["start"] - t0) / total * 100
+        width = max((s["duration"] or 0) / total * 100, 0.5)
+        color = "#d9534f" if s["status"] == "error" else "#0066cc"
+        attrs = s["attributes"]
+        details = ", ".join(f"{k}={v}" for k, v in attrs.items() if k in ("prompt_tokens", "completion_tokens", "cache_hit", "query", "rows"))
+        rows.append(f"""
+        <div style="font-size:0.75rem; margin:2px 0;" title="{html.escape(details)}">
+            <div style="padding-left:{depth[s['span_id']] * 8}px;">{html.escape(s['name'])} · {s['duration'] * 1000:.0f} ms</div>
+            <div style="background:#eee; height:6px; position:relative;">
+                <div style="position:absolute; left:{offset:.2f}%; width:{width:.2f}%; height:6px; background:{color};"></div>
+            </div>
+        </div>""")
+    st.markdown("".join(rows), unsafe_allow_html=True)
+
+with st.sidebar.expander("🔭 Last analysis trace"):
+    traced_job = get_job(st.session_state.job_id) if st.session_state.get("job_id") else None
+    if traced_job is not None and traced_job.trace_id:
+        render_trace_waterfall(tracing.get_trace(traced_job.trace_id))
     else:
-        return result_str
-    
-    lines = [l for l in result_str.split("\n") if any(k in l for k in keywords)]
-    return "\n".join(lines) if lines else result_str
+        render_trace_waterfall(tracing.last_trace("pipeline"))
+
+# Resume an analysis started earlier (e.g. after navigating away)
+if "job" in st.query_params and st.session_state.get("job_id") != st.query_params["job"]:
+    resumed_job = get_job(st.query_params["job"])
+    if resumed_job is not None:
+        st.session_state.job_id = resumed_job.id
+        st.session_state.image_path = resumed_job.image_path
+        st.session_state.step = "running"
 
-def execute_agent(agent_config):
-    """Execute an agent and return the result"""
-    try:
-        task = agent_config['task_creator']()
-        result = agent_config['agent_obj'].execute_task(task=task)
-        result_str = str(result)
-        
-        print(f"\n{'='*60}")
-        print(f"AGENT: {agent_config['name']}")
-        print(f"RAW RESULT:\n{result_str}")
-        print(f"{'='*60}\n")
-        
-        # Clean result
-        clean_text = clean_result_text(result_str, agent_config['id'])
-        return clean_text,None
-    except Exception as e:
-        import traceback
-        error_detail = f"{str(e)}\n{traceback.format_exc()}"
-        return None, error_detail
 # === MAIN INTERFACE ===
 col1, col2 = st.columns([1, 2.5])
 
@@ -275,21 +362,19 @@ with col1:
     st.markdown('<p class="section-title">📤 MRI Upload</p>', unsafe_allow_html=True)
     
     fichier = st.file_uploader(
-        "Select a brain MRI (PNG/JPG/JPEG)",
-        type=['png', 'jpg', 'jpeg'],
+        "Select a brain MRI (PNG/JPG/JPEG or NIfTI volume)",
+        type=['png', 'jpg', 'jpeg', 'nii', 'gz'],
         disabled=st.session_state.step == "running",
-        help="Accepted formats: PNG, JPG, JPEG"
+        help="Accepted formats: PNG, JPG, JPEG, NIfTI (.nii, .nii.gz)"
     )
 
     if fichier:
-        # Create temporary folder
-        os.makedirs("temp", exist_ok=True)
-        chemin = f"temp/{fichier.name}"
-        
+        # Raw upload bytes under their content hash: no re-encoding, no name collisions
+        image_ref = upload_store.store.put(fichier.getvalue(), fichier.name)
+
         # Check if new image
-        if st.session_state.image_path != chemin:
-            Image.open(fichier).save(chemin)
-            st.session_state.image_path = chemin
+        if st.session_state.image_path != image_ref:
+            st.session_state.image_path = image_ref
             # Complete reset
             st.session_state.step = "upload"
             st.session_state.current_agent = 0
@@ -298,17 +383,23 @@ with col1:
 
         # Display image
         st.markdown('<div class="image-container">', unsafe_allow_html=True)
-        st.image(st.session_state.image_path, caption="Loaded Brain MRI", use_container_width=True)
+        if upload_store.store.extension(st.session_state.image_path) in VOLUME_EXTENSIONS:
+            st.image(volume_preview(st.session_state.image_path),
+                     caption="Loaded MRI volume (middle axial slice)", use_container_width=True)
+        else:
+            st.image(upload_store.resolve(st.session_state.image_path), caption="Loaded Brain MRI", use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
 
         
         # Launch button
         if st.session_state.step == "upload":
             st.markdown("---")
-            if not os.path.exists("models/best_model_VGG19.keras"):
+            if not os.path.exists(backend_model_path(CLASSIFIER_BACKEND)):
                 st.error("⚠️ VGG19 model missing in /models/")
             else:
                 if st.button("🚀 Start Multi-Agent Analysis", type="primary", use_container_width=True):
+                    st.session_state.job_id = submit_analysis(st.session_state.image_path)
+                    st.query_params["job"] = st.session_state.job_id
                     st.session_state.step = "running"
                     st.session_state.start_time = time.time()
                     st.rerun()
@@ -317,106 +408,29 @@ with col2:
     st.markdown('<p class="section-title">⚙️ Analysis Progress</p>', unsafe_allow_html=True)
 
     if st.session_state.step == "running":
-        # Progress bar
-        progress = st.session_state.current_agent / len(AGENTS)
-        st.markdown('<div class="progress-container">', unsafe_allow_html=True)
-        st.progress(progress)
-        
-        col_prog1, col_prog2 = st.columns(2)
-        with col_prog1:
-            st.metric("Step", f"{st.session_state.current_agent + 1} / {len(AGENTS)}")
-        with col_prog2:
-            if st.session_state.start_time:
-                elapsed = int(time.time() - st.session_state.start_time)
-                st.metric("Elapsed Time", f"{elapsed}s")
-        st.markdown('</div>', unsafe_allow_html=True)
-
-        current_idx = st.session_state.current_agent
-
-        # Display all agents
-        for i, agent in enumerate(AGENTS):
-            # Determine status
-            if i < current_idx:
-                statut = "completed"
-                badge_text = "✓ COMPLETED"
-                badge_class = "completed"
-            elif i == current_idx:
-                statut = "running"
-                badge_text = "⚡ RUNNING"
-                badge_class = "running"
-            else:
-                statut = "pending"
-                badge_text = "⏳ PENDING"
-                badge_class = "pending"
-
-            # Carte de l'agent
-            st.markdown(f"""
-            <div class="agent-card agent-{statut}">
-                <div style="display: flex; justify-content: space-between; align-items: center;">
-                    <div>
-                        <h4 style="margin:0; color:#003366;">
-                            {agent['icon']} {agent['name']}
-                        </h4>
-                        <p style="margin:5px 0; color:#666; font-size:0.9rem;">{agent['task']}</p>
-                    </div>
-                    <span class="status-badge {badge_class}">
-                        {badge_text}
-                    </span>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-
-            # Display result if agent has completed
-            if i < current_idx and agent['id'] in st.session_state.results:
-                res = st.session_state.results[agent['id']]
-                st.markdown(
-                    f"<div class='result-box'><strong>📄 Result:</strong><br><br>{res}</div>",
-                    unsafe_allow_html=True
-                )
-
-            # Execute current agent
-            if i == current_idx:
-                with st.spinner(f"⚙️ {agent['name']} executing..."):
-                    result_text, error = execute_agent(agent)
-                    
-                    if error:
-                        st.error(f"❌ Error with {agent['name']}: {error}")
-                        if st.button("🔄 Reset", key=f"reset_{i}"):
-                            st.session_state.step = "upload"
-                            st.session_state.current_agent = 0
-                            st.rerun()
-                        st.stop()
-                    else:
-                        # Save result
-                        st.session_state.results[agent['id']] = result_text
-                        from neo4j_connector import driver, get_treatments_for_tumor
-
-                        # If the finished agent is the classification agent
-                        if agent['id'] == "classification":
-                            tumor_type = result_text  # or extract tumor type from result_text
-                            if tumor_type:
-                                with driver.session() as session:
-                                    traitements = session.execute_read(get_treatments_for_tumor, tumor_type)
-                                st.session_state.results["neo4j_treatments"] = "\n".join(traitements)
-
-                        # If it's the last agent, save the final report
-                        if i == len(AGENTS) - 1:
-                            st.session_state.final_report = result_text
-                            st.session_state.step = "completed"
-                        
-                        # Move to next agent
-                        st.session_state.current_agent += 1
-                        time.sleep(0.5)  # Small pause for visual effect
-                        st.rerun()
+        render_job_progress()
+
+    elif st.session_state.step == "failed":
+        job = get_job(st.session_state.job_id)
+        if job is not None and job.failed_agent is not None:
+            st.error(f"❌ Error with {AGENTS[job.failed_agent]['name']}: {job.error}")
+        elif job is not None:
+            st.error(f"❌ Analysis failed: {job.error}")
+        if st.button("🔄 Reset"):
+            st.session_state.step = "upload"
+            st.session_state.current_agent = 0
+            st.session_state.job_id = None
+            st.query_params.clear()
+            st.rerun()
 
     elif st.session_state.step == "completed":
         st.success("✅ Analysis completed successfully!")
         st.balloons()
         
         # Total time
-        if st.session_state.start_time:
-            total_time = int(time.time() - st.session_state.start_time)
-            st.info(f"⏱️ Total analysis time: {total_time} seconds")
+        job = get_job(st.session_state.job_id)
+        if job is not None:
+            st.info(f"⏱️ Total analysis time: {int(job.elapsed)} seconds")
 
         # Display results by agent
         st.markdown("---")
@@ -457,6 +471,7 @@ with col2:
         with col_btn2:
             if st.button("🔄 New Analysis", use_container_width=True):
                 st.session_state.clear()
+                st.query_params.clear()
                 st.rerun()
 
     else:
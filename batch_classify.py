@@ -0,0 +1,217 @@
+# batch_classify.py - Headless batch classification of MRI folders
+"""Classify a whole folder (or manifest) of brain MRI slices with VGG19.
+
+Usage:
+    python batch_classify.py IMAGES_DIR_OR_MANIFEST -o results.jsonl [--batch-size 32]
+    python batch_classify.py scans/ -o results.csv --recursive --with-agents
+
+Results are appended as each batch finishes; re-running with the same output
+file skips images that already have a successful row in it, so failed images
+are retried (the last row of an image is the current one).
+"""
+import argparse
+import csv
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import numpy as np
+
+from tools.classifier_tool import MODEL_PATH, format_prediction, get_classifier_model, interpret_prediction
+from tools.preprocessing import IMAGE_SIZE, preprocess_batch, preprocess_into
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+FIELDS = ["image", "diagnosis", "confidence", "tumor_probability", "error", "report"]
+
+
+def _is_header(cell: str, base: str) -> bool:
+    # A CSV manifest may start with column names ("image,label")
+    return (not cell.lower().endswith(IMAGE_EXTENSIONS)
+            and not os.path.isfile(os.path.join(base, cell)))
+
+
+def list_images(source: str, recursive: bool = False) -> list:
+    """List the images of a folder, or the paths of a manifest file (one per
+    line, or the first column of a CSV). Paths are absolute, so they compare
+    equal to the ones of a previous output whatever the working directory.
+    """
+    if os.path.isfile(source):
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding="utf-8", newline="") as f:
+            cells = [row[0].strip() if row else "" for row in csv.reader(f)]
+        cells = [cell for cell in cells if cell and not cell.startswith("#")]
+        if cells and _is_header(cells[0], base):
+            cells = cells[1:]
+        return [os.path.abspath(os.path.join(base, cell)) for cell in cells]
+
+    if recursive:
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names
+        ]
+    else:
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    return sorted(os.path.abspath(p) for p in paths if p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def already_done(output: str) -> set:
+    """Return the images classified without error in a previous (possibly partial) output."""
+    if not os.path.exists(output):
+        return set()
+    done = set()
+    with open(output, encoding="utf-8", newline="") as f:
+        if output.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = []
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    continue  # Truncated last line of an interrupted run
+        for row in rows:
+            if not row.get("image"):
+                continue
+            # Outputs of older runs may hold relative paths
+            image = os.path.abspath(row["image"])
+            if row.get("error"):
+                done.discard(image)  # Retried on the next run
+            else:
+                done.add(image)
+    return done
+
+
+class ResultWriter:
+    """Append results to a JSONL or CSV file, flushing after every batch."""
+
+    def __init__(self, output: str):
+        self.is_csv = output.endswith(".csv")
+        new_file = not os.path.exists(output) or os.path.getsize(output) == 0
+        self.file = open(output, "a", encoding="utf-8", newline="")
+        if self.is_csv:
+            self.writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+            if new_file:
+                self.writer.writeheader()
+
+    def write(self, rows: list):
+        for row in rows:
+            if self.is_csv:
+                self.writer.writerow(row)
+            else:
+                self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def decode_batches(paths: list, batch_size: int, batches: queue.Queue):
+    """Producer: decode images into float32 batches while the model is busy.
+
+    Ends with None, even if decoding fails, so the consumer never waits forever.
+    """
+    try:
+        for start in range(0, len(paths), batch_size):
+            chunk = paths[start:start + batch_size]
+            errors = {}
+            try:
+                inputs = preprocess_batch(chunk)
+            except Exception:
+                # Isolate the unreadable images instead of failing the whole batch
+                inputs = np.zeros((len(chunk), *IMAGE_SIZE, 3), dtype=np.float32)
+                for i, path in enumerate(chunk):
+                    try:
+                        preprocess_into(path, inputs[i])
+                    except Exception as e:
+                        errors[i] = str(e)
+            batches.put((chunk, inputs, errors))
+    finally:
+        batches.put(None)
+
+
+def run_agents(image_path: str, classification_result: str) -> str:
+    """Run the agents on an image, reusing its batch classification."""
+    from crew.main import BrainTumorAnalysisCrew
+    return str(BrainTumorAnalysisCrew().analyze(image_path, classification_result=classification_result))
+
+
+def report_progress(done: int, total: int, started: float):
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed > 0 else 0.0
+    eta = (total - done) / rate if rate > 0 else float("inf")
+    eta_text = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta != float("inf") else "--:--:--"
+    print(f"\r[INFO] {done}/{total} images  {rate:.1f} img/s  ETA {eta_text}", end="", file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch brain MRI classification with VGG19")
+    parser.add_argument("source", help="Folder of images, or manifest file with one path per line")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="Output file (.jsonl or .csv)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Images per forward pass")
+    parser.add_argument("--prefetch", type=int, default=2, help="Decoded batches kept ahead of the model")
+    parser.add_argument("--recursive", action="store_true", help="Also scan sub-folders")
+    parser.add_argument("--with-agents", action="store_true",
+                        help="Also run the LLM agents and store the final report (slow)")
+    args = parser.parse_args()
+
+    done = already_done(args.output)
+    paths = [p for p in list_images(args.source, args.recursive) if p not in done]
+    print(f"[INFO] {len(paths)} images to classify ({len(done)} already in {args.output})", file=sys.stderr)
+    if not paths:
+        return
+
+    model = get_classifier_model()
+    if model is None:
+        raise SystemExit(f"ERROR: VGG19 model not loaded. Place '{os.path.basename(MODEL_PATH)}' in the 'models/' folder")
+
+    batches = queue.Queue(maxsize=max(1, args.prefetch))
+    producer = threading.Thread(
+        target=decode_batches, args=(paths, args.batch_size, batches), daemon=True
+    )
+    producer.start()
+
+    writer = ResultWriter(args.output)
+    started = time.perf_counter()
+    processed = 0
+    try:
+        while (item := batches.get()) is not None:
+            chunk, inputs, errors = item
+            predictions = model.predict(inputs, verbose=0)[:, 0]
+            rows = []
+            for i, path in enumerate(chunk):
+                row = dict.fromkeys(FIELDS)
+                row["image"] = path
+                if i in errors:
+                    row["error"] = errors[i]
+                else:
+                    prediction = float(predictions[i])
+                    diagnosis, confidence = interpret_prediction(prediction)
+                    row.update(
+                        diagnosis=diagnosis,
+                        confidence=round(confidence, 1),
+                        tumor_probability=round(prediction * 100, 1)
+                    )
+                    if args.with_agents:
+                        try:
+                            row["report"] = run_agents(path, format_prediction(prediction))
+                        except Exception as e:
+                            row["error"] = f"Agents failed: {e}"
+                rows.append(row)
+            writer.write(rows)
+            processed += len(chunk)
+            report_progress(processed, len(paths), started)
+        if processed < len(paths):
+            print(f"\n[WARN] Decoding stopped after {processed} images - re-run the same command to resume",
+                  file=sys.stderr)
+    except KeyboardInterrupt:
+        print("\n[INFO] Interrupted - re-run the same command to resume", file=sys.stderr)
+    finally:
+        writer.close()
+    print(file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/bench_preprocessing.py
+"""Compare the per-image cost of the batched float32 preprocessing with the
+former single-image `preprocess_image`.
+
+Usage:
+    python -m benchmarks.bench_preprocessing [IMAGE_DIR] [--count 64] [--repeat 3]
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+
+from tools.preprocessing import preprocess_batch
+
+IMAGE_EXTENSIONS = ("*.png", "*.jpg", "*.jpeg")
+
+
+def legacy_preprocess_image(image_path: str) -> np.ndarray:
+    """Former implementation from tools/classifier_tool.py (float64 output)."""
+    img = Image.open(image_path).convert("RGB")
+    img = img.resize((224, 224))
+    arr = np.array(img) / 255.0
+    return np.expand_dims(arr, axis=0)
+
+
+def make_synthetic_images(folder: str, count: int) -> list:
+    """Write random 512x512 MRI-like grayscale images (half PNG, half JPEG)."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        pixels = rng.integers(0, 256, size=(512, 512), dtype=np.uint8)
+        path = os.path.join(folder, f"synthetic_{i:04d}.{'png' if i % 2 else 'jpg'}")
+        Image.fromarray(pixels).save(path)
+        paths.append(path)
+    return paths
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("image_dir", nargs="?", help="Folder of MRI images (synthetic images if omitted)")
+    parser.add_argument("--count", type=int, default=64, help="Number of images to preprocess")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions (best time is kept)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.image_dir:
+            paths = sorted(p for ext in IMAGE_EXTENSIONS for p in glob.glob(os.path.join(args.image_dir, ext)))
+            paths = paths[:args.count]
+        else:
+            paths = make_synthetic_images(tmp, args.count)
+        if not paths:
+            raise SystemExit("No images found")
+
+        # Model inputs must be identical once cast to the model dtype
+        for path in paths:
+            expected = legacy_preprocess_image(path).astype(np.float32)
+            if not np.array_equal(expected, preprocess_batch([path])):
+                raise SystemExit(f"Mismatch with legacy preprocessing: {path}")
+
+        n = len(paths)
+        legacy = best_of(lambda: [legacy_preprocess_image(p) for p in paths], args.repeat)
+        single = best_of(lambda: [preprocess_batch([p]) for p in paths], args.repeat)
+        batched = best_of(lambda: preprocess_batch(paths), args.repeat)
+
+    print(f"{n} images, bit-identical model inputs: yes")
+    print(f"{'variant':<34} {'ms/image':>10} {'speed-up':>9}")
+    for name, seconds in [
+        ("legacy preprocess_image", legacy),
+        ("preprocess_batch (one at a time)", single),
+        ("preprocess_batch (whole batch)", batched),
+    ]:
+        print(f"{name:<34} {seconds / n * 1000:>10.3f} {legacy / seconds:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
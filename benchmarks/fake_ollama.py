@@ -0,0 +1,299 @@
+# benchmarks/fake_ollama.py - Local stand-in for the Ollama HTTP API
+"""Serve recorded or templated completions over the Ollama API, with
+configurable token rate and latency, for load tests without a GPU.
+
+Usage:
+    python -m benchmarks.fake_ollama [--port 11435] [--token-rate 30] [--ttft lognormal:400,0.5]
+                                     [--parallel 1] [--recordings completions.jsonl]
+
+Then point the app at it:
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 streamlit run app.py
+
+Endpoints: GET /api/tags, GET /api/version, POST /api/show, POST /api/generate,
+POST /api/chat (NDJSON streaming or single JSON), plus GET /stats with the
+server-side queueing figures (POST /stats/reset clears them). Requests with
+format "json" get the templated answer as a JSON object; the num_predict
+and stop options cut the completion as Ollama would.
+
+Latency specs (milliseconds): "fixed:300", "uniform:200,800",
+"normal:400,100" or "lognormal:400,0.5" (median, sigma).
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_stub import STUB_ANSWERS
+
+MODEL_NAME = "mistral:latest"
+# Recent queue waits kept for the /stats percentiles
+QUEUE_WAIT_WINDOW = 10000
+_TOKEN = re.compile(r"\S+\s*|\s+")
+
+
+def parse_latency(spec: str):
+    """Return a callable sampling a delay in seconds from a latency spec."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1])) / 1000
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+def _as_json(answer: str) -> str:
+    # "Probable type: Glioblastoma" lines -> {"probable_type": "Glioblastoma"}
+    fields = {}
+    for line in answer.splitlines():
+        key, sep, value = line.partition(":")
+        if sep and value.strip():
+            fields[re.sub(r"[^a-z0-9]+", "_", key.strip().lower()).strip("_")] = value.strip()
+    return json.dumps(fields or {"answer": answer})
+
+
+def load_recordings(path: str) -> list:
+    """Recorded completions: JSONL rows {"match": "prompt substring", "response": "..."},
+    optionally with "role": the agent role the recording is limited to."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class CompletionSource:
+    """Picks the completion of a prompt: first matching recording, else the
+    templated answer of the agent role named in the system prompt."""
+
+    def __init__(self, recordings: list = None):
+        self.recordings = recordings or []
+
+    def completion_for(self, prompt: str, json_mode: bool = False) -> str:
+        for recording in self.recordings:
+            role = recording.get("role")
+            if recording["match"] in prompt and (role is None or f"You are {role}" in prompt):
+                return recording["response"]
+        answer = "Stub answer"
+        # CrewAI system prompts start with "You are <role>."
+        for role, templated in STUB_ANSWERS.items():
+            if f"You are {role}" in prompt:
+                answer = templated
+                break
+        if json_mode:
+            return _as_json(answer)
+        return f"Thought: I now know the final answer\nFinal Answer: {answer}"
+
+
+class FakeOllama:
+    """Generation model: queue for a slot, wait the time to first token, then
+    emit tokens at `token_rate` per second."""
+
+    def __init__(self, source: CompletionSource, token_rate: float = 30.0,
+                 ttft: str = "fixed:300", parallel: int = 1):
+        self.source = source
+        self.token_rate = token_rate
+        self.sample_ttft = parse_latency(ttft)
+        self.slots = threading.Semaphore(parallel)
+        self.parallel = parallel
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.queue_waits = deque(maxlen=QUEUE_WAIT_WINDOW)
+
+    def generate(self, prompt: str, json_mode: bool = False, max_tokens: int = None, stop: list = None):
+        """Yield response tokens with the configured pacing.
+
+        Args:
+            prompt: Full prompt text
+            json_mode: Answer with a JSON object (format "json")
+            max_tokens: Stop after this many tokens (num_predict)
+            stop: Strings ending the completion (not included in it)
+        """
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        queued = time.perf_counter()
+        try:
+            with self.slots:
+                with self._lock:
+                    self.queue_waits.append(time.perf_counter() - queued)
+                time.sleep(self.sample_ttft())
+                completion = self.source.completion_for(prompt, json_mode)
+                for marker in stop or []:
+                    if marker and marker in completion:
+                        completion = completion[:completion.index(marker)]
+                tokens = _TOKEN.findall(completion)
+                if max_tokens is not None and max_tokens >= 0:
+                    tokens = tokens[:max_tokens]
+                for token in tokens:
+                    yield token
+                    if self.token_rate:
+                        time.sleep(1.0 / self.token_rate)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = 0
+            self.max_in_flight = self.in_flight
+            self.queue_waits.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self.queue_waits)
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "parallel": self.parallel,
+            "queue_wait_p50": waits[int(0.50 * (len(waits) - 1))] if waits else 0.0,
+            "queue_wait_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+        }
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _chat_prompt(messages: list) -> str:
+    return "\n".join(str(m.get("content", "")) for m in messages)
+
+
+class OllamaHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOllama/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # One line per request would flood load-test output
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            return self._send_json(200, {"models": [{"name": MODEL_NAME, "model": MODEL_NAME, "size": 0}]})
+        if self.path == "/api/version":
+            return self._send_json(200, {"version": "0.0.0-fake"})
+        if self.path == "/stats":
+            return self._send_json(200, self.server.ollama.stats())
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path == "/stats/reset":
+            self.server.ollama.reset_stats()
+            return self._send_json(200, {"status": "ok"})
+        if self.path == "/api/show":
+            return self._send_json(200, {"modelfile": "", "parameters": "", "template": "",
+                                         "details": {"family": "llama"}, "model_info": {}})
+        if self.path == "/api/generate":
+            prompt = (request.get("system") or "") + "\n" + (request.get("prompt") or "")
+            wrap = lambda text, done: {"response": text, "done": done}
+        elif self.path == "/api/chat":
+            prompt = _chat_prompt(request.get("messages", []))
+            wrap = lambda text, done: {"message": {"role": "assistant", "content": text}, "done": done}
+        else:
+            return self._send_json(404, {"error": "not found"})
+
+        if self.path == "/api/generate" and not request.get("prompt"):
+            # Empty prompt: Ollama only loads the model (keep_alive preloading)
+            return self._send_json(200, {"model": request.get("model", MODEL_NAME), "created_at": _now(),
+                                         "response": "", "done": True, "done_reason": "load"})
+
+        start = time.perf_counter()
+        options = request.get("options") or {}
+        tokens = self.server.ollama.generate(
+            prompt,
+            json_mode=request.get("format") == "json",
+            max_tokens=options.get("num_predict"),
+            stop=options.get("stop") or request.get("stop")
+        )
+        model = request.get("model", MODEL_NAME)
+        final_fields = lambda count: {
+            "model": model, "created_at": _now(), "done_reason": "stop",
+            "total_duration": int((time.perf_counter() - start) * 1e9),
+            "prompt_eval_count": len(prompt) // 4, "eval_count": count,
+        }
+
+        if not request.get("stream", True):
+            text = "".join(tokens)
+            payload = {**wrap(text, True), **final_fields(len(_TOKEN.findall(text)))}
+            return self._send_json(200, payload)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(payload):
+            line = (json.dumps(payload) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):X}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+
+        count = 0
+        for token in tokens:
+            count += 1
+            write_chunk({"model": model, "created_at": _now(), **wrap(token, False)})
+        write_chunk({**wrap("", True), **final_fields(count)})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, **model_options):
+    """Start a fake Ollama server in a background thread.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 = any free port)
+        **model_options: FakeOllama options (token_rate, ttft, parallel, source)
+
+    Returns:
+        (server, base_url); stop it with server.shutdown()
+    """
+    model_options.setdefault("source", CompletionSource())
+    server = ThreadingHTTPServer((host, port), OllamaHandler)
+    server.daemon_threads = True
+    server.ollama = FakeOllama(**model_options)
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-rate", type=float, default=30.0, help="Tokens per second per request (0 = instant)")
+    parser.add_argument("--ttft", default="fixed:300", help="Time to first token distribution (ms)")
+    parser.add_argument("--parallel", type=int, default=1, help="Requests generated at once (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--recordings", help="JSONL of recorded completions")
+    args = parser.parse_args()
+
+    source = CompletionSource(load_recordings(args.recordings) if args.recordings else None)
+    server, url = start_server(args.host, args.port, source=source, token_rate=args.token_rate,
+                               ttft=args.ttft, parallel=args.parallel)
+    print(f"[INFO] Fake Ollama listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
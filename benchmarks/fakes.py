@@ -0,0 +1,107 @@
+# benchmarks/fakes.py - Offline stand-ins for the VGG19 model and Neo4j
+"""Fakes used to run benchmarks and load tests on a CPU-only box, without the
+trained `.keras` file or a Neo4j server."""
+import numpy as np
+
+
+class FakeClassifierModel:
+    """Tiny numpy model with the Keras `predict(batch, verbose=0)` interface.
+
+    Average-pools the image to 14x14 and applies a fixed random projection
+    and a sigmoid, so it costs real (if small) compute per image and gives
+    deterministic probabilities.
+    """
+
+    def __init__(self, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.weights = rng.normal(scale=0.05, size=(14 * 14 * 3, 1)).astype(np.float32)
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        batch = np.asarray(batch, dtype=np.float32)
+        pooled = batch.reshape(len(batch), 14, 16, 14, 16, 3).mean(axis=(2, 4))
+        logits = pooled.reshape(len(batch), -1) @ self.weights
+        return 1.0 / (1.0 + np.exp(-logits))
+
+
+class FakeNode(dict):
+    """Node with the `element_id` / `get` / `items` API used by the visualizer."""
+
+    def __init__(self, element_id: str, **properties):
+        super().__init__(properties)
+        self.element_id = element_id
+
+
+class FakeRelationship:
+    def __init__(self, rel_type: str):
+        self.type = rel_type
+
+
+class FakeResult(list):
+    def single(self):
+        return self[0] if self else None
+
+    def consume(self):
+        return None
+
+
+def make_relations(n_tumors: int = 200, per_tumor: int = 10) -> list:
+    """(tumor, relation, target) triples shaped like the medical graph."""
+    relations = []
+    for t in range(n_tumors):
+        for i in range(per_tumor):
+            relation = "TRAITE_PAR" if i % 3 else "DETECTE_PAR"
+            relations.append((f"Tumeur {t}", relation, f"Cible {t}-{i}"))
+    return relations
+
+
+class FakeTransaction:
+    """Answers the queries of this repo from an in-memory list of relations."""
+
+    def __init__(self, relations: list):
+        self.relations = relations
+
+    def run(self, query: str, **params):
+        if "count(n)" in query:
+            return FakeResult([{"nodes": len(self.relations) * 2, "rels": len(self.relations), "updated_at": None}])
+        if "AS traitement" in query:
+            name = params.get("tumor_name")
+            return FakeResult(
+                {"traitement": target} for tumor, rel, target in self.relations
+                if tumor == name and rel == "TRAITE_PAR"
+            )
+        if "AS relation" in query:
+            return FakeResult(
+                {"tumor": tumor, "relation": rel, "target": target}
+                for tumor, rel, target in self.relations
+            )
+        if "RETURN a, r, b" in query or "AS a, r" in query:
+            limit = params.get("row_limit", len(self.relations))
+            return FakeResult(
+                {"a": FakeNode(f"t:{tumor}", name=tumor), "r": FakeRelationship(rel),
+                 "b": FakeNode(f"x:{target}", name=target)}
+                for tumor, rel, target in self.relations[:limit]
+            )
+        return FakeResult()
+
+
+class FakeSession(FakeTransaction):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_read(self, work, *args, **kwargs):
+        return work(self, *args, **kwargs)
+
+    execute_write = execute_read
+
+
+class FakeDriver:
+    """Stands in for `neo4j_connector.driver`."""
+
+    def __init__(self, relations: list = None):
+        self.relations = relations if relations is not None else make_relations()
+
+    def session(self, **kwargs):
+        return FakeSession(self.relations)
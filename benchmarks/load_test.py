@@ -0,0 +1,288 @@
+# benchmarks/load_test.py - End-to-end load generator for the four-agent pipeline
+"""Push concurrent analyses through the pipeline against a fake Ollama server.
+
+Usage:
+    python -m benchmarks.load_test [--analyses 8] [--concurrency 1 2 4] [--path crew pipeline]
+                                   [--token-rate 30] [--ttft lognormal:400,0.5] [--ollama-parallel 1]
+                                   [--ollama-url http://127.0.0.1:11435] [--output load.json]
+
+Without --ollama-url, a fake Ollama (benchmarks/fake_ollama.py) is started
+in-process. Neo4j is always faked: treatment lookups are served by a
+snapshot of benchmarks.fakes.FakeDriver. Both paths run the agent graph
+of pipeline.py on crew.scheduler:
+    crew      BrainTumorAnalysisCrew.analyze (batch runs, the CLI)
+    pipeline  pipeline.run_pipeline, i.e. the background jobs of the app and
+              the HTTP API (status, token streams, Neo4j lookup)
+
+For every concurrency level the report gives end-to-end throughput and
+latency, the wait before an analysis starts, per-agent latency percentiles
+and the queueing seen by the LLM server.
+
+With the in-process fake Ollama, every analysis gets its own image and its
+own recorded answers (a "Tumor-NNN" marker per agent). An analysis whose
+outputs carry another analysis's marker, or none, counts as mismatched and
+makes the run exit with code 1.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import registry
+from benchmarks.fakes import FakeClassifierModel, FakeDriver, make_relations
+from benchmarks.run_benchmarks import make_images
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"p50": None, "p95": None}
+    return {
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+    }
+
+
+def _ollama_stats(url: str, reset: bool = False):
+    try:
+        if reset:
+            request = urllib.request.Request(url + "/stats/reset", data=b"{}", method="POST")
+            urllib.request.urlopen(request, timeout=5).read()
+            return None
+        return json.loads(urllib.request.urlopen(url + "/stats", timeout=5).read())
+    except Exception:
+        return None  # A real Ollama has no /stats endpoint
+
+
+def run_crew(image_path: str) -> dict:
+    from crew.main import BrainTumorAnalysisCrew
+    crew = BrainTumorAnalysisCrew()
+    start = time.time()
+    crew.analyze(image_path)
+    return {
+        "started_at": start,
+        "finished_at": time.time(),
+        "stages": {name: t["duration"] for name, t in crew.timings.items()},
+        "stage_waits": {name: t["start"] - t["queued"] for name, t in crew.timings.items()},
+        "outputs": dict(crew.results),
+        "failed": False,
+    }
+
+
+def run_pipeline_job(image_path: str) -> dict:
+    from pipeline import PipelineJob, run_pipeline
+    job = PipelineJob(image_path)
+    run_pipeline(job)
+    return {
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "stages": dict(job.stage_timings),
+        "stage_waits": {},
+        "outputs": dict(job.results),
+        "failed": job.state != "completed",
+    }
+
+
+RUNNERS = {"crew": run_crew, "pipeline": run_pipeline_job}
+# Agents whose answer must carry the marker of their own analysis
+CHECKED_AGENTS = ("clinique", "recommandations", "rapport")
+
+
+def make_jobs(folder: str, count: int) -> tuple:
+    """`count` images with distinct classifier outputs, and fake Ollama
+    recordings answering the agents of each one with its own marker.
+
+    The clinical answer of an image is keyed on its tumor probability line,
+    the recommendations and report answers on the clinical marker, so each
+    agent only gets its own analysis's marker if its prompt carries the
+    right upstream output.
+
+    Returns:
+        (image paths, markers, recordings)
+    """
+    from tools.classifier_tool import classify_image
+    rng = np.random.default_rng(1)
+    images, markers, recordings, seen = [], [], [], set()
+    for attempt in range(count * 20):
+        if len(images) == count:
+            break
+        path = os.path.join(folder, f"load_{attempt}.png")
+        Image.fromarray(rng.integers(0, 256, size=(512, 512), dtype=np.uint8)).save(path)
+        probability = classify_image(path).splitlines()[-1]
+        if probability in seen:
+            continue
+        seen.add(probability)
+        marker = f"Tumor-{len(images):03d}"
+        recordings += [
+            {"match": probability, "role": "Clinical Analyst", "response": json.dumps(
+                {"probable_type": marker, "who_grade": "II", "prognosis": "Unknown"})},
+            {"match": marker, "role": "Treatment Recommendations Specialist", "response": json.dumps(
+                {"urgency": "Routine", "next_step": f"Follow-up of {marker}", "standard_treatment": "Surgery"})},
+            {"match": marker, "role": "Medical Report Writer",
+             "response": f"Thought: I now know the final answer\nFinal Answer: Report of {marker}"},
+        ]
+        images.append(path)
+        markers.append(marker)
+    if len(images) < count:
+        raise RuntimeError(f"Only {len(images)} of {count} images have distinct classifications")
+    return images, markers, recordings
+
+
+def _mismatched(outputs: dict, marker: str) -> list:
+    # Markers are zero-padded, so "Tumor-001" is never part of another one
+    return [agent for agent in CHECKED_AGENTS if marker not in (outputs.get(agent) or "")]
+
+
+def run_level(path: str, concurrency: int, images: list, analyses: int, ollama_url: str,
+              markers: list = None) -> dict:
+    """Run `analyses` analyses with at most `concurrency` at once.
+
+    With `markers` (one per image), the outputs of each analysis are checked
+    against the marker of its image.
+    """
+    runner = RUNNERS[path]
+    _ollama_stats(ollama_url, reset=True)
+
+    def submit(i):
+        submitted = time.time()
+        try:
+            outcome = runner(images[i % len(images)])
+        except Exception as e:
+            outcome = {"started_at": submitted, "finished_at": time.time(), "stages": {},
+                       "stage_waits": {}, "outputs": {}, "failed": True, "error": str(e)}
+        outcome["submitted_at"] = submitted
+        if markers and not outcome["failed"]:
+            outcome["mismatched"] = _mismatched(outcome["outputs"], markers[i % len(markers)])
+        return outcome
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Submitted all at once: analyses beyond `concurrency` wait in the queue
+        outcomes = list(pool.map(submit, range(analyses)))
+    wall = time.time() - start
+
+    completed = [o for o in outcomes if not o["failed"]]
+    stages = {}
+    for outcome in completed:
+        for stage, seconds in outcome["stages"].items():
+            stages.setdefault(stage, []).append(seconds)
+    stage_waits = {}
+    for outcome in completed:
+        for stage, seconds in outcome["stage_waits"].items():
+            stage_waits.setdefault(stage, []).append(seconds)
+
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "analyses": analyses,
+        "failed": analyses - len(completed),
+        "mismatched": sum(1 for o in completed if o.get("mismatched")) if markers else None,
+        "wall_seconds": round(wall, 2),
+        "throughput_per_min": round(len(completed) / wall * 60, 2) if wall else None,
+        "end_to_end": percentiles([o["finished_at"] - o["submitted_at"] for o in completed]),
+        "queue_wait": percentiles([o["started_at"] - o["submitted_at"] for o in completed]),
+        "stages": {stage: percentiles(values) for stage, values in stages.items()},
+        "stage_waits": {stage: percentiles(values) for stage, values in stage_waits.items()},
+        "llm_server": _ollama_stats(ollama_url),
+    }
+
+
+def print_level(level: dict):
+    print(f"\n== {level['path']} | concurrency {level['concurrency']}: "
+          f"{level['analyses'] - level['failed']}/{level['analyses']} analyses in {level['wall_seconds']}s "
+          f"→ {level['throughput_per_min']} analyses/min")
+    if level["mismatched"]:
+        print(f"   ❌ {level['mismatched']} analyses returned outputs of another analysis")
+    print(f"   end-to-end  p50 {level['end_to_end']['p50']}s  p95 {level['end_to_end']['p95']}s")
+    print(f"   queue wait  p50 {level['queue_wait']['p50']}s  p95 {level['queue_wait']['p95']}s")
+    for stage, p in level["stages"].items():
+        wait = level["stage_waits"].get(stage)
+        extra = f"  (scheduler wait p95 {wait['p95']}s)" if wait else ""
+        print(f"   {stage:<16} p50 {p['p50']}s  p95 {p['p95']}s{extra}")
+    server = level["llm_server"]
+    if server:
+        print(f"   LLM server: {server['requests']} requests, max {server['max_in_flight']} in flight "
+              f"for {server['parallel']} slot(s), queue wait p95 {server['queue_wait_p95']:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of the analysis pipeline")
+    parser.add_argument("--analyses", type=int, default=8, help="Analyses per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--path", nargs="+", choices=list(RUNNERS), default=list(RUNNERS))
+    parser.add_argument("--ollama-url", help="Use this (fake or real) Ollama instead of an in-process fake")
+    parser.add_argument("--token-rate", type=float, default=30.0, help="Fake Ollama tokens/s per request")
+    parser.add_argument("--ttft", default="lognormal:400,0.5", help="Fake Ollama time to first token (ms)")
+    parser.add_argument("--ollama-parallel", type=int, default=1, help="Fake Ollama concurrent generations")
+    parser.add_argument("--recordings", help="JSONL of recorded completions for the fake Ollama")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    server = None
+    ollama_url = args.ollama_url
+    if not ollama_url:
+        from benchmarks.fake_ollama import CompletionSource, load_recordings, start_server
+        # The per-analysis recordings are added once the images exist
+        source = CompletionSource(load_recordings(args.recordings) if args.recordings else None)
+        server, ollama_url = start_server(source=source, token_rate=args.token_rate,
+                                          ttft=args.ttft, parallel=args.ollama_parallel)
+        print(f"[INFO] Fake Ollama on {ollama_url}", file=sys.stderr)
+
+    # Must be set before config.py builds the LLM client; identical prompts
+    # would otherwise be answered by the response cache
+    os.environ["OLLAMA_BASE_URL"] = ollama_url
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+
+    from tools.classifier_tool import get_classifier_model
+    if get_classifier_model() is None:
+        registry.override("vgg19", FakeClassifierModel())
+        print("[INFO] VGG19 model unavailable, using the numpy stand-in", file=sys.stderr)
+
+    # Without this, the first lookups would wait on an unreachable Neo4j
+    from treatment_snapshot import TreatmentSnapshot
+    fake_graph = FakeDriver(make_relations() + [
+        ("Glioblastome", "TRAITE_PAR", "Chirurgie + Radiothérapie"),
+        ("Glioblastome", "DETECTE_PAR", "IRM VGG19"),
+    ])
+    snapshot = TreatmentSnapshot(lambda: fake_graph)
+    snapshot.refresh()
+    registry.override("treatment_snapshot", snapshot)
+
+    levels = []
+    with tempfile.TemporaryDirectory() as tmp:
+        markers = None
+        if server:
+            images, markers, recordings = make_jobs(tmp, args.analyses)
+            # Ahead of the user's recordings: they must not answer for an analysis
+            source.recordings[:0] = recordings
+        else:
+            images = make_images(tmp)
+        for path in args.path:
+            for concurrency in args.concurrency:
+                print(f"[INFO] {path}, concurrency {concurrency}...", file=sys.stderr)
+                # Agent logs would drown the report
+                with contextlib.redirect_stdout(io.StringIO()):
+                    level = run_level(path, concurrency, images, args.analyses, ollama_url, markers)
+                levels.append(level)
+                print_level(level)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"ollama_url": ollama_url, "levels": levels}, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+    if server:
+        server.shutdown()
+    if any(level["mismatched"] for level in levels):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+# benchmarks/run_benchmarks.py - Micro-benchmarks of the project's hot paths
+"""Measure latency, throughput and peak memory of the hot paths, offline.
+
+Usage:
+    python -m benchmarks.run_benchmarks [--only classify search] [--output results.json]
+                                        [--baseline benchmarks/baseline.json] [--threshold 0.2]
+
+The trained `.keras` model is replaced by a tiny numpy model when it cannot
+be loaded (or with --fake-model), Neo4j by an in-memory fake driver and the LLM by the
+stub of llm_stub.py, so the suite runs on a CPU-only box without services.
+With --baseline, a benchmark whose p50 grew by more than --threshold is
+reported as a regression and the exit code is 1.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+import registry
+from benchmarks.fakes import FakeClassifierModel, FakeDriver, make_relations
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str, iterations: int = 200, warmup: int = 5):
+    """Register a benchmark factory.
+
+    The factory receives the shared context and returns either the callable
+    to time, or a (callable, reset) pair where `reset` runs, untimed, before
+    each iteration.
+    """
+    def decorator(factory):
+        BENCHMARKS[name] = {"factory": factory, "iterations": iterations, "warmup": warmup}
+        return factory
+    return decorator
+
+
+def make_images(folder: str, count: int = 8) -> list:
+    """Random 512x512 grayscale MRI-sized PNGs."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"bench_{i}.png")
+        Image.fromarray(rng.integers(0, 256, size=(512, 512), dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+
+def _cycle(items):
+    state = {"i": 0}
+
+    def next_item():
+        state["i"] += 1
+        return items[state["i"] % len(items)]
+    return next_item
+
+
+# ===================== Benchmarks =====================
+
+@benchmark("preprocess_image", iterations=100)
+def bench_preprocess(ctx):
+    from tools.classifier_tool import preprocess_image
+    next_path = _cycle(ctx["images"])
+    return lambda: preprocess_image(next_path())
+
+
+@benchmark("classify_brain_mri (uncached)", iterations=100)
+def bench_classify_uncached(ctx):
+    from tools.classifier_tool import classify_brain_mri, prediction_cache
+    path = ctx["images"][0]
+    return (lambda: classify_brain_mri.run(image_path=path)), prediction_cache.clear
+
+
+@benchmark("classify_brain_mri (cached)", iterations=100)
+def bench_classify_cached(ctx):
+    from tools.classifier_tool import classify_brain_mri
+    path = ctx["images"][0]
+    classify_brain_mri.run(image_path=path)
+    return lambda: classify_brain_mri.run(image_path=path)
+
+
+@benchmark("search_medical_knowledge", iterations=500)
+def bench_search(ctx):
+    from tools.medical_knowledge_tool import get_knowledge_index, search_medical_knowledge
+    get_knowledge_index()  # Index build is not part of the query latency
+    next_query = _cycle([
+        "glioblastoma treatment options and prognosis",
+        "diagnostic examinations for a suspected meningioma",
+        "survival rates by tumor grade",
+        "chemotherapy temozolomide radiotherapy dose",
+    ])
+    return lambda: search_medical_knowledge.run(query=next_query())
+
+
+@benchmark("structure_result", iterations=2000)
+def bench_structure(ctx):
+    from pipeline import structure_result
+    text = '{"probable_type": "Glioblastoma", "who_grade": "IV", "prognosis": "median survival 3 months"'
+    return lambda: structure_result(text, "clinique")
+
+
+@benchmark("neo4j get_treatments_for_tumor", iterations=200)
+def bench_neo4j_treatments(ctx):
+    from neo4j_connector import get_treatments_for_tumor
+    driver = ctx["driver"]
+
+    def run():
+        with driver.session() as session:
+            return session.execute_read(get_treatments_for_tumor, "Tumeur 42")
+    return run
+
+
+@benchmark("treatment_snapshot refresh", iterations=50)
+def bench_snapshot_refresh(ctx):
+    from treatment_snapshot import TreatmentSnapshot
+    snapshot = TreatmentSnapshot(lambda: ctx["driver"])
+    return lambda: snapshot.refresh(force=True)
+
+
+@benchmark("treatment_snapshot lookup", iterations=2000)
+def bench_snapshot_lookup(ctx):
+    from treatment_snapshot import TreatmentSnapshot
+    snapshot = TreatmentSnapshot(lambda: ctx["driver"])
+    snapshot.refresh()
+    next_name = _cycle([f"Tumeur {i}" for i in range(50)])
+    return lambda: snapshot.treatments_for(next_name())
+
+
+@benchmark("render_neo4j_graph (uncached)", iterations=20, warmup=1)
+def bench_render_graph(ctx):
+    import neo4j_visualizer
+    driver = neo4j_visualizer.driver
+
+    def run():
+        # Swapped only while rendering, so later code gets the real driver back
+        neo4j_visualizer.driver = ctx["driver"]
+        try:
+            return neo4j_visualizer.render_neo4j_graph(limit=100)
+        finally:
+            neo4j_visualizer.driver = driver
+    return run, neo4j_visualizer._html_cache.clear
+
+
+@benchmark("execute_agent (stub LLM)", iterations=20, warmup=2)
+def bench_agent(ctx):
+    from crew.agents import get_agent_pool
+    from pipeline import AGENTS, execute_agent
+    clinical = next(a for a in AGENTS if a["id"] == "clinique")
+    context = {
+        "image_path": ctx["images"][0],
+        "results": {"classification": "Diagnosis: Tumor detected\nConfidence: 91.2%\nTumor probability: 91.2%"},
+    }
+
+    def run():
+        with get_agent_pool().checkout():
+            return execute_agent(clinical, context)
+    return run
+
+
+# ===================== Runner =====================
+
+def measure(fn, reset, iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        if reset:
+            reset()
+        fn()
+
+    latencies = []
+    total = 0.0
+    for _ in range(iterations):
+        if reset:
+            reset()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        latencies.append(elapsed * 1000)
+        total += elapsed
+
+    # Separate, shorter pass: tracemalloc slows down allocation-heavy code
+    tracemalloc.start()
+    for _ in range(min(iterations, 10)):
+        if reset:
+            reset()
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+        "mean_ms": round(float(np.mean(latencies)), 4),
+        "throughput_per_s": round(iterations / total, 1) if total else None,
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def setup_fakes(fake_model: bool) -> dict:
+    from crew.agents import AgentPool
+    from llm_stub import StubLLM
+    from tools.classifier_tool import MODEL_PATH, get_classifier_model
+
+    fakes = {"llm": "stub", "neo4j": "fake"}
+    registry.override("llm", StubLLM())
+    # CrewAI prints its step panels to the terminal, bypassing redirect_stdout
+    registry.override("agent_pool", AgentPool(size=1, verbose=False))
+    if fake_model or get_classifier_model() is None:
+        registry.override("vgg19", FakeClassifierModel())
+        fakes["model"] = "fake"
+    else:
+        fakes["model"] = MODEL_PATH
+    return fakes
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Names of the benchmarks whose p50 grew by more than `threshold`."""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if not reference or not reference.get("p50_ms"):
+            continue
+        ratio = result["p50_ms"] / reference["p50_ms"]
+        result["baseline_p50_ms"] = reference["p50_ms"]
+        result["change"] = round(ratio - 1, 4)
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def print_table(results: dict, regressions: list):
+    print(f"\n{'benchmark':<34} {'p50 ms':>9} {'p95 ms':>9} {'ops/s':>10} {'peak KB':>9} {'vs base':>8}")
+    for name, r in results.items():
+        change = f"{r['change']:+.0%}" if "change" in r else ""
+        flag = "  ⚠️ regression" if name in regressions else ""
+        print(f"{name:<34} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['throughput_per_s'] or 0:>10.1f} "
+              f"{r['peak_memory_kb']:>9.1f} {change:>8}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the micro-benchmark suite")
+    parser.add_argument("--only", nargs="*", help="Run benchmarks whose name contains one of these words")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare with a results JSON from a previous run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p50 increase (0.2 = +20%%)")
+    parser.add_argument("--fake-model", action="store_true", help="Use the numpy stand-in even if the .keras model exists")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply the iteration counts")
+    args = parser.parse_args()
+
+    selected = {
+        name: spec for name, spec in BENCHMARKS.items()
+        if not args.only or any(word.lower() in name.lower() for word in args.only)
+    }
+    fakes = setup_fakes(args.fake_model)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        ctx = {"images": make_images(tmp), "driver": FakeDriver(make_relations())}
+        for name, spec in selected.items():
+            print(f"[INFO] {name}...", file=sys.stderr)
+            # Tool and agent output would drown the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                runner = spec["factory"](ctx)
+                fn, reset = runner if isinstance(runner, tuple) else (runner, None)
+                results[name] = measure(fn, reset, max(1, int(spec["iterations"] * args.scale)), spec["warmup"])
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    print_table(results, regressions)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpu_count": os.cpu_count(),
+                "fakes": fakes,
+                "results": results,
+            }, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above +{args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,107 @@
 # config.py - Ollama Configuration for CrewAI
-from crewai import LLM
 import os
+import registry
 
 # Completely disable cloud APIs
 os.environ.pop("OPENAI_API_KEY", None)
 os.environ.pop("GEMINI_API_KEY", None)
 
 # Local LLM configuration with Ollama
-llm = LLM(
-    model="ollama/mistral:latest",
-    base_url="http://localhost:11434",
-    temperature=0.1
-)
+LLM_MODEL = "ollama/mistral:latest"
+LLM_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+LLM_TEMPERATURE = 0.1
+# Stream tokens so the UI can show them as they are generated
+LLM_STREAM = os.getenv("LLM_STREAM", "1") == "1"
 
-print("✅ Ollama LLM configured: mistral:latest")
\ No newline at end of file
+# Persistent cache of LLM responses (disable with LLM_CACHE_ENABLED=0)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_responses.sqlite")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "64"))
+
+# "direct": deterministic tool-only agents (classification) call their tool
+# directly and skip the LLM round trip. "llm": every agent goes through the LLM.
+PIPELINE_MODE = os.getenv("BRAINTUMOR_PIPELINE_MODE", "direct")
+
+# Generation settings per agent. "json" constrains the answer to a JSON
+# object (Ollama format=json) and "max_tokens" caps the generation; no stop
+# sequence, as "}" would also match inside the object and truncate it. The
+# classifier keeps free text for its ReAct tool call (Action Input: {...}).
+LLM_PROFILES = {
+    "classifier_agent": {"max_tokens": int(os.getenv("LLM_MAX_TOKENS_CLASSIFIER", "160"))},
+    "clinical_analyst_agent": {
+        "json": True, "max_tokens": int(os.getenv("LLM_MAX_TOKENS_CLINICAL", "160"))
+    },
+    "recommendations_agent": {
+        "json": True, "max_tokens": int(os.getenv("LLM_MAX_TOKENS_RECOMMENDATIONS", "160"))
+    },
+    "report_agent": {"max_tokens": int(os.getenv("LLM_MAX_TOKENS_REPORT", "900"))},
+}
+
+
+def _build_llm(profile: dict = None):
+    crewai = registry.timed_import("crewai")
+    profile = profile or {}
+    options = {}
+    if profile.get("max_tokens"):
+        options["max_tokens"] = profile["max_tokens"]
+    if profile.get("json"):
+        options["format"] = "json"
+    llm = crewai.LLM(
+        model=LLM_MODEL,
+        base_url=LLM_BASE_URL,
+        temperature=LLM_TEMPERATURE,
+        stream=LLM_STREAM,
+        **options
+    )
+    if LLM_CACHE_ENABLED:
+        from llm_cache import CachedLLM, ResponseCache
+        cache = ResponseCache(
+            LLM_CACHE_PATH,
+            ttl_seconds=LLM_CACHE_TTL,
+            max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024)
+        )
+        llm = CachedLLM(llm, cache)
+    import tracing
+    if tracing.TRACE_ENABLED:
+        from llm_tracing import TracedLLM
+        llm = TracedLLM(llm)
+    return llm
+
+
+def _load_llm():
+    llm = _build_llm()
+    print("✅ Ollama LLM configured: mistral:latest")
+    return llm
+
+
+def _profile_loader(name: str):
+    def _load():
+        llm = _build_llm(LLM_PROFILES[name])
+        print(f"✅ Ollama LLM configured for {name}: {LLM_PROFILES[name]}")
+        return llm
+    return _load
+
+
+registry.register("llm", _load_llm)
+for _name in LLM_PROFILES:
+    registry.register(f"llm:{_name}", _profile_loader(_name))
+
+
+def get_llm(profile: str = None):
+    """Return a shared LLM client, creating it on first use.
+
+    Args:
+        profile: Agent name from LLM_PROFILES; None for the default client.
+            An override of "llm" (e.g. the stub LLM) applies to every profile.
+    """
+    if profile in LLM_PROFILES and not registry.is_overridden("llm"):
+        return registry.get(f"llm:{profile}")
+    return registry.get("llm")
+
+
+def __getattr__(name):
+    # Keeps `from config import llm` working without building the client at import
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,40 +1,158 @@
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+
 from crewai import Agent
-from config import llm
+import registry
+from config import get_llm
 
 # AGENTS
+# Agents are built on first use so that importing this module does not
+# create the LLM client.
+
+AGENT_SPECS = {
+    "classifier_agent": dict(
+        role="AI Radiology Specialist",
+        goal="Classify brain MRI images to detect tumors",
+        backstory="Expert in medical imaging with deep learning specialization"
+    ),
+    "clinical_analyst_agent": dict(
+        role="Clinical Analyst",
+        goal="Analyze results with medical context and determine tumor characteristics",
+        backstory="Experienced clinician with oncology expertise"
+    ),
+    "recommendations_agent": dict(
+        role="Treatment Recommendations Specialist",
+        goal="Provide evidence-based clinical recommendations for patient care",
+        backstory="Board-certified oncologist with treatment protocol expertise"
+    ),
+    "report_agent": dict(
+        role="Medical Report Writer",
+        goal="Generate structured and comprehensive medical reports",
+        backstory="Medical documentation expert with clinical writing specialization"
+    ),
+}
+
+
+# Each analysis checks out its own set of agents (see AgentPool); by default
+# one set is kept per pipeline worker
+AGENT_POOL_SIZE = int(os.getenv("BRAINTUMOR_AGENT_POOL_SIZE",
+                                os.getenv("BRAINTUMOR_PIPELINE_WORKERS", "2")))
+# CrewAI prints every agent step when verbose
+AGENT_VERBOSE = os.getenv("BRAINTUMOR_AGENT_VERBOSE", "1").lower() not in ("0", "false", "no")
+
+_current_agents = contextvars.ContextVar("current_agents", default=None)
+
+
+def build_agent(name: str, verbose: bool = None) -> Agent:
+    """Build a new agent; its LLM client is the shared one of its profile.
+
+    `verbose` defaults to AGENT_VERBOSE.
+    """
+    return Agent(
+        **AGENT_SPECS[name],
+        llm=get_llm(name),
+        verbose=AGENT_VERBOSE if verbose is None else verbose,
+        allow_delegation=False
+    )
+
+
+def build_agents(verbose: bool = None) -> dict:
+    """Build one independent set of the four agents."""
+    return {name: build_agent(name, verbose) for name in AGENT_SPECS}
+
+
+class AgentPool:
+    """Independent agent sets, each used by one analysis at a time.
+
+    CrewAI keeps the executor of a running task (prompt, messages, tools) on
+    the Agent object, so concurrent analyses sharing an Agent read each
+    other's conversation. Up to `size` sets are kept for reuse; an analysis
+    finding none idle gets a new set, dropped when it is returned to a full
+    pool. Only the LLM clients and the VGG19 model are shared.
+    """
+
+    def __init__(self, size: int = AGENT_POOL_SIZE, verbose: bool = None):
+        self.size = max(1, size)
+        self.verbose = verbose
+        self._idle = []
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def prefill(self, count: int = None):
+        """Build idle sets ahead of use, up to `count` (default `size`)."""
+        count = min(self.size, self.size if count is None else count)
+        while True:
+            with self._lock:
+                if len(self._idle) + self._in_use >= count:
+                    return
+            self._release(build_agents(self.verbose), checked_out=False)
+
+    def _release(self, agents: dict, checked_out: bool = True):
+        with self._lock:
+            if checked_out:
+                self._in_use -= 1
+            if len(self._idle) + self._in_use < self.size:
+                self._idle.append(agents)
+
+    @contextmanager
+    def checkout(self):
+        """Make a set of agents the current one (see `get_agent`) for this context.
+
+        Nested checkouts in the same context reuse the outer set.
+
+        Yields:
+            {agent name: Agent}
+        """
+        agents = _current_agents.get()
+        if agents is not None:
+            yield agents
+            return
+        with self._lock:
+            agents = self._idle.pop() if self._idle else None
+            self._in_use += 1
+        if agents is None:
+            try:
+                agents = build_agents(self.verbose)
+            except Exception:
+                with self._lock:
+                    self._in_use -= 1
+                raise
+        token = _current_agents.set(agents)
+        try:
+            yield agents
+        finally:
+            _current_agents.reset(token)
+            self._release(agents)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": self.size, "in_use": self._in_use, "idle": len(self._idle)}
+
+
+registry.register("agent_pool", AgentPool)
+
+
+def get_agent_pool() -> AgentPool:
+    """Return the process-wide agent pool."""
+    return registry.get("agent_pool")
+
+
+def get_agent(name: str) -> Agent:
+    """Return the agent `name` of the set checked out in this context.
+
+    Outside a checkout, a new agent is built for the caller alone: agents are
+    never shared between concurrent analyses.
+    """
+    agents = _current_agents.get()
+    if agents is not None:
+        return agents[name]
+    return build_agent(name)
+
 
-classifier_agent = Agent(
-    role="AI Radiology Specialist",
-    goal="Classify brain MRI images to detect tumors",
-    backstory="Expert in medical imaging with deep learning specialization",
-    llm=llm,
-    verbose=True,
-    allow_delegation=False
-)
-
-clinical_analyst_agent = Agent(
-    role="Clinical Analyst",
-    goal="Analyze results with medical context and determine tumor characteristics",
-    backstory="Experienced clinician with oncology expertise",
-    llm=llm,
-    verbose=True,
-    allow_delegation=False
-)
-
-recommendations_agent = Agent(
-    role="Treatment Recommendations Specialist",
-    goal="Provide evidence-based clinical recommendations for patient care",
-    backstory="Board-certified oncologist with treatment protocol expertise",
-    llm=llm,
-    verbose=True,
-    allow_delegation=False
-)
-
-report_agent = Agent(
-    role="Medical Report Writer",
-    goal="Generate structured and comprehensive medical reports",
-    backstory="Medical documentation expert with clinical writing specialization",
-    llm=llm,
-    verbose=True,
-    allow_delegation=False
-)
+def __getattr__(name):
+    # Keeps `from crew.agents import classifier_agent` working
+    if name in AGENT_SPECS:
+        return get_agent(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,63 +1,65 @@
-from crewai import Crew, Process
-from crew.tasks import (
-    create_classification_task,
-    create_clinical_analysis_task,
-    create_recommendations_task,
-    create_report_task
-)
-from crew.agents import (
-    classifier_agent,
-    clinical_analyst_agent,
-    recommendations_agent,
-    report_agent
-)
+import tracing
+import upload_store
+from config import PIPELINE_MODE
+from crew.agents import get_agent_pool
+from crew.scheduler import MAX_PARALLEL_TASKS, run_task_graph
+from pipeline import build_agent_graph, run_agent, structure_result
 
 
 class BrainTumorAnalysisCrew:
     """CrewAI-based system for comprehensive brain tumor MRI analysis."""
 
-    def __init__(self):
-        """Initialize the analysis crew with empty results storage."""
+    def __init__(self, pipeline_mode: str = PIPELINE_MODE, max_parallelism: int = MAX_PARALLEL_TASKS):
+        """Initialize the analysis crew with empty results storage.
+
+        Args:
+            pipeline_mode (str): "direct" to call deterministic tools without the
+                LLM, "llm" to route every step through its agent.
+            max_parallelism (int): Maximum number of agents running concurrently.
+        """
         self.results = {}
+        self.timings = {}
+        self.pipeline_mode = pipeline_mode
+        self.max_parallelism = max_parallelism
+
+    def build_graph(self, image_path: str, classification_result: str = None) -> dict:
+        """
+        Describe the analysis as the dependency graph of the pipeline agents.
+
+        The same graph is run by background jobs (pipeline.run_pipeline):
+        clinical analysis needs the classification, the recommendations
+        the clinical analysis, and the report all of them. A
+        `classification_result` computed elsewhere replaces the first task.
+        """
+        graph = build_agent_graph(
+            image_path,
+            lambda agent, context: run_agent(agent, context, pipeline_mode=self.pipeline_mode)
+        )
+        if classification_result is not None:
+            # Downstream tasks and the report get the canonical "Label: value" lines
+            text, _ = structure_result(classification_result, "classification")
+            graph["classification"]["run"] = lambda results: text
+        return graph
 
-    def analyze(self, image_path: str):
+    def analyze(self, image_path: str, classification_result: str = None):
         """
         Execute the complete analysis workflow for brain tumor detection and analysis.
 
+        Per-task outputs are kept in `self.results` and per-task timings
+        (queued/start/end/duration, in seconds) in `self.timings`.
+
         Args:
-            image_path (str): Path to the MRI image file to analyze.
+            image_path (str): Path or "upload:<hash>" reference of the MRI image to analyze.
+            classification_result (str): Classifier output already computed for
+                this image (e.g. by a batch run), so it is not classified again.
 
         Returns:
             str: Complete analysis report including classification, clinical analysis,
                  recommendations, and final medical report.
         """
-
-        # 1️⃣ Classification task
-        classification_task = create_classification_task(image_path)
-        classification_crew = Crew(
-            agents=[classifier_agent],
-            tasks=[classification_task],
-            process=Process.sequential,
-            verbose=True
-        )
-        classification_result = classification_crew.kickoff()
-
-        # 2️⃣ Create subsequent tasks (all using classification result)
-        clinical_task = create_clinical_analysis_task(str(classification_result))
-        recommendations_task = create_recommendations_task(str(classification_result))
-        report_task = create_report_task(
-            str(classification_result),
-            str(classification_result),  # Placeholder - could be clinical result later
-            str(classification_result)   # Placeholder - could be recommendations later
-        )
-
-        # 3️⃣ Full crew for remaining agents
-        full_crew = Crew(
-            agents=[clinical_analyst_agent, recommendations_agent, report_agent],
-            tasks=[clinical_task, recommendations_task, report_task],
-            process=Process.sequential,
-            verbose=True
-        )
-        result = full_crew.kickoff()
-
-        return result
+        graph = self.build_graph(image_path, classification_result)
+        # Agents hold the state of their running task: this analysis gets its own set
+        with get_agent_pool().checkout(), \
+                tracing.span("crew.analyze", image=upload_store.display_name(image_path)):
+            self.results, self.timings = run_task_graph(graph, max_parallelism=self.max_parallelism)
+        return self.results["rapport"]
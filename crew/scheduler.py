@@ -0,0 +1,85 @@
+# crew/scheduler.py
+import contextvars
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Upper bound on agents running at once, to avoid overloading Ollama
+MAX_PARALLEL_TASKS = int(os.getenv("BRAINTUMOR_MAX_PARALLEL_TASKS", "2"))
+
+
+def _check_graph(graph: dict):
+    """Reject unknown dependencies and cycles before anything runs."""
+    for name, node in graph.items():
+        for dep in node.get("deps", []):
+            if dep not in graph:
+                raise ValueError(f"Task '{name}' depends on unknown task '{dep}'")
+
+    visiting, visited = set(), set()
+
+    def visit(name):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle involving task '{name}'")
+        visiting.add(name)
+        for dep in graph[name].get("deps", []):
+            visit(dep)
+        visiting.discard(name)
+        visited.add(name)
+
+    for name in graph:
+        visit(name)
+
+
+def run_task_graph(graph: dict, max_parallelism: int = MAX_PARALLEL_TASKS) -> tuple:
+    """Run tasks as soon as their dependencies are done, in a thread pool.
+
+    Args:
+        graph: {name: {"deps": [names], "run": callable(results) -> str}}.
+            `run` receives the outputs of the tasks completed so far.
+        max_parallelism: Maximum number of tasks running at the same time
+
+    Returns:
+        (results, timings): outputs by task name, and per-task
+        {"queued", "start", "end", "duration"} in seconds relative to the
+        start of the graph
+    """
+    _check_graph(graph)
+    results, timings = {}, {}
+    pending = dict(graph)
+    running = {}
+    origin = time.perf_counter()
+
+    def _run(name, run, inputs):
+        start = time.perf_counter()
+        try:
+            return run(inputs)
+        finally:
+            end = time.perf_counter()
+            timings[name].update(start=start - origin, end=end - origin, duration=end - start)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallelism), thread_name_prefix="crew-task") as pool:
+        while pending or running:
+            ready = [
+                name for name, node in pending.items()
+                if all(dep in results for dep in node.get("deps", []))
+            ]
+            for name in ready:
+                node = pending.pop(name)
+                timings[name] = {"queued": time.perf_counter() - origin}
+                # Copy the context so context variables follow the task into its thread
+                ctx = contextvars.copy_context()
+                running[pool.submit(ctx.run, _run, name, node["run"], dict(results))] = name
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    raise
+
+    return results, timings
@@ -0,0 +1,174 @@
+# crew/schemas.py - Typed outputs of the classification, clinical and recommendations agents
+import json
+import re
+from typing import ClassVar, Optional
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+
+def _normalize_key(key: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", key.strip().strip("*").lower()).strip("_")
+
+
+class AgentOutput(BaseModel):
+    """Base of the agent output schemas.
+
+    `LABELS` maps each field to the label of its line in the rendered text
+    (the format shown in the UI and fed to the next agents); `ALIASES` lists
+    other keys the LLM may use for a field.
+    """
+
+    LABELS: ClassVar[dict] = {}
+    ALIASES: ClassVar[dict] = {}
+    EXAMPLE: ClassVar[dict] = {}
+
+    def render(self) -> str:
+        """The output as "Label: value" lines (unset optional fields are left out)."""
+        return "\n".join(
+            f"{label}: {self._format(field)}" for field, label in self.LABELS.items()
+            if getattr(self, field) is not None
+        )
+
+    def _format(self, field: str) -> str:
+        return str(getattr(self, field))
+
+    @classmethod
+    def json_instructions(cls) -> str:
+        """Prompt snippet asking for this schema as a JSON object."""
+        return (
+            "Respond with ONLY a JSON object, no text before or after it, with exactly these keys:\n"
+            + json.dumps(cls.EXAMPLE, ensure_ascii=False)
+        )
+
+    @classmethod
+    def _field_for(cls, key: str):
+        key = _normalize_key(key)
+        for field, label in cls.LABELS.items():
+            names = [field, _normalize_key(label)] + cls.ALIASES.get(field, [])
+            if key in names:
+                return field
+        return None
+
+    @classmethod
+    def _from_mapping(cls, data: dict):
+        values = {}
+        for key, value in data.items():
+            field = cls._field_for(str(key))
+            if field and field not in values:
+                values[field] = value
+        return cls.model_validate(values)
+
+    @classmethod
+    def parse(cls, text: str):
+        """Parse an LLM or tool answer: a JSON object, else "Label: value" lines.
+
+        Raises:
+            ValueError: If no valid object can be read from `text`, in
+                particular for a truncated or malformed JSON object
+        """
+        text = (text or "").strip()
+        text = re.sub(r"^.*?Final Answer:\s*", "", text, flags=re.S)
+        start = text.find("{")
+        if start != -1:
+            end = text.rfind("}")
+            if end < start:
+                raise ValueError(f"Could not parse {cls.__name__}: JSON object not closed (truncated answer?)")
+            try:
+                data = json.loads(text[start:end + 1])
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Could not parse {cls.__name__}: invalid JSON ({e.msg})") from e
+            if not isinstance(data, dict):
+                raise ValueError(f"Could not parse {cls.__name__}: JSON answer is not an object")
+            try:
+                return cls._from_mapping(data)
+            except ValidationError as e:
+                raise ValueError(f"Could not parse {cls.__name__}: {e.errors()[0]['msg']}") from e
+
+        lines = {}
+        for line in text.splitlines():
+            key, sep, value = line.partition(":")
+            value = value.strip().strip("*").strip()
+            if sep and value:
+                lines[key] = value
+        try:
+            return cls._from_mapping(lines)
+        except ValidationError as e:
+            raise ValueError(f"Could not parse {cls.__name__}: {e.errors()[0]['msg']}") from e
+
+
+class ClassificationOutput(AgentOutput):
+    diagnosis: str
+    confidence: float = Field(ge=0, le=100, description="Confidence in percent")
+    tumor_probability: float = Field(ge=0, le=100, description="Tumor probability in percent")
+    # Volumes only: most suspicious axial slices, "index (probability)"
+    suspicious_slices: Optional[str] = None
+
+    LABELS: ClassVar[dict] = {
+        "diagnosis": "Diagnosis", "confidence": "Confidence", "tumor_probability": "Tumor probability",
+        "suspicious_slices": "Suspicious slices",
+    }
+    ALIASES: ClassVar[dict] = {"tumor_probability": ["probability"]}
+    EXAMPLE: ClassVar[dict] = {"diagnosis": "Tumor detected | No tumor detected", "confidence": 0.0, "tumor_probability": 0.0}
+
+    @field_validator("confidence", "tumor_probability", mode="before")
+    @classmethod
+    def _percent(cls, value):
+        if isinstance(value, str):
+            value = value.strip().rstrip("%").strip()
+        return value
+
+    def _format(self, field: str) -> str:
+        if field in ("diagnosis", "suspicious_slices"):
+            return getattr(self, field)
+        return f"{getattr(self, field):.1f}%"
+
+
+class ClinicalOutput(AgentOutput):
+    probable_type: str
+    who_grade: str
+    prognosis: str
+
+    LABELS: ClassVar[dict] = {"probable_type": "Probable type", "who_grade": "WHO Grade", "prognosis": "Prognosis without treatment"}
+    ALIASES: ClassVar[dict] = {"probable_type": ["type", "tumor_type"], "who_grade": ["grade"], "prognosis": ["prognosis_without_treatment"]}
+    EXAMPLE: ClassVar[dict] = {
+        "probable_type": "Glioblastoma | Meningioma | Astrocytoma | ...",
+        "who_grade": "I | II | III | IV | Undetermined",
+        "prognosis": "median survival X months",
+    }
+
+
+class RecommendationsOutput(AgentOutput):
+    urgency: str
+    next_step: str
+    standard_treatment: str
+
+    LABELS: ClassVar[dict] = {"urgency": "Urgency", "next_step": "Next step", "standard_treatment": "Standard treatment"}
+    ALIASES: ClassVar[dict] = {"standard_treatment": ["treatment"]}
+    EXAMPLE: ClassVar[dict] = {
+        "urgency": "Immediate | Within 48h | Planned within 2 weeks",
+        "next_step": "Follow-up MRI | Neurosurgical consultation | Biopsy | ...",
+        "standard_treatment": "Surgery + radiotherapy + temozolomide | ...",
+    }
+
+
+# Schemas by pipeline agent id; the report is free text
+SCHEMAS = {
+    "classification": ClassificationOutput,
+    "clinique": ClinicalOutput,
+    "recommandations": RecommendationsOutput,
+}
+
+
+def structure_output(text: str, schema):
+    """Parse an agent answer and render it canonically.
+
+    Returns:
+        (rendered text, parsed object); the stripped answer and None if it
+        does not match the schema
+    """
+    try:
+        parsed = schema.parse(text)
+    except ValueError as e:
+        print(f"[WARN] {e}; keeping the raw answer")
+        return (text or "").strip(), None
+    return parsed.render(), parsed
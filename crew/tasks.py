@@ -1,12 +1,8 @@
 # crew/tasks.py
 from crewai import Task
-from crew.agents import (
-    classifier_agent,
-    clinical_analyst_agent,
-    recommendations_agent,
-    report_agent
-)
-from tools.classifier_tool import classify_brain_mri
+from crew.agents import get_agent
+from crew.schemas import ClassificationOutput, ClinicalOutput, RecommendationsOutput
+from tools.classifier_tool import classify_brain_mri, classify_image
 from tools.medical_knowledge_tool import search_medical_knowledge
 from datetime import datetime
 
@@ -16,51 +12,61 @@ def create_classification_task(image_path: str) -> Task:
         description=f"""Analyze the MRI image to detect brain tumors.
 Use the classify_brain_mri tool with the path: {image_path}
 
-You must return EXACTLY these three lines (nothing else):
-Diagnosis: Tumor detected / No tumor detected
-Confidence: XX.X%
-Tumor probability: XX.X%""",
-        agent=classifier_agent,
+Your final answer must be the tool result as a JSON object (percentages as numbers).
+{ClassificationOutput.json_instructions()}""",
+        agent=get_agent("classifier_agent"),
         tools=[classify_brain_mri],
-        expected_output="Three lines: Diagnosis, Confidence, and Tumor probability"
+        expected_output="JSON object with diagnosis, confidence and tumor_probability"
     )
 
 
+def run_classification_direct(image_path: str) -> str:
+    """Run the classification tool directly, without an LLM round trip.
+
+    The classifier agent only relays the tool output, so in "direct" pipeline
+    mode the tool result is used as the agent output.
+    """
+    return classify_image(image_path)
+
+
+def _knowledge(query: str) -> str:
+    # Retrieved up front: the JSON-mode agents cannot emit ReAct tool calls
+    return search_medical_knowledge.run(query=query)
+
+
 def create_clinical_analysis_task(classification_result: str) -> Task:
+    knowledge = _knowledge("brain tumor types WHO grade prognosis survival")
     return Task(
         description=f"""Perform comprehensive clinical analysis based on previous results:
 
 CLASSIFICATION:
 {classification_result}
 
-Use search_medical_knowledge to enhance your analysis.
-Return ONLY in English and in this format:
+MEDICAL KNOWLEDGE:
+{knowledge}
 
-Probable type: Glioblastoma / Meningioma / Astrocytoma / etc.
-WHO Grade: I / II / III / IV / Undetermined
-Prognosis without treatment: median survival X months""",
-        agent=clinical_analyst_agent,
-        tools=[search_medical_knowledge],
-        expected_output="Clinical analysis in 3 lines: Probable type, WHO Grade, Prognosis"
+Answer in English.
+{ClinicalOutput.json_instructions()}""",
+        agent=get_agent("clinical_analyst_agent"),
+        expected_output="JSON object with probable_type, who_grade and prognosis"
     )
 
 
 def create_recommendations_task(clinical_result: str) -> Task:
+    knowledge = _knowledge("treatment protocols surgery radiotherapy chemotherapy diagnostic examinations")
     return Task(
         description=f"""Provide appropriate clinical recommendations.
 
 CLINICAL ANALYSIS:
 {clinical_result}
 
-Use search_medical_knowledge if needed.
-Return ONLY:
+MEDICAL KNOWLEDGE:
+{knowledge}
 
-Urgency: Immediate / Within 48h / Planned within 2 weeks
-Next step: Follow-up MRI / Neurosurgical consultation / Biopsy / etc.
-Standard treatment: Surgery + radiotherapy + temozolomide / etc.""",
-        agent=recommendations_agent,
-        tools=[search_medical_knowledge],
-        expected_output="Recommendations in 3 lines: Urgency, Next step, Standard treatment"
+Answer in English.
+{RecommendationsOutput.json_instructions()}""",
+        agent=get_agent("recommendations_agent"),
+        expected_output="JSON object with urgency, next_step and standard_treatment"
     )
 
 
@@ -88,6 +94,6 @@ RECOMMENDATIONS:
 Report date: {datetime.now().strftime("%d/%m/%Y %H:%M")}
 Generated by: BrainTumorAISystem Multi-Agent System
 ═══════════════════════════════════════""",
-        agent=report_agent,
+        agent=get_agent("report_agent"),
         expected_output="Complete and structured medical report with headers and separators"
     )
\ No newline at end of file
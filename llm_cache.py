@@ -0,0 +1,231 @@
+# llm_cache.py - Persistent LLM response cache with in-flight request coalescing
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from crewai import BaseLLM
+
+import tracing
+
+
+def normalize_prompt(messages) -> str:
+    """Collapse whitespace so that cosmetic prompt differences share a cache entry."""
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    normalized = [
+        {"role": m.get("role", "user"), "content": re.sub(r"\s+", " ", str(m.get("content", ""))).strip()}
+        for m in messages
+    ]
+    return json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+
+
+def make_key(model: str, temperature, agent_role: str, messages, stop=None) -> str:
+    """Cache key from model name, temperature, agent role and the normalized prompt."""
+    prompt_hash = hashlib.sha256(normalize_prompt(messages).encode()).hexdigest()
+    parts = [model, repr(temperature), agent_role or "", json.dumps(sorted(stop or [])), prompt_hash]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response store with TTL and size-based eviction.
+
+    Identical requests that are already being generated are coalesced: the
+    first caller generates, the others wait for its result.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 86400, max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_created ON responses (created)")
+        self._db.commit()
+
+    def get(self, key: str):
+        """Return a fresh cached response, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return row[0]
+
+    def put(self, key: str, response: str):
+        """Store a response and evict the oldest entries beyond the size limit."""
+        size = len(response.encode())
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time())
+            )
+            self._db.execute(
+                "DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,)
+            )
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                for old_key, old_size in self._db.execute(
+                    "SELECT key, size FROM responses ORDER BY created"
+                ).fetchall():
+                    if excess <= 0:
+                        break
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    excess -= old_size
+            self._db.commit()
+
+    def get_or_generate(self, key: str, generate) -> str:
+        """Return the cached response for `key`, generating it at most once."""
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            response = generate()
+            if isinstance(response, str):
+                self.put(key, response)
+            future.set_result(response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stats(self) -> dict:
+        """Return hit/miss/coalesced counters and the number of stored entries."""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": entries}
+
+
+class LLMWrapper(BaseLLM):
+    """Base for LLMs that delegate generation to a wrapped CrewAI LLM."""
+
+    def __init__(self, llm):
+        self.llm = llm
+        stop = list(getattr(llm, "stop", None) or [])
+        super().__init__(model=llm.model, temperature=llm.temperature, base_url=getattr(llm, "base_url", None))
+        self.stop = stop
+        self.is_litellm = getattr(llm, "is_litellm", False)
+
+    # CrewAI's agent executor appends its stop words to `llm.stop`;
+    # forward them to the wrapped LLM that actually generates.
+    @property
+    def stop(self):
+        return self.llm.stop
+
+    @stop.setter
+    def stop(self, value):
+        self.llm.stop = value
+
+    def call(
+        self,
+        messages,
+        tools=None,
+        callbacks=None,
+        available_functions=None,
+        from_task=None,
+        from_agent=None,
+        response_model=None
+    ):
+        return self.llm.call(
+            messages,
+            tools=tools,
+            callbacks=callbacks,
+            available_functions=available_functions,
+            from_task=from_task,
+            from_agent=from_agent,
+            response_model=response_model
+        )
+
+    def supports_function_calling(self) -> bool:
+        return self.llm.supports_function_calling()
+
+    def supports_stop_words(self) -> bool:
+        return self.llm.supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self.llm.get_context_window_size()
+
+    def get_token_usage_summary(self):
+        return self.llm.get_token_usage_summary()
+
+
+class CachedLLM(LLMWrapper):
+    """Wraps a CrewAI LLM and answers repeated prompts from a ResponseCache.
+
+    Calls that pass tools, callable functions or a response model are not
+    cached since their result depends on more than the prompt.
+    """
+
+    def __init__(self, llm, cache: ResponseCache):
+        super().__init__(llm)
+        self.cache = cache
+
+    def call(
+        self,
+        messages,
+        tools=None,
+        callbacks=None,
+        available_functions=None,
+        from_task=None,
+        from_agent=None,
+        response_model=None
+    ):
+        generated = []
+
+        def generate():
+            generated.append(True)
+            return super(CachedLLM, self).call(
+                messages,
+                tools=tools,
+                callbacks=callbacks,
+                available_functions=available_functions,
+                from_task=from_task,
+                from_agent=from_agent,
+                response_model=response_model
+            )
+
+        if tools or available_functions or response_model:
+            return generate()
+
+        role = getattr(from_agent, "role", None)
+        key = make_key(self.model, self.temperature, role, messages, self.stop)
+        result = self.cache.get_or_generate(key, generate)
+        tracing.annotate(cache_hit=not generated)
+        return result
@@ -0,0 +1,89 @@
+# llm_streaming.py - Collect LLM tokens as they are streamed by the Ollama backend
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+_current_stream = contextvars.ContextVar("current_token_stream", default=None)
+_subscribed = False
+_subscribe_lock = threading.Lock()
+
+
+class TokenStream:
+    """Tokens received for one agent execution, with latency statistics."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.last_token_at = None
+        self.token_count = 0
+        self._chunks = []
+        self._lock = threading.Lock()
+
+    def add(self, chunk: str):
+        now = time.perf_counter()
+        with self._lock:
+            if self.first_token_at is None:
+                self.first_token_at = now
+            self.last_token_at = now
+            self.token_count += 1  # Ollama streams roughly one token per chunk
+            self._chunks.append(chunk)
+
+    @property
+    def text(self) -> str:
+        with self._lock:
+            return "".join(self._chunks)
+
+    @property
+    def time_to_first_token(self):
+        """Seconds between the start of the agent and the first token, or None."""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def tokens_per_second(self):
+        """Generation rate after the first token, or None."""
+        if self.first_token_at is None or self.last_token_at == self.first_token_at:
+            return None
+        return (self.token_count - 1) / (self.last_token_at - self.first_token_at)
+
+    def stats(self) -> dict:
+        return {
+            "ttft": self.time_to_first_token,
+            "tokens_per_second": self.tokens_per_second,
+            "tokens": self.token_count,
+        }
+
+
+def _on_stream_chunk(source, event):
+    # Stream chunk events are dispatched synchronously in the generating thread,
+    # so the context variable set around the agent execution is visible here.
+    stream = _current_stream.get()
+    if stream is not None and event.chunk:
+        stream.add(event.chunk)
+
+
+def _subscribe():
+    global _subscribed
+    with _subscribe_lock:
+        if not _subscribed:
+            from crewai.events import LLMStreamChunkEvent, crewai_event_bus
+            crewai_event_bus.register_handler(LLMStreamChunkEvent, _on_stream_chunk)
+            _subscribed = True
+
+
+@contextmanager
+def capture_tokens(stream: TokenStream = None):
+    """Route the tokens streamed by LLM calls in this context into `stream`.
+
+    Yields:
+        The TokenStream receiving the tokens
+    """
+    _subscribe()
+    stream = stream if stream is not None else TokenStream()
+    token = _current_stream.set(stream)
+    try:
+        yield stream
+    finally:
+        _current_stream.reset(token)
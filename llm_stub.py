@@ -0,0 +1,52 @@
+# llm_stub.py - Deterministic stand-in for the Ollama LLM (local testing)
+import time
+from crewai import BaseLLM
+
+# Templated answers by agent role, in the formats requested by crew/tasks.py
+STUB_ANSWERS = {
+    "AI Radiology Specialist": """Diagnosis: Tumor detected
+Confidence: 91.2%
+Tumor probability: 91.2%""",
+    "Clinical Analyst": """Probable type: Glioblastoma
+WHO Grade: IV
+Prognosis without treatment: median survival 3 months""",
+    "Treatment Recommendations Specialist": """Urgency: Within 48h
+Next step: Neurosurgical consultation
+Standard treatment: Surgery + radiotherapy + temozolomide""",
+    "Medical Report Writer": """═══════════════════════════════════════
+BRAIN MRI ANALYSIS REPORT – BrainTumorAISystem
+═══════════════════════════════════════
+(stub report generated without an LLM)
+═══════════════════════════════════════""",
+}
+
+
+class StubLLM(BaseLLM):
+    """Answers every prompt with a fixed, role-specific final answer.
+
+    Lets the pipeline, the job API and load tests run without Ollama.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        """
+        Args:
+            delay: Seconds to sleep per call, to mimic generation time
+        """
+        super().__init__(model="stub/mistral", temperature=0.0)
+        self.delay = delay
+
+    def call(
+        self,
+        messages,
+        tools=None,
+        callbacks=None,
+        available_functions=None,
+        from_task=None,
+        from_agent=None,
+        response_model=None
+    ):
+        if self.delay:
+            time.sleep(self.delay)
+        role = getattr(from_agent, "role", None)
+        answer = STUB_ANSWERS.get(role, "Stub answer")
+        return f"Thought: I now know the final answer\nFinal Answer: {answer}"
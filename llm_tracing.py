@@ -0,0 +1,102 @@
+# llm_tracing.py - Span around every LLM request, with token counts
+import contextvars
+
+import tracing
+from llm_cache import LLMWrapper
+
+# Usage of the responses received by the LLM call running in this context
+_response_usage = contextvars.ContextVar("llm_response_usage", default=None)
+
+
+def _tokens(usage, *names) -> int:
+    # Usage is a dict or a provider object, depending on the response
+    for name in names:
+        value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+        if value:
+            return int(value)
+    return 0
+
+
+def _generating_llm(llm):
+    while isinstance(llm, LLMWrapper):
+        llm = llm.llm
+    return llm
+
+
+def _report_usage_per_response(llm):
+    """Hand the usage of each response to the call that received it.
+
+    CrewAI adds the usage of every response to per-client counters, which
+    concurrent calls share; the call's own usage is recorded as well in the
+    context of the caller.
+    """
+    track = getattr(llm, "_track_token_usage_internal", None)
+    if track is None or getattr(track, "reports_usage", False):
+        return
+
+    def track_and_report(usage_data):
+        responses = _response_usage.get()
+        if responses is not None:
+            responses.append(usage_data)
+        return track(usage_data)
+
+    track_and_report.reports_usage = True
+    llm._track_token_usage_internal = track_and_report
+
+
+def _text_length(messages) -> int:
+    if isinstance(messages, str):
+        return len(messages)
+    return sum(len(str(m.get("content", ""))) for m in messages)
+
+
+class TracedLLM(LLMWrapper):
+    """Records an "llm.call" span per request.
+
+    Token counts come from the usage of the responses received by this very
+    call. When the provider reports none (e.g. a cache hit, a non-streamed
+    response or a stream without usage), they are estimated at four
+    characters per token and flagged as such.
+    """
+
+    def __init__(self, llm):
+        super().__init__(llm)
+        _report_usage_per_response(_generating_llm(llm))
+
+    def call(
+        self,
+        messages,
+        tools=None,
+        callbacks=None,
+        available_functions=None,
+        from_task=None,
+        from_agent=None,
+        response_model=None
+    ):
+        with tracing.span("llm.call", model=self.model, agent=getattr(from_agent, "role", None)) as current:
+            responses = []
+            token = _response_usage.set(responses)
+            try:
+                result = super().call(
+                    messages,
+                    tools=tools,
+                    callbacks=callbacks,
+                    available_functions=available_functions,
+                    from_task=from_task,
+                    from_agent=from_agent,
+                    response_model=response_model
+                )
+            finally:
+                _response_usage.reset(token)
+
+            prompt_tokens = sum(_tokens(u, "prompt_tokens", "prompt_token_count", "input_tokens") for u in responses)
+            completion_tokens = sum(
+                _tokens(u, "completion_tokens", "candidates_token_count", "output_tokens") for u in responses
+            )
+            if prompt_tokens <= 0 and completion_tokens <= 0 and not current.attributes.get("cache_hit"):
+                prompt_tokens = _text_length(messages) // 4
+                completion_tokens = len(str(result)) // 4
+                current.set("tokens_estimated", True)
+            current.set("prompt_tokens", prompt_tokens)
+            current.set("completion_tokens", completion_tokens)
+            return result
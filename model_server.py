@@ -0,0 +1,294 @@
+# model_server.py - Local inference server sharing one VGG19 model between processes
+"""One process owns the classifier model; Streamlit replicas, the job API and
+batch jobs send it their input batches instead of loading a copy each.
+
+Usage:
+    python model_server.py [--address 127.0.0.1:6010] [--backend keras]
+
+Protocol (multiprocessing.connection, mutually HMAC-authenticated with
+MODEL_SERVER_AUTHKEY; messages are pickled, so the secret is mandatory):
+    - each client owns a shared memory segment and writes its float32
+      (N, 224, 224, 3) batch into it: the pixels are never pickled
+    - the client sends ("predict", segment name, shape) and receives
+      ("ok", float32 probabilities as bytes) or ("error", message)
+    - ("ping",) returns ("ok", server info)
+
+The server is opt-in: with MODEL_SERVER_MODE=auto (and the same
+MODEL_SERVER_AUTHKEY), the "vgg19" registry loader of
+tools/classifier_tool.py returns a `ModelServerClient` when a server answers
+at MODEL_SERVER_ADDRESS, and loads the model in-process otherwise. A client
+whose server goes away or stops answering falls back to in-process inference.
+"""
+import argparse
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+# "off" (default): always load the model in-process; "auto": use the server when it answers
+MODEL_SERVER_MODE = os.getenv("MODEL_SERVER_MODE", "off")
+MODEL_SERVER_ADDRESS = os.getenv("MODEL_SERVER_ADDRESS", "127.0.0.1:6010")
+# Shared secret of server and clients; there is deliberately no default
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", "")
+# Seconds to wait when probing for a server
+MODEL_SERVER_CONNECT_TIMEOUT = float(os.getenv("MODEL_SERVER_CONNECT_TIMEOUT", "0.5"))
+# Seconds to wait for a prediction before falling back to in-process inference
+MODEL_SERVER_TIMEOUT = float(os.getenv("MODEL_SERVER_TIMEOUT", "30"))
+
+
+def require_authkey(authkey=None) -> bytes:
+    """The connection secret as bytes.
+
+    Raises:
+        ValueError: If neither `authkey` nor MODEL_SERVER_AUTHKEY is set
+    """
+    authkey = authkey or MODEL_SERVER_AUTHKEY
+    if not authkey:
+        raise ValueError("MODEL_SERVER_AUTHKEY must be set to use the model server")
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+def parse_address(address: str):
+    """"host:port" -> (host, port); anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # The client owns (and unlinks) the segment; before Python 3.13 attaching
+    # registers it with this process's resource tracker, which would unlink it too
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        from multiprocessing import resource_tracker
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+class ModelServer:
+    """Serves `predict` calls of local clients with a single model."""
+
+    def __init__(self, load_model, address=MODEL_SERVER_ADDRESS, authkey: bytes = None, fingerprint=None):
+        """
+        Args:
+            load_model: Zero-argument callable returning a Keras-like model
+            address: "host:port" or Unix socket path
+            authkey: Shared secret of the connection handshake (default
+                MODEL_SERVER_AUTHKEY, required)
+            fingerprint: Optional callable identifying the model file; the
+                model is reloaded when its value changes
+        """
+        self.load_model = load_model
+        self.fingerprint = fingerprint
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.listener = Listener(self.address, authkey=require_authkey(authkey))
+        self._model = None
+        self._model_fingerprint = None
+        self._model_lock = threading.Lock()
+        self._closed = False
+        self.requests = 0
+
+    def model(self):
+        with self._model_lock:
+            current = self.fingerprint() if self.fingerprint else None
+            if self._model is None or current != self._model_fingerprint:
+                start = time.perf_counter()
+                self._model = self.load_model()
+                self._model_fingerprint = current
+                print(f"[INFO] Model loaded in {time.perf_counter() - start:.1f}s")
+            return self._model
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        model = self.model()
+        with self._model_lock:
+            self.requests += 1
+            return np.asarray(model.predict(batch, verbose=0), dtype=np.float32)
+
+    def _handle(self, conn):
+        segments = {}
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if message[0] == "ping":
+                        conn.send(("ok", {"pid": os.getpid(), "requests": self.requests}))
+                        continue
+                    _, name, shape = message
+                    if name not in segments:
+                        for old in segments.values():
+                            old.close()  # The client replaced its segment
+                        segments = {name: _attach(name)}
+                    batch = np.ndarray(shape, dtype=np.float32, buffer=segments[name].buf)
+                    result = self.predict(batch)
+                    del batch  # An exported buffer would keep the segment from closing
+                    conn.send(("ok", result.tobytes()))
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+        finally:
+            for segment in segments.values():
+                segment.close()
+            conn.close()
+
+    def serve_forever(self):
+        print(f"[INFO] Model server listening on {self.address}")
+        while not self._closed:
+            try:
+                conn = self.listener.accept()
+            except Exception:
+                if self._closed:
+                    return
+                continue  # Failed handshake: wrong authkey or a port probe
+            threading.Thread(target=self._handle, args=(conn,), name="model-server-conn", daemon=True).start()
+
+    def shutdown(self):
+        self._closed = True
+        self.listener.close()
+
+
+class ModelServerClient:
+    """Keras-like `predict(batch, verbose=0)` served by a ModelServer.
+
+    Thread-safe: calls share one connection and one shared memory segment
+    under a lock. If the server becomes unreachable or does not answer within
+    `timeout` seconds, `fallback` (when given) loads a local model that serves
+    all later calls.
+    """
+
+    def __init__(self, address=MODEL_SERVER_ADDRESS, authkey: bytes = None, fallback=None,
+                 timeout: float = MODEL_SERVER_TIMEOUT):
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.fallback = fallback
+        self.timeout = timeout
+        self._conn = Client(self.address, authkey=require_authkey(authkey))
+        self._segment = None
+        self._local_model = None
+        self._lock = threading.Lock()
+
+    def _recv(self):
+        if not self._conn.poll(self.timeout):
+            raise TimeoutError(f"No answer from the model server within {self.timeout}s")
+        return self._conn.recv()
+
+    def ping(self) -> dict:
+        with self._lock:
+            self._conn.send(("ping",))
+            return self._recv()[1]
+
+    def _ensure_segment(self, nbytes: int):
+        if self._segment is None or self._segment.size < nbytes:
+            self._release_segment()
+            self._segment = shared_memory.SharedMemory(create=True, size=nbytes)
+
+    def _release_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+
+    def _remote_predict(self, batch: np.ndarray) -> np.ndarray:
+        self._ensure_segment(batch.nbytes)
+        np.ndarray(batch.shape, dtype=np.float32, buffer=self._segment.buf)[...] = batch
+        self._conn.send(("predict", self._segment.name, batch.shape))
+        status, payload = self._recv()
+        if status != "ok":
+            raise RuntimeError(f"Model server error: {payload}")
+        return np.frombuffer(payload, dtype=np.float32).reshape(len(batch), -1)
+
+    def predict(self, batch, verbose: int = 0) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            if self._local_model is None:
+                try:
+                    return self._remote_predict(batch)
+                except (EOFError, OSError) as e:  # OSError includes TimeoutError
+                    # A late answer would desynchronize the connection: drop it
+                    self._conn.close()
+                    if self.fallback is None:
+                        raise
+                    print(f"[WARN] Model server unreachable ({type(e).__name__}), falling back to in-process inference")
+                    self._release_segment()
+                    self._local_model = self.fallback()
+                    if self._local_model is None:
+                        raise RuntimeError("Model server unreachable and local model unavailable") from e
+            return self._local_model.predict(batch, verbose=verbose)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+            self._release_segment()
+
+    def __del__(self):
+        try:
+            self._release_segment()
+        except Exception:
+            pass
+
+
+def connect(fallback=None):
+    """Return a client of the model server, or None if none answers.
+
+    Args:
+        fallback: Loader of a local model used if the server goes away later
+    """
+    if MODEL_SERVER_MODE == "off":
+        return None
+    if not MODEL_SERVER_AUTHKEY:
+        print("[WARN] MODEL_SERVER_MODE is set but MODEL_SERVER_AUTHKEY is not: model server not used")
+        return None
+    address = parse_address(MODEL_SERVER_ADDRESS)
+    if isinstance(address, tuple):
+        # Client() has no timeout: probe the port first
+        import socket
+        try:
+            socket.create_connection(address, timeout=MODEL_SERVER_CONNECT_TIMEOUT).close()
+        except OSError:
+            return None
+    elif not os.path.exists(address):
+        return None
+    try:
+        client = ModelServerClient(address, fallback=fallback)
+        client.ping()
+        return client
+    except Exception as e:
+        print(f"[WARN] Model server at {MODEL_SERVER_ADDRESS} not usable: {e}")
+        return None
+
+
+def main():
+    from tools.model_backends import CLASSIFIER_BACKEND, backend_model_path, load_backend_model
+    from tools.prediction_cache import model_fingerprint
+
+    parser = argparse.ArgumentParser(description="Shared VGG19 inference server")
+    parser.add_argument("--address", default=MODEL_SERVER_ADDRESS, help='"host:port" or Unix socket path')
+    parser.add_argument("--backend", default=CLASSIFIER_BACKEND, help="keras, tflite-fp16 or tflite-int8")
+    args = parser.parse_args()
+
+    if not MODEL_SERVER_AUTHKEY:
+        raise SystemExit("Set MODEL_SERVER_AUTHKEY to a secret shared with the clients")
+    path = backend_model_path(args.backend)
+    if not os.path.exists(path):
+        raise SystemExit(f"Model file not found: {path}")
+    server = ModelServer(
+        lambda: load_backend_model(args.backend),
+        address=args.address,
+        fingerprint=lambda: model_fingerprint(path)
+    )
+    # Load and run the model once before accepting clients
+    server.predict(np.zeros((1, 224, 224, 3), dtype=np.float32))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# neo4j_bulk_loader.py - Bulk, idempotent loading of the medical knowledge graph
+"""Load nodes and relationships from CSV/JSONL files into Neo4j with UNWIND batches.
+
+Usage:
+    python neo4j_bulk_loader.py --nodes tumors.csv treatments.jsonl --edges relations.csv [--batch-size 1000]
+
+Node files need `label` and `name` columns; every other column becomes a
+property. Edge files need `source_label`, `source`, `type`, `target_label`
+and `target`; every other column becomes a relationship property. Nodes are
+identified by (label, name) and MERGEd; properties are only written when
+they differ, so re-running the loader on the same files is a no-op (and
+does not mark the graph as updated).
+Relationships whose endpoints do not exist are skipped and reported.
+"""
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+
+NODE_KEYS = ("label", "name")
+EDGE_KEYS = ("source_label", "source", "type", "target_label", "target")
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def quote_identifier(name: str) -> str:
+    """Validate a label / relationship type and quote it for Cypher."""
+    if not name or not IDENTIFIER.match(name):
+        raise ValueError(f"Invalid label or relationship type: {name!r}")
+    return f"`{name}`"
+
+
+def read_rows(path: str):
+    """Yield dict rows of a CSV or JSONL file, dropping empty values."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            yield {k: v for k, v in row.items() if v not in (None, "")}
+
+
+def _changes(summary) -> int:
+    """Nodes, relationships and properties a query actually created or set."""
+    counters = summary.counters
+    return counters.nodes_created + counters.relationships_created + counters.properties_set
+
+
+def _merge_nodes(tx, label, rows):
+    # MERGE never skips a node row
+    summary = tx.run(f"""
+        UNWIND $rows AS row
+        MERGE (n:{quote_identifier(label)} {{name: row.name}})
+        WITH n, row
+        WHERE any(k IN keys(row.props) WHERE n[k] IS NULL OR n[k] <> row.props[k])
+        SET n += row.props
+    """, rows=rows).consume()
+    return len(rows), _changes(summary)
+
+
+def _merge_edges(tx, source_label, rel_type, target_label, rows):
+    # Rows whose endpoints do not exist match nothing: only merged edges are counted
+    result = tx.run(f"""
+        UNWIND $rows AS row
+        MATCH (a:{quote_identifier(source_label)} {{name: row.source}})
+        MATCH (b:{quote_identifier(target_label)} {{name: row.target}})
+        MERGE (a)-[r:{quote_identifier(rel_type)}]->(b)
+        FOREACH (_ IN CASE WHEN any(k IN keys(row.props) WHERE r[k] IS NULL OR r[k] <> row.props[k])
+                           THEN [1] ELSE [] END | SET r += row.props)
+        RETURN count(r) AS merged
+    """, rows=rows)
+    record = result.single()
+    return (record["merged"] if record else 0), _changes(result.consume())
+
+
+class BulkLoader:
+    """Buffers rows per label / relationship type and writes them in UNWIND batches."""
+
+    def __init__(self, driver, batch_size: int = 1000, create_constraints: bool = True):
+        self.driver = driver
+        self.batch_size = batch_size
+        self.create_constraints = create_constraints
+        self.constrained_labels = set()
+        self.written = 0
+        self.changed = 0  # nodes, relationships and properties created or set
+        self.skipped = 0
+        self.started = time.perf_counter()
+
+    def ensure_constraint(self, label: str):
+        """Create the uniqueness constraint (and its index) on `label.name` once."""
+        if not self.create_constraints or label in self.constrained_labels:
+            return
+        with self.driver.session() as session:
+            session.run(
+                # Exact label: "Gliome" and "GLIOME" are distinct labels
+                f"CREATE CONSTRAINT {quote_identifier(label + '_name_unique')} IF NOT EXISTS "
+                f"FOR (n:{quote_identifier(label)}) REQUIRE n.name IS UNIQUE"
+            ).consume()
+        self.constrained_labels.add(label)
+
+    def _write(self, work, *args) -> int:
+        """Run one batch and return the number of rows actually merged."""
+        with self.driver.session() as session:
+            # Managed transaction: retried automatically on transient errors
+            merged, changed = session.execute_write(work, *args)
+        self.written += merged
+        self.changed += changed
+        elapsed = time.perf_counter() - self.started
+        print(f"\r[INFO] {self.written} rows written  {self.written / elapsed:.0f} rows/s",
+              end="", file=sys.stderr, flush=True)
+        return merged
+
+    def index_names(self):
+        """Normalize the names of the loaded nodes for the visualizer's focus lookup."""
+        from neo4j_connector import NAME_KEY_INDEX, index_node_names
+        with self.driver.session() as session:
+            session.run(NAME_KEY_INDEX).consume()
+            session.execute_write(index_node_names)
+
+    def mark_updated(self):
+        """Let running treatment snapshots see the new data on their next check."""
+        from neo4j_connector import mark_graph_updated
+        with self.driver.session() as session:
+            session.execute_write(mark_graph_updated)
+
+    def load_nodes(self, rows):
+        batches = {}
+        for row in rows:
+            label = row.pop("label")
+            batch = batches.setdefault(label, [])
+            batch.append({"name": row.pop("name"), "props": row})
+            if len(batch) >= self.batch_size:
+                self.ensure_constraint(label)
+                self._write(_merge_nodes, label, batch)
+                batches[label] = []
+        for label, batch in batches.items():
+            if batch:
+                self.ensure_constraint(label)
+                self._write(_merge_nodes, label, batch)
+
+    def load_edges(self, rows):
+        batches = {}
+        for row in rows:
+            group = (row.pop("source_label"), row.pop("type"), row.pop("target_label"))
+            batch = batches.setdefault(group, [])
+            batch.append({"source": row.pop("source"), "target": row.pop("target"), "props": row})
+            if len(batch) >= self.batch_size:
+                self._flush_edges(group, batch)
+                batches[group] = []
+        for group, batch in batches.items():
+            if batch:
+                self._flush_edges(group, batch)
+
+    def _flush_edges(self, group, batch):
+        source_label, rel_type, target_label = group
+        # Endpoint lookups rely on the name index created with the constraint
+        self.ensure_constraint(source_label)
+        self.ensure_constraint(target_label)
+        merged = self._write(_merge_edges, source_label, rel_type, target_label, batch)
+        if merged < len(batch):
+            self.skipped += len(batch) - merged
+            print(f"\n[WARN] {len(batch) - merged} {source_label}-[{rel_type}]->{target_label} "
+                  f"relationships skipped: source or target node not found", file=sys.stderr)
+
+
+def _check_columns(path, rows, required):
+    for row in rows:
+        missing = [key for key in required if key not in row]
+        if missing:
+            raise SystemExit(f"{path}: row without {', '.join(missing)}: {row}")
+        yield row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load the medical knowledge graph into Neo4j")
+    parser.add_argument("--nodes", nargs="*", default=[], help="Node files (CSV or JSONL)")
+    parser.add_argument("--edges", nargs="*", default=[], help="Relationship files (CSV or JSONL)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per UNWIND transaction")
+    parser.add_argument("--no-constraints", action="store_true", help="Do not create uniqueness constraints")
+    args = parser.parse_args()
+
+    from neo4j_connector import driver
+    loader = BulkLoader(driver, batch_size=args.batch_size, create_constraints=not args.no_constraints)
+
+    # Nodes first, so that relationships find their endpoints
+    for path in args.nodes:
+        loader.load_nodes(_check_columns(path, read_rows(path), NODE_KEYS))
+    for path in args.edges:
+        loader.load_edges(_check_columns(path, read_rows(path), EDGE_KEYS))
+
+    # Rows matching the graph already are written but change nothing
+    if loader.changed:
+        loader.index_names()
+        loader.mark_updated()
+    elapsed = time.perf_counter() - loader.started
+    print(f"\n[INFO] Done: {loader.written} rows in {elapsed:.1f}s, {loader.changed} changes",
+          file=sys.stderr)
+    if loader.skipped:
+        print(f"[WARN] {loader.skipped} relationships skipped (missing endpoints)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,45 @@
 # neo4j_connector.py
 from neo4j import GraphDatabase
 import os
+import tracing
 
 # Replace with your credentials
 URI = "neo4j://127.0.0.1:7687"
 USER = "-----"
 PASSWORD = "-----"
 
-driver = GraphDatabase.driver(URI, auth=(USER, PASSWORD))
+# Fail fast when Neo4j is down: callers serve cached data instead of waiting
+CONNECTION_TIMEOUT = float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "5"))
+MAX_RETRY_TIME = float(os.getenv("NEO4J_MAX_RETRY_TIME", "5"))
+
+driver = GraphDatabase.driver(
+    URI, auth=(USER, PASSWORD),
+    connection_timeout=CONNECTION_TIMEOUT,
+    connection_acquisition_timeout=CONNECTION_TIMEOUT,
+    max_transaction_retry_time=MAX_RETRY_TIME
+)
+
+
+def mark_graph_updated(tx):
+    """Touch the last-modified marker read by the treatment snapshot's change token.
+
+    Writers call it after changing properties in place, which node and
+    relationship counts alone would not reveal.
+    """
+    tx.run("MERGE (m:GraphMeta {name:'graph'}) SET m.updated_at = timestamp()")
+
+
+# Lets neo4j_visualizer find a node by case-insensitive name with an index seek
+NAME_KEY_INDEX = "CREATE INDEX entity_name_key IF NOT EXISTS FOR (n:Entity) ON (n.name_key)"
+
+
+def index_node_names(tx):
+    """Give named nodes that lack it the :Entity label and a lowercase `name_key`."""
+    tx.run("""
+        MATCH (n) WHERE n.name IS NOT NULL AND n.name_key IS NULL AND NOT n:GraphMeta
+        SET n:Entity, n.name_key = toLower(n.name)
+    """)
+
 
 # Function to create the medical graph (nodes & relations)
 def create_medical_graph(tx):
@@ -22,11 +54,14 @@ def create_medical_graph(tx):
         MATCH (g:Gliome {name:'Glioblastome'}), (t:Traitement {name:'Chirurgie + Radiothérapie'})
         MERGE (g)-[:TRAITE_PAR]->(t)
     """)
+    index_node_names(tx)
+    mark_graph_updated(tx)
 
 def get_treatments_for_tumor(tx, tumor_name):
     query = """
     MATCH (g {name:$tumor_name})-[:TRAITE_PAR]->(t)
     RETURN t.name AS traitement
     """
-    result = tx.run(query, tumor_name=tumor_name)
-    return [record["traitement"] for record in result]
\ No newline at end of file
+    with tracing.span("neo4j.query", query="treatments_for_tumor"):
+        result = tx.run(query, tumor_name=tumor_name)
+        return [record["traitement"] for record in result]
\ No newline at end of file
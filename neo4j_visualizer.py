@@ -1,31 +1,97 @@
-from neo4j import GraphDatabase
+import threading
+from collections import OrderedDict
 from pyvis.network import Network
-import streamlit as st
 
+import tracing
 from neo4j_connector import driver  # utilise ton driver déjà défini
+from treatment_snapshot import read_change_token
 
-def render_neo4j_graph():
-    net = Network(height="600px", width="100%", directed=True)
+MAX_DEPTH = 3
+MAX_NODES = 500
+# Number of rendered graphs kept in memory
+HTML_CACHE_SIZE = 32
 
-    with driver.session() as session:
-        query = """
+_html_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _neighbourhood_query(focus, depth):
+    if focus is None:
+        return """
         MATCH (a)-[r]->(b)
         RETURN a, r, b
+        LIMIT $row_limit
         """
-        results = session.run(query)
+    # Variable-length bounds cannot be parameters; depth is a validated int
+    return f"""
+    MATCH (f:Entity {{name_key: toLower($focus)}})
+    MATCH p = (f)-[*1..{depth}]-()
+    UNWIND relationships(p) AS r
+    WITH DISTINCT r
+    LIMIT $row_limit
+    RETURN startNode(r) AS a, r, endNode(r) AS b
+    """
+
+
+def _build_html(records, node_limit):
+    net = Network(height="600px", width="100%", directed=True, cdn_resources="in_line")
+    nodes = set()
+
+    for record in records:
+        node_a = record["a"]
+        node_b = record["b"]
+        rel = record["r"]
+
+        # Ajouter les nœuds, sans dépasser la limite
+        for node in (node_a, node_b):
+            if node.element_id not in nodes and len(nodes) < node_limit:
+                net.add_node(node.element_id, label=node.get("name"), title=str(dict(node.items())))
+                nodes.add(node.element_id)
 
-        for record in results:
-            node_a = record["a"]
-            node_b = record["b"]
-            rel = record["r"]
+        # Ajouter la relation
+        if node_a.element_id in nodes and node_b.element_id in nodes:
+            net.add_edge(node_a.element_id, node_b.element_id, label=rel.type)
 
-            # Ajouter les nœuds
-            net.add_node(node_a.id, label=node_a["name"], title=str(node_a.items()))
-            net.add_node(node_b.id, label=node_b["name"], title=str(node_b.items()))
+    return net.generate_html()
+
+
+def render_neo4j_graph(focus: str = None, depth: int = 1, limit: int = 100) -> str:
+    """Render the neighbourhood of a node as an HTML page.
+
+    Args:
+        focus: Name of the node to center on, case-insensitive (whole graph,
+            up to `limit`, if None); looked up through the `name_key` index
+            written by the loaders (neo4j_connector.index_node_names)
+        depth: Number of hops around the focus node (1 to 3)
+        limit: Maximum number of nodes to draw
+
+    Returns:
+        The pyvis HTML, cached per (focus, depth, limit, graph version)
+    """
+    focus = focus.strip() if focus and focus.strip() else None
+    depth = max(1, min(int(depth), MAX_DEPTH))
+    limit = max(1, min(int(limit), MAX_NODES))
+
+    with driver.session() as session:
+        # Node/relationship counts act as a cheap graph version stamp
+        version = session.execute_read(read_change_token)
+        key = (focus.lower() if focus else None, depth, limit, version)
+        with _cache_lock:
+            if key in _html_cache:
+                _html_cache.move_to_end(key)
+                return _html_cache[key]
 
-            # Ajouter la relation
-            net.add_edge(node_a.id, node_b.id, label=type(rel).__name__)
+        # Each relationship adds at most two nodes; fetch a few more rows than
+        # strictly needed since many share nodes
+        with tracing.span("neo4j.query", query="neighbourhood", depth=depth) as current:
+            records = list(session.run(
+                _neighbourhood_query(focus, depth), focus=focus, row_limit=limit * 4
+            ))
+            current.set("rows", len(records))
 
-    # Sauvegarde dans un fichier HTML
-    net.save_graph("neo4j_graph.html")
-    return "neo4j_graph.html"
+    html = _build_html(records, limit)
+    with _cache_lock:
+        _html_cache[key] = html
+        while len(_html_cache) > HTML_CACHE_SIZE:
+            _html_cache.popitem(last=False)
+    return html
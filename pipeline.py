@@ -0,0 +1,341 @@
+# pipeline.py - Four-agent analysis pipeline run as background jobs
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+import upload_store
+from config import PIPELINE_MODE
+
+# Jobs run in this process-wide pool, so they outlive Streamlit reruns
+PIPELINE_WORKERS = int(os.getenv("BRAINTUMOR_PIPELINE_WORKERS", "2"))
+MAX_KEPT_JOBS = int(os.getenv("BRAINTUMOR_MAX_KEPT_JOBS", "100"))
+# Number of recent samples kept per stage for latency statistics
+LATENCY_WINDOW = 1000
+
+
+def _tasks():
+    # Deferred so that importing the pipeline does not import CrewAI and TensorFlow
+    import crew.tasks
+    return crew.tasks
+
+
+# ===================== Agents =====================
+# Task creators receive the job context: {"image_path": ..., "results": {...}},
+# where results holds the outputs of the agent's dependencies ("deps")
+AGENTS = [
+    {
+        "name": "Image Classification Agent",
+        "task": "Tumor detection via VGG19",
+        "id": "classification",
+        "icon": "🔍",
+        "agent_name": "classifier_agent",
+        "deps": [],
+        "task_creator": lambda ctx: _tasks().create_classification_task(ctx["image_path"]),
+        "direct_runner": lambda ctx: _tasks().run_classification_direct(ctx["image_path"])
+    },
+    {
+        "name": "Clinical Knowledge Agent",
+        "task": "Medical data synthesis",
+        "id": "clinique",
+        "icon": "📊",
+        "agent_name": "clinical_analyst_agent",
+        "deps": ["classification"],
+        "task_creator": lambda ctx: _tasks().create_clinical_analysis_task(
+            ctx["results"].get("classification"))
+    },
+    {
+        "name": "Recommendations Agent",
+        "task": "Therapeutic proposal and follow-up",
+        "id": "recommandations",
+        "icon": "💊",
+        "agent_name": "recommendations_agent",
+        "deps": ["clinique"],
+        "task_creator": lambda ctx: _tasks().create_recommendations_task(
+            ctx["results"].get("clinique", "")
+        )
+    },
+    {
+        "name": "Report Writing Agent",
+        "task": "Generation of complete medical report",
+        "id": "rapport",
+        "icon": "📋",
+        "agent_name": "report_agent",
+        "deps": ["classification", "clinique", "recommandations"],
+        "task_creator": lambda ctx: _tasks().create_report_task(
+            classification_result=ctx["results"].get("classification", ""),
+            clinical_result=ctx["results"].get("clinique", ""),
+            recommendations_result=ctx["results"].get("recommandations", "")
+        )
+    }
+]
+
+
+def structure_result(result_str, agent_id):
+    """Parse an agent result into its schema.
+
+    Returns:
+        (display text, structured dict or None); agents without a schema
+        (the report) and unparseable answers keep their text
+    """
+    from crew.schemas import SCHEMAS, structure_output
+    schema = SCHEMAS.get(agent_id)
+    if schema is None:
+        return result_str, None
+    text, parsed = structure_output(result_str, schema)
+    return text, parsed.model_dump() if parsed else None
+
+
+def execute_agent(agent_config, context, token_stream=None, pipeline_mode=PIPELINE_MODE):
+    """Execute an agent and return the result
+
+    Tokens streamed by the LLM are collected in `token_stream` when given.
+
+    Returns:
+        (result text, structured dict or None, error detail or None)
+    """
+    if token_stream is not None:
+        from llm_streaming import capture_tokens
+        with capture_tokens(token_stream):
+            return execute_agent(agent_config, context, pipeline_mode=pipeline_mode)
+    with tracing.span(f"agent.{agent_config['id']}", agent=agent_config['name']) as current:
+        try:
+            if pipeline_mode == "direct" and "direct_runner" in agent_config:
+                # Tool-only agent: use the tool output as is, no LLM round trip
+                result = agent_config['direct_runner'](context)
+            else:
+                # The task's agent belongs to the set checked out for this job
+                task = agent_config['task_creator'](context)
+                result = task.agent.execute_task(task=task)
+            result_str = str(result)
+
+            print(f"\n{'='*60}")
+            print(f"AGENT: {agent_config['name']}")
+            print(f"RAW RESULT:\n{result_str}")
+            print(f"{'='*60}\n")
+
+            text, structured = structure_result(result_str, agent_config['id'])
+            current.set("structured", structured is not None)
+            return text, structured, None
+        except Exception as e:
+            current.status = "error"
+            current.error = str(e)
+            error_detail = f"{str(e)}\n{traceback.format_exc()}"
+            return None, None, error_detail
+
+
+class AgentError(RuntimeError):
+    """An agent of the task graph failed; `detail` holds the message and traceback."""
+
+    def __init__(self, agent_id: str, detail: str):
+        super().__init__(f"{agent_id} failed")
+        self.agent_id = agent_id
+        self.detail = detail
+
+
+def run_agent(agent_config, context, token_stream=None, pipeline_mode=PIPELINE_MODE) -> str:
+    """`execute_agent`, raising AgentError instead of returning the error."""
+    text, _, error = execute_agent(agent_config, context, token_stream, pipeline_mode)
+    if error:
+        raise AgentError(agent_config["id"], error)
+    return text
+
+
+def build_agent_graph(image_path: str, run_stage=run_agent) -> dict:
+    """The agents as a task graph for crew.scheduler.run_task_graph.
+
+    Args:
+        image_path: Path or "upload:<hash>" reference of the image
+        run_stage: callable(agent_config, context) -> result text, called
+            with the outputs of the agent's dependencies in context["results"]
+    """
+    def node_runner(agent):
+        return lambda results: run_stage(agent, {"image_path": image_path, "results": results})
+    return {agent["id"]: {"deps": agent["deps"], "run": node_runner(agent)} for agent in AGENTS}
+
+
+class PipelineJob:
+    """Lightweight status of one analysis, polled by the UI."""
+
+    def __init__(self, image_path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.image_path = image_path
+        self.state = "queued"  # queued / running / completed / failed
+        self.current_agent = 0
+        self.results = {}
+        self.structured = {}  # agent id -> parsed schema fields
+        self.stream_stats = {}
+        self.stage_timings = {}  # agent id -> seconds
+        self.token_stream = None  # TokenStream of the running agent
+        self.trace_id = None
+        self.error = None
+        self.failed_agent = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.finished = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("completed", "failed")
+
+    @property
+    def final_report(self):
+        return self.results.get(AGENTS[-1]["id"])
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at or time.time()
+        return end - (self.started_at or self.submitted_at)
+
+    def to_dict(self) -> dict:
+        """JSON-friendly status (without the per-agent results)."""
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "current_agent": self.current_agent,
+            "agents": [agent["id"] for agent in AGENTS],
+            "completed_agents": [agent["id"] for agent in AGENTS if agent["id"] in self.results],
+            "error": self.error,
+            "queue_wait": (self.started_at or time.time()) - self.submitted_at,
+            "elapsed": self.elapsed,
+            "stage_timings": dict(self.stage_timings),
+            "trace_id": self.trace_id,
+        }
+
+
+def _lookup_neo4j_treatments(job: PipelineJob, clinical_text: str):
+    # Served from the in-memory snapshot: no Neo4j round trip per analysis
+    try:
+        from treatment_snapshot import extract_tumor_type, get_snapshot
+        tumor_type = extract_tumor_type(clinical_text)
+        if tumor_type:
+            traitements = get_snapshot().treatments_for(tumor_type)
+            if traitements:
+                job.results["neo4j_treatments"] = "\n".join(traitements)
+    except Exception as e:
+        print(f"[WARN] Neo4j treatment lookup failed: {e}")
+
+
+_stage_latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+_latency_lock = threading.Lock()
+
+
+def _record_latency(stage: str, seconds: float):
+    with _latency_lock:
+        _stage_latencies[stage].append(seconds)
+
+
+def run_pipeline(job: PipelineJob):
+    """Run the agent graph of a job, updating its status."""
+    from crew.agents import get_agent_pool
+    from crew.scheduler import MAX_PARALLEL_TASKS, run_task_graph
+    from llm_streaming import TokenStream
+    job.state = "running"
+    job.started_at = time.time()
+    _record_latency("queue_wait", job.started_at - job.submitted_at)
+    index = {agent["id"]: i for i, agent in enumerate(AGENTS)}
+
+    def run_stage(agent, context):
+        job.current_agent = index[agent["id"]]
+        # The agents form a chain, so one stage streams at a time
+        job.token_stream = TokenStream()
+        start = time.perf_counter()
+        result_text, structured, error = execute_agent(agent, context, job.token_stream)
+        job.stage_timings[agent["id"]] = time.perf_counter() - start
+        _record_latency(agent["id"], job.stage_timings[agent["id"]])
+        job.stream_stats[agent["id"]] = job.token_stream.stats()
+        job.token_stream = None
+        if error:
+            raise AgentError(agent["id"], error)
+
+        job.results[agent["id"]] = result_text
+        if structured is not None:
+            job.structured[agent["id"]] = structured
+        if agent["id"] == "clinique":
+            _lookup_neo4j_treatments(job, result_text)
+        return result_text
+
+    try:
+        # Agents hold the state of their running task: this job gets its own set
+        with get_agent_pool().checkout(), \
+                tracing.span("pipeline", job_id=job.id, image=upload_store.display_name(job.image_path)) as root:
+            job.trace_id = root.trace_id
+            try:
+                run_task_graph(build_agent_graph(job.image_path, run_stage), max_parallelism=MAX_PARALLEL_TASKS)
+            except AgentError as e:
+                job.error = e.detail
+                job.failed_agent = index[e.agent_id]
+                job.state = "failed"
+                root.status = "error"
+                root.error = str(e)
+                return
+
+            job.current_agent = len(AGENTS)
+            job.state = "completed"
+            _record_latency("total", time.time() - job.started_at)
+    except Exception as e:
+        # Outside execute_agent (tracing, Neo4j lookup, ...): the job must not stay "running"
+        job.error = f"{type(e).__name__}: {e}"
+        if job.current_agent < len(AGENTS):
+            job.failed_agent = job.current_agent
+        job.token_stream = None
+        job.state = "failed"
+        print(f"[WARN] Pipeline job {job.id} failed: {job.error}")
+    finally:
+        job.finished_at = time.time()
+        job.finished.set()
+
+
+def stage_latency_summary() -> dict:
+    """p50/p95/mean latency in seconds of each stage over recent jobs."""
+    summary = {}
+    with _latency_lock:
+        samples = {stage: sorted(values) for stage, values in _stage_latencies.items()}
+    for stage, values in samples.items():
+        summary[stage] = {
+            "count": len(values),
+            "mean": sum(values) / len(values),
+            "p50": values[int(0.50 * (len(values) - 1))],
+            "p95": values[int(0.95 * (len(values) - 1))],
+        }
+    return summary
+
+
+_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def submit_analysis(image_path: str) -> str:
+    """Queue an analysis in the background executor and return its job id."""
+    job = PipelineJob(image_path)
+    with _jobs_lock:
+        _jobs[job.id] = job
+        # Forget the oldest finished jobs
+        for job_id in [j for j, other in _jobs.items() if other.done][:max(0, len(_jobs) - MAX_KEPT_JOBS)]:
+            del _jobs[job_id]
+    _executor.submit(run_pipeline, job)
+    return job.id
+
+
+def get_job(job_id: str):
+    """Return the status of a job, or None if it is unknown."""
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def queue_depth() -> int:
+    """Number of submitted jobs that have not started yet."""
+    with _jobs_lock:
+        return sum(1 for job in _jobs.values() if job.state == "queued")
+
+
+def running_jobs() -> int:
+    """Number of jobs currently executing."""
+    with _jobs_lock:
+        return sum(1 for job in _jobs.values() if job.state == "running")
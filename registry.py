@@ -0,0 +1,130 @@
+# registry.py - Lazy loading of heavy resources (TensorFlow, VGG19, LLM client)
+import importlib
+import sys
+import threading
+import time
+
+_loaders = {}
+_instances = {}
+_overridden = set()
+_locks = {}
+_registry_lock = threading.Lock()
+_timings = {}
+_warmup_thread = None
+
+
+def register(name: str, loader):
+    """Register a loader for a lazily created resource.
+
+    Args:
+        name: Resource name used with `get`
+        loader: Zero-argument callable building the resource on first use
+    """
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+
+
+def get(name: str):
+    """Return a resource, loading it on first use.
+
+    Concurrent callers wait for a single load; the result (even None) is kept
+    for the lifetime of the process.
+    """
+    if name in _instances:
+        return _instances[name]
+    if name not in _loaders:
+        raise KeyError(f"Unknown resource: {name}")
+
+    with _locks[name]:
+        if name not in _instances:
+            start = time.perf_counter()
+            try:
+                _instances[name] = _loaders[name]()
+            finally:
+                record(f"load {name}", time.perf_counter() - start)
+    return _instances[name]
+
+
+def is_loaded(name: str) -> bool:
+    """Check whether a resource has already been loaded."""
+    return name in _instances
+
+
+def override(name: str, instance):
+    """Use `instance` for a resource instead of its loader (e.g. a stub LLM).
+
+    Must be called before dependent resources (such as agents) are built.
+    """
+    with _registry_lock:
+        _locks.setdefault(name, threading.Lock())
+    with _locks[name]:
+        _instances[name] = instance
+        _overridden.add(name)
+
+
+def is_overridden(name: str) -> bool:
+    """Check whether a resource was replaced with `override`."""
+    return name in _overridden
+
+
+def invalidate(name: str):
+    """Drop a loaded resource so that the next `get` loads it again."""
+    with _locks.get(name, _registry_lock):
+        _instances.pop(name, None)
+        _overridden.discard(name)
+
+
+def timed_import(module_name: str):
+    """Import a module, recording how long the first import took."""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    record(f"import {module_name}", time.perf_counter() - start)
+    return module
+
+
+def record(label: str, seconds: float):
+    """Record a startup timing shown in `startup_report`."""
+    _timings[label] = seconds
+
+
+def warm_up(names=None, background: bool = True):
+    """Load resources ahead of first use.
+
+    Args:
+        names: Resource names to load (all registered resources by default)
+        background: Load in a daemon thread instead of blocking the caller
+
+    Returns:
+        The warm-up thread when running in background, None otherwise
+    """
+    global _warmup_thread
+    names = list(names) if names is not None else list(_loaders)
+
+    def _run():
+        for name in names:
+            try:
+                get(name)
+            except Exception as e:
+                print(f"[WARN] Warm-up of {name} failed: {e}")
+
+    if not background:
+        _run()
+        return None
+
+    with _registry_lock:
+        if _warmup_thread is None or not _warmup_thread.is_alive():
+            _warmup_thread = threading.Thread(target=_run, name="registry-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+def startup_report() -> str:
+    """Format the recorded import and load timings."""
+    lines = [f"{label:<32} {seconds * 1000:>9.1f} ms" for label, seconds in _timings.items()]
+    pending = [name for name in _loaders if name not in _instances]
+    if pending:
+        lines.append(f"{'not loaded yet':<32} {', '.join(pending)}")
+    return "\n".join(lines) if lines else "Nothing loaded yet"
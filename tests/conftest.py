@@ -0,0 +1,8 @@
+# tests/conftest.py - Shared pytest setup
+import os
+import sys
+
+# Modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# LiteLLM would otherwise fetch its model price list over the network on import
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
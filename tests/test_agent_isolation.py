@@ -0,0 +1,114 @@
+# tests/test_agent_isolation.py - Concurrent analyses must not share agent state
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("crewai")
+
+import registry
+from benchmarks.fake_ollama import CompletionSource, start_server
+from benchmarks.fakes import FakeClassifierModel, FakeDriver
+
+JOBS = 6
+
+
+@pytest.fixture
+def distinct_jobs(tmp_path, monkeypatch):
+    """Images with distinct classifications, and a fake Ollama answering each
+    one's clinical prompt with its own tumor type."""
+    import config
+    from tools.classifier_tool import classify_image
+    from treatment_snapshot import TreatmentSnapshot
+
+    registry.override("vgg19", FakeClassifierModel())
+    snapshot = TreatmentSnapshot(lambda: FakeDriver([]))
+    snapshot.refresh()
+    registry.override("treatment_snapshot", snapshot)
+
+    rng = np.random.default_rng(0)
+    images, recordings, seen = [], [], set()
+    while len(images) < JOBS:
+        path = str(tmp_path / f"{len(images)}.png")
+        Image.fromarray((rng.random((64, 64, 3)) * 255).astype(np.uint8)).save(path)
+        probability = classify_image(path).splitlines()[-1]
+        if probability in seen:
+            continue
+        seen.add(probability)
+        recordings.append({"match": probability, "response": json.dumps(
+            {"probable_type": f"Type-{len(images)}", "who_grade": "II", "prognosis": "unknown"})})
+        images.append(path)
+
+    server, url = start_server(source=CompletionSource(recordings), token_rate=0,
+                               ttft="uniform:5,40", parallel=JOBS)
+    monkeypatch.setattr(config, "LLM_BASE_URL", url)
+    monkeypatch.setattr(config, "LLM_CACHE_ENABLED", False)
+    for name in ["llm", "agent_pool"] + [f"llm:{profile}" for profile in config.LLM_PROFILES]:
+        registry.invalidate(name)
+    yield images
+    server.shutdown()
+    for name in ("vgg19", "treatment_snapshot", "agent_pool"):
+        registry.invalidate(name)
+
+
+@pytest.mark.parametrize("workers", [1, 2, 4])
+def test_concurrent_jobs_get_their_own_outputs(distinct_jobs, workers):
+    from pipeline import PipelineJob, run_pipeline
+
+    def run(path):
+        job = PipelineJob(path)
+        run_pipeline(job)
+        return job
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        jobs = list(pool.map(run, distinct_jobs))
+
+    for i, job in enumerate(jobs):
+        assert job.state == "completed", job.error
+        assert job.structured["clinique"]["probable_type"] == f"Type-{i}"
+
+
+def test_pool_never_hands_one_set_to_two_analyses(monkeypatch):
+    import threading
+    from crew import agents as crew_agents
+
+    monkeypatch.setattr(crew_agents, "build_agents", lambda verbose=None: {"id": object()})
+    pool = crew_agents.AgentPool(size=2)
+    pool.prefill()
+    inside, held = threading.Barrier(4), []
+
+    def analysis():
+        with pool.checkout() as agents:
+            # Nested checkouts (crew run inside a job) keep the same set
+            with pool.checkout() as nested:
+                assert nested is agents
+            held.append(agents["id"])
+            inside.wait(timeout=5)
+
+    threads = [threading.Thread(target=analysis) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(held)) == 4
+    assert pool.stats() == {"size": 2, "in_use": 0, "idle": 2}
+
+
+def test_warm_up_fills_the_pool_used_by_analyses(monkeypatch):
+    import warmup
+    from crew import agents as crew_agents
+
+    built = []
+    monkeypatch.setattr(crew_agents, "build_agents", lambda verbose=None: built.append(object()) or {"id": built[-1]})
+    registry.override("agent_pool", crew_agents.AgentPool(size=2))
+    try:
+        warmup.warm_agents()
+        assert len(built) == 2
+        with crew_agents.get_agent_pool().checkout() as agents:
+            assert agents["id"] in built
+        assert len(built) == 2
+    finally:
+        registry.invalidate("agent_pool")
@@ -0,0 +1,68 @@
+# tests/test_batch_classify.py - Manifests, resume and the decoding producer of batch_classify
+import json
+import os
+import queue
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import batch_classify
+
+
+def write_image(path):
+    Image.fromarray(np.zeros((8, 8), dtype=np.uint8)).save(path)
+    return str(path)
+
+
+def test_csv_manifest_header_is_skipped(tmp_path):
+    write_image(tmp_path / "a.png")
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text("image,label\na.png,tumor\n# comment\nsub/b.jpg,normal\n", encoding="utf-8")
+    assert batch_classify.list_images(str(manifest)) == [
+        str(tmp_path / "a.png"), str(tmp_path / "sub" / "b.jpg")
+    ]
+
+
+def test_plain_manifest_keeps_its_first_line(tmp_path):
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("a.png\nb.png\n", encoding="utf-8")
+    assert batch_classify.list_images(str(manifest)) == [str(tmp_path / "a.png"), str(tmp_path / "b.png")]
+
+
+def test_resume_matches_relative_and_absolute_paths(tmp_path, monkeypatch):
+    folder = tmp_path / "scans"
+    folder.mkdir()
+    for name in ("a.png", "b.png", "c.png"):
+        write_image(folder / name)
+    output = tmp_path / "results.jsonl"
+    rows = [
+        {"image": os.path.join("scans", "a.png")},  # Relative, from an older run
+        {"image": str(folder / "b.png"), "error": "unreadable"},
+        {"image": str(folder / "c.png")},
+    ]
+    output.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+
+    monkeypatch.chdir(tmp_path)
+    done = batch_classify.already_done(str(output))
+    remaining = [p for p in batch_classify.list_images("scans") if p not in done]
+    assert remaining == [str(folder / "b.png")]
+
+
+def test_producer_always_ends_with_the_sentinel(tmp_path, monkeypatch):
+    paths = [write_image(tmp_path / "a.png"), str(tmp_path / "missing.png")]
+    batches = queue.Queue()
+    batch_classify.decode_batches(paths, 1, batches)
+    chunks = [batches.get_nowait() for _ in range(3)]
+    assert chunks[1][2] and chunks[2] is None  # Unreadable image reported, then the end
+
+    class Abort(BaseException):
+        pass
+
+    def broken(*args):
+        raise Abort()  # Not caught by the per-image error handling
+
+    monkeypatch.setattr(batch_classify, "preprocess_batch", broken)
+    with pytest.raises(Abort):
+        batch_classify.decode_batches(paths, 2, batches)
+    assert batches.get_nowait() is None
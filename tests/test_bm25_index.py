@@ -0,0 +1,82 @@
+# tests/test_bm25_index.py - Ranking of the BM25 index and context assembly
+import math
+from collections import Counter
+
+import pytest
+
+from tools.bm25_index import BM25Index, build_context, tokenize
+
+PASSAGES = [
+    {"title": "Glioblastoma", "text": "Glioblastoma is treated with surgery, radiotherapy and temozolomide."},
+    {"title": "Meningioma", "text": "Most meningiomas are benign; surgery is curative when resection is complete."},
+    {"title": "Temozolomide", "text": "Temozolomide temozolomide dosing: 75 mg/m2 daily during radiotherapy."},
+    {"title": "", "text": "Radiotherapy planning uses MRI and CT. " * 10},
+    {"title": "Médulloblastome", "text": "Pediatric tumor of the cerebellum; craniospinal irradiation."},
+]
+
+
+def reference_scores(passages, query, k1=1.5, b=0.75):
+    """Textbook Okapi BM25, one passage at a time."""
+    docs = [tokenize(f"{p.get('title', '')} {p['text']}") for p in passages]
+    avg_length = sum(map(len, docs)) / len(docs)
+    scores = []
+    for doc in docs:
+        counts, score = Counter(doc), 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in d for d in docs)
+            if not counts[term]:
+                continue
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            tf = counts[term]
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avg_length))
+        scores.append(score)
+    return scores
+
+
+@pytest.mark.parametrize("query", ["temozolomide radiotherapy", "surgery", "MRI planning glioblastoma"])
+def test_scores_match_reference_bm25(query):
+    index = BM25Index(PASSAGES)
+    expected = reference_scores(PASSAGES, query)
+    results = index.search(query, top_k=len(PASSAGES))
+    assert len(results) == sum(score > 0 for score in expected)
+    for score, passage in results:
+        assert score == pytest.approx(expected[PASSAGES.index(passage)], rel=1e-5)
+    assert [s for s, _ in results] == sorted((s for s, _ in results), reverse=True)
+
+
+def test_term_frequency_and_rarity_rank_first():
+    index = BM25Index(PASSAGES)
+    # Twice the term in a short passage beats once in a longer one
+    assert index.search("temozolomide", top_k=1)[0][1] is PASSAGES[2]
+    # The rare term outweighs the common one
+    assert index.search("meningiomas radiotherapy", top_k=1)[0][1] is PASSAGES[1]
+
+
+def test_long_passages_are_normalized():
+    index = BM25Index(PASSAGES)
+    results = index.search("radiotherapy", top_k=5)
+    scores = {PASSAGES.index(passage): score for score, passage in results}
+    assert results[0][1] is PASSAGES[3]
+    # Ten mentions in a long passage are saturated, not ten times the score
+    assert scores[3] < 2 * scores[0]
+
+
+def test_top_k_accents_titles_and_misses():
+    index = BM25Index(PASSAGES)
+    assert len(index.search("surgery radiotherapy temozolomide", top_k=2)) == 2
+    # Accents are stripped from titles and queries alike
+    assert index.search("medulloblastome", top_k=3)[0][1] is PASSAGES[4]
+    assert index.search("MÉDULLOBLASTOME")[0][1] is PASSAGES[4]
+    assert index.search("the and of") == []
+    assert index.search("astrocytoma") == []
+    assert BM25Index([]).search("glioblastoma") == []
+
+
+def test_build_context_respects_the_budget():
+    results = BM25Index(PASSAGES).search("temozolomide radiotherapy", top_k=3)
+    context = build_context(results, max_tokens=40)
+    assert context.startswith("[Temozolomide]")
+    assert len(context) // 4 <= 40
+    assert build_context(results, max_tokens=0) == ""
+    # The best passage alone over budget is truncated, not dropped
+    assert build_context(results, max_tokens=5) == "[Temozolomide]\nTemozolomide temozolomide"[:20]
@@ -0,0 +1,75 @@
+# tests/test_inference_queue.py - Micro-batching of concurrent predictions
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from tools.inference_queue import InferenceQueue
+
+
+class RecordingModel:
+    """Returns each sample's first value; the first call blocks until released."""
+
+    def __init__(self, block_first=False):
+        self.batch_sizes = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        if not block_first:
+            self.release.set()
+
+    def predict(self, batch, verbose=0):
+        self.entered.set()
+        self.release.wait(5)
+        self.batch_sizes.append(len(batch))
+        return batch.reshape(len(batch), -1)[:, :1]
+
+
+def sample(value):
+    return np.full((4, 4, 3), value, dtype=np.float32)
+
+
+def test_lone_request_does_not_wait_for_the_window():
+    model = RecordingModel()
+    queue = InferenceQueue(lambda: model, max_batch_size=8, max_wait_ms=2000)
+    start = time.monotonic()
+    assert queue.predict(sample(3))[0] == 3
+    assert time.monotonic() - start < 1.0
+    assert model.batch_sizes == [1]
+
+
+def test_queued_requests_share_a_batch_and_get_their_own_rows():
+    model = RecordingModel(block_first=True)
+    queue = InferenceQueue(lambda: model, max_batch_size=4, max_wait_ms=50)
+    with ThreadPoolExecutor(max_workers=9) as pool:
+        first = pool.submit(queue.predict, sample(0))
+        assert model.entered.wait(5)
+        # Queued while the model is busy with the first request
+        others = [pool.submit(queue.predict, sample(i)[None]) for i in range(1, 9)]
+        while queue._requests.qsize() < 8:
+            time.sleep(0.01)
+        model.release.set()
+        assert first.result(5)[0] == 0
+        assert [future.result(5)[0] for future in others] == list(range(1, 9))
+
+    assert model.batch_sizes[0] == 1
+    assert sum(model.batch_sizes) == 9
+    assert max(model.batch_sizes) == 4  # Capped at max_batch_size
+    assert len(model.batch_sizes) == 3
+
+
+def test_model_errors_reach_every_caller_of_the_batch():
+    class FailingModel:
+        def predict(self, batch, verbose=0):
+            raise RuntimeError("model down")
+
+    queue = InferenceQueue(lambda: FailingModel(), max_batch_size=4, max_wait_ms=10)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(queue.predict, sample(i)) for i in range(3)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="model down"):
+                future.result(5)
+    # The worker survives a failed batch
+    queue.model_getter = lambda: RecordingModel()
+    assert queue.predict(sample(7))[0] == 7
@@ -0,0 +1,60 @@
+# tests/test_llm_tracing.py - Per-call token counts of traced LLM requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from crewai import BaseLLM
+
+import tracing
+from llm_tracing import TracedLLM
+
+
+class UsageLLM(BaseLLM):
+    """Reports one response per call, its usage given by the prompt."""
+
+    def __init__(self, streams=2):
+        super().__init__(model="fake/usage", temperature=0.0)
+        self.barrier = threading.Barrier(streams)
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None):
+        tokens = int(messages)
+        self.barrier.wait(5)  # Both calls are running before either reports
+        self._track_token_usage_internal({"prompt_tokens": tokens, "completion_tokens": tokens + 1})
+        self.barrier.wait(5)
+        return "x" * 40
+
+
+def traced_call(llm, tokens):
+    with tracing.span("test.request") as root:
+        llm.call(str(tokens))
+    return next(s for s in tracing.get_trace(root.trace_id) if s["name"] == "llm.call")
+
+
+def test_concurrent_calls_get_their_own_usage():
+    inner = UsageLLM()
+    llm = TracedLLM(inner)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        spans = list(pool.map(lambda tokens: traced_call(llm, tokens), [10, 500]))
+
+    assert [(s["attributes"]["prompt_tokens"], s["attributes"]["completion_tokens"]) for s in spans] == \
+        [(10, 11), (500, 501)]
+    assert not any(s["attributes"].get("tokens_estimated") for s in spans)
+    # The client's own counters still add up every response
+    assert inner.get_token_usage_summary().prompt_tokens == 510
+
+
+def test_usage_is_estimated_when_no_response_reports_it():
+    class SilentLLM(UsageLLM):
+        def call(self, messages, **kwargs):
+            return "y" * 40
+
+    span = traced_call(TracedLLM(SilentLLM()), "x" * 80)
+    assert span["attributes"]["tokens_estimated"] is True
+    assert span["attributes"]["prompt_tokens"] == 20
+    assert span["attributes"]["completion_tokens"] == 10
+
+
+def test_wrapping_a_client_twice_counts_each_response_once():
+    inner = UsageLLM(streams=1)
+    TracedLLM(inner)
+    assert traced_call(TracedLLM(inner), 7)["attributes"]["prompt_tokens"] == 7
@@ -0,0 +1,116 @@
+# tests/test_prediction_cache.py - Keys, invalidation and tiers of the prediction cache
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import registry
+import upload_store
+from tools.prediction_cache import PredictionCache
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    path = tmp_path / "model.h5"
+    path.write_bytes(b"weights v1")
+    return str(path)
+
+
+def test_keys_depend_on_content(model_file):
+    cache = PredictionCache(model_file)
+    data = b"image bytes"
+    assert cache.key_for(upload_store.content_key(data)) != cache.key_for(data)
+    assert cache.key_for(upload_store.content_key(data)) == cache.key_for(upload_store.content_key(data))
+    assert cache.key_for(b"other") != cache.key_for(data)
+
+
+def test_array_keys_depend_on_shape_and_values(model_file):
+    cache = PredictionCache(model_file)
+    array = np.zeros((1, 4, 4, 3), dtype=np.float32)
+    assert cache.key_for(array) == cache.key_for(array.copy())
+    assert cache.key_for(array) != cache.key_for(array.reshape(1, 4, 3, 4))
+    assert cache.key_for(array) != cache.key_for(array + 1)
+
+
+def test_changed_model_invalidates_every_tier(model_file, tmp_path):
+    cache = PredictionCache(model_file, disk_path=str(tmp_path / "cache.db"))
+    key = cache.key_for(b"image")
+    cache.put(key, 0.9)
+    assert cache.get(key) == 0.9
+
+    with open(model_file, "wb") as f:
+        f.write(b"weights v2, retrained")
+    assert cache.get(cache.key_for(b"image")) is None
+    assert cache.get(key) is None  # Also gone from SQLite
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_prediction_of_a_replaced_model_is_not_stored(model_file):
+    cache = PredictionCache(model_file)
+    old = cache.fingerprint()
+    key = cache.key_for(b"image", old)
+    with open(model_file, "wb") as f:
+        f.write(b"weights v2, retrained")
+    cache.fingerprint()
+    cache.put(key, 0.5, old)
+    assert cache.get(key) is None
+
+
+def test_disk_tier_survives_restart_and_is_bounded(model_file, tmp_path):
+    db = str(tmp_path / "cache.db")
+    cache = PredictionCache(model_file, max_memory_entries=2, disk_path=db, max_disk_entries=5)
+    keys = [cache.key_for(str(i)) for i in range(8)]
+    for i, key in enumerate(keys):
+        cache.put(key, i / 10)
+    assert cache.stats()["disk_entries"] == 5
+    assert cache.get(keys[0]) is None
+
+    restarted = PredictionCache(model_file, disk_path=db)
+    assert restarted.get(keys[-1]) == pytest.approx(0.7)
+    assert restarted.stats()["hits_disk"] == 1
+
+
+def test_detail_is_kept_with_the_prediction(model_file, tmp_path):
+    db = str(tmp_path / "cache.db")
+    cache = PredictionCache(model_file, disk_path=db)
+    key = cache.key_for(b"volume")
+    cache.put(key, 0.8, detail="12 (91.0%)")
+    assert cache.get(key) == 0.8
+    assert cache.get(key, with_detail=True) == (0.8, "12 (91.0%)")
+    assert PredictionCache(model_file, disk_path=db).get(key, with_detail=True) == (pytest.approx(0.8), "12 (91.0%)")
+
+
+def test_disk_tier_byte_budget(model_file, tmp_path):
+    cache = PredictionCache(model_file, max_memory_entries=1, disk_path=str(tmp_path / "cache.db"),
+                            max_disk_bytes=64 * 1024)
+    keys = [cache.key_for(str(i)) for i in range(5000)]
+    for i, key in enumerate(keys):
+        cache.put(key, i / 5000)
+    stats = cache.stats()
+    assert stats["disk_bytes"] <= 64 * 1024
+    assert 0 < stats["disk_entries"] < 5000
+    assert cache.get(keys[-1]) is not None  # Least recently used go first
+    assert cache.get(keys[0]) is None
+
+
+@pytest.mark.parametrize("as_source", ["path", "bytes", "upload"])
+def test_same_image_hits_the_cache_whatever_its_source(tmp_path, as_source):
+    from benchmarks.fakes import FakeClassifierModel
+    from tools import classifier_tool
+
+    path = str(tmp_path / "scan.png")
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, (64, 64), dtype=np.uint8)).save(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    source = {"path": path, "bytes": data, "upload": upload_store.store.put(data, "scan.png")}[as_source]
+
+    registry.override("vgg19", FakeClassifierModel())
+    try:
+        classifier_tool.prediction_cache.clear()
+        first = classifier_tool.classify_image(path)
+        hits = classifier_tool.prediction_cache.stats()["hits_memory"]
+        assert classifier_tool.classify_image(source) == first
+        assert classifier_tool.prediction_cache.stats()["hits_memory"] == hits + 1
+    finally:
+        registry.invalidate("vgg19")
@@ -0,0 +1,120 @@
+# tests/test_scheduler.py - Task graph scheduling and the agent graph
+import threading
+import time
+
+import pytest
+
+from crew.scheduler import run_task_graph
+
+
+def _recording_graph(deps: dict, log: list, delay: float = 0.01):
+    lock = threading.Lock()
+
+    def node(name):
+        def run(results):
+            with lock:
+                log.append(("start", name, set(results)))
+            time.sleep(delay)
+            with lock:
+                log.append(("end", name))
+            return f"out:{name}"
+        return run
+    return {name: {"deps": names, "run": node(name)} for name, names in deps.items()}
+
+
+def test_tasks_start_after_their_dependencies():
+    log = []
+    deps = {"report": ["a", "b"], "b": ["root"], "a": ["root"], "root": []}
+    results, timings = run_task_graph(_recording_graph(deps, log), max_parallelism=2)
+
+    assert results == {name: f"out:{name}" for name in deps}
+    ended = []
+    for event in log:
+        if event[0] == "start":
+            _, name, inputs = event
+            assert set(deps[name]) <= set(ended)
+            assert set(deps[name]) <= inputs
+        else:
+            ended.append(event[1])
+    for name, timing in timings.items():
+        for dep in deps[name]:
+            assert timings[dep]["end"] <= timing["start"]
+
+
+def test_independent_tasks_run_concurrently():
+    log = []
+    deps = {"root": [], "a": ["root"], "b": ["root"]}
+    run_task_graph(_recording_graph(deps, log, delay=0.05), max_parallelism=2)
+    starts = [event[1] for event in log]
+    # Both branches start before either ends
+    assert starts[2:4] == ["a", "b"] or starts[2:4] == ["b", "a"]
+
+
+@pytest.mark.parametrize("deps, message", [
+    ({"a": ["missing"]}, "unknown task"),
+    ({"a": ["b"], "b": ["a"]}, "cycle"),
+])
+def test_invalid_graphs_are_rejected_before_running(deps, message):
+    ran = []
+    graph = {name: {"deps": d, "run": lambda r, name=name: ran.append(name)} for name, d in deps.items()}
+    with pytest.raises(ValueError, match=message):
+        run_task_graph(graph)
+    assert ran == []
+
+
+def test_failure_stops_dependents():
+    ran = []
+
+    def fail(results):
+        raise RuntimeError("boom")
+
+    graph = {
+        "root": {"deps": [], "run": fail},
+        "child": {"deps": ["root"], "run": lambda r: ran.append("child")},
+    }
+    with pytest.raises(RuntimeError, match="boom"):
+        run_task_graph(graph)
+    assert ran == []
+
+
+def test_recommendations_get_the_clinical_analysis():
+    from pipeline import build_agent_graph
+
+    contexts = {}
+
+    def run_stage(agent, context):
+        contexts[agent["id"]] = dict(context["results"])
+        return f"{agent['id']} output"
+
+    results, _ = run_task_graph(build_agent_graph("scan.png", run_stage))
+
+    assert contexts["recommandations"]["clinique"] == "clinique output"
+    assert set(contexts["rapport"]) >= {"classification", "clinique", "recommandations"}
+    assert results["rapport"] == "rapport output"
+
+
+def test_crew_runs_the_same_graph(monkeypatch):
+    pytest.importorskip("crewai")
+    import registry
+    from crew import agents as crew_agents
+    from crew import main as crew_main
+
+    monkeypatch.setattr(crew_agents, "build_agents", lambda verbose=None: {})
+    registry.override("agent_pool", crew_agents.AgentPool(size=1))
+    prompts = {}
+
+    def run_agent(agent, context, pipeline_mode=None):
+        prompts[agent["id"]] = dict(context["results"])
+        return f"{agent['id']} output"
+
+    monkeypatch.setattr(crew_main, "run_agent", run_agent)
+    try:
+        crew = crew_main.BrainTumorAnalysisCrew()
+        report = crew.analyze("scan.png", classification_result="Diagnosis: Tumor detected")
+    finally:
+        registry.invalidate("agent_pool")
+
+    assert report == "rapport output"
+    assert "classification" not in prompts  # precomputed
+    assert prompts["recommandations"]["clinique"] == "clinique output"
+    assert set(crew.timings) == {"classification", "clinique", "recommandations", "rapport"}
@@ -0,0 +1,48 @@
+# tests/test_schemas.py - Parsing of the agent outputs
+import pytest
+
+from crew.schemas import ClassificationOutput, ClinicalOutput, RecommendationsOutput, structure_output
+
+CLINICAL = {"probable_type": "Glioblastoma", "who_grade": "IV", "prognosis": "median survival 3 months"}
+
+
+def test_json_object_with_surrounding_text():
+    text = 'Thought: done\nFinal Answer: Here it is {"probable_type": "Glioblastoma", ' \
+           '"who_grade": "IV", "prognosis": "median survival 3 months"} Hope this helps'
+    assert ClinicalOutput.parse(text).model_dump() == CLINICAL
+
+
+def test_braces_inside_values_are_kept():
+    parsed = RecommendationsOutput.parse(
+        '{"urgency": "Within 48h", "next_step": "MRI {T1, T2}", "standard_treatment": "Surgery"}')
+    assert parsed.next_step == "MRI {T1, T2}"
+
+
+def test_label_lines_and_aliases():
+    parsed = ClassificationOutput.parse("**Diagnosis:** Tumor detected\nConfidence: 91.2%\nProbability: 91.2 %")
+    assert parsed.diagnosis == "Tumor detected"
+    assert parsed.tumor_probability == pytest.approx(91.2)
+    assert parsed.render() == "Diagnosis: Tumor detected\nConfidence: 91.2%\nTumor probability: 91.2%"
+
+
+@pytest.mark.parametrize("text, message", [
+    ('{"probable_type": "Glioblastoma", "who_grade": "IV", "prognosis": "median', "not closed"),
+    ('{"probable_type": "Glioblastoma", "who_grade": IV}', "invalid JSON"),
+    ('{"probable_type": "Glioblastoma"}', "Field required"),
+    ("The image looks fine", "Field required"),
+])
+def test_invalid_answers_fail_loudly(text, message):
+    with pytest.raises(ValueError, match=message):
+        ClinicalOutput.parse(text)
+
+
+def test_structure_output_keeps_unparseable_answers():
+    text, parsed = structure_output('  {"probable_type": "Glioma", "who_gr  ', ClinicalOutput)
+    assert parsed is None
+    assert text == '{"probable_type": "Glioma", "who_gr'
+
+
+def test_structure_output_renders_canonical_lines():
+    text, parsed = structure_output('{"type": "Meningioma", "grade": "I", "prognosis": "good"}', ClinicalOutput)
+    assert parsed.probable_type == "Meningioma"
+    assert text == "Probable type: Meningioma\nWHO Grade: I\nPrognosis without treatment: good"
@@ -0,0 +1,75 @@
+# tests/test_treatment_snapshot.py - First load and refresh of the treatment snapshot
+import threading
+import time
+
+from benchmarks.fakes import FakeDriver
+from treatment_snapshot import TreatmentSnapshot, extract_tumor_type
+
+RELATIONS = [
+    ("Glioblastome", "TRAITE_PAR", "Chirurgie + Radiothérapie"),
+    ("Glioblastome", "DETECTE_PAR", "IRM VGG19"),
+]
+
+
+def slow_driver(delay: float, relations=RELATIONS, fail: bool = False):
+    def driver_getter():
+        time.sleep(delay)
+        if fail:
+            raise ConnectionError("Neo4j unreachable")
+        return FakeDriver(relations)
+    return driver_getter
+
+
+def test_first_lookup_waits_for_the_initial_load():
+    snapshot = TreatmentSnapshot(slow_driver(0.2), first_load_timeout=5)
+    snapshot.refresh_in_background()
+    assert snapshot.treatments_for("Glioblastoma") == ["Chirurgie + Radiothérapie"]
+    assert snapshot.analyses_for("glioblastome") == ["IRM VGG19"]
+
+
+def test_first_lookup_wait_is_bounded():
+    snapshot = TreatmentSnapshot(slow_driver(2, fail=True), first_load_timeout=0.1)
+    start = time.perf_counter()
+    assert snapshot.treatments_for("Glioblastoma") == []
+    assert time.perf_counter() - start < 1
+
+
+def test_unreachable_graph_does_not_delay_later_lookups():
+    snapshot = TreatmentSnapshot(slow_driver(0, fail=True), check_seconds=60)
+    assert snapshot.treatments_for("Glioblastoma") == []
+    assert snapshot.last_error == "Neo4j unreachable"
+    start = time.perf_counter()
+    snapshot.treatments_for("Glioblastoma")
+    assert time.perf_counter() - start < 0.1
+
+
+def test_refresh_after_the_first_load_runs_in_the_background():
+    relations = list(RELATIONS)
+    snapshot = TreatmentSnapshot(slow_driver(0.5, relations), check_seconds=0, first_load_timeout=5)
+    assert snapshot.refresh()
+    relations.append(("Meningiome", "TRAITE_PAR", "Chirurgie"))
+
+    start = time.perf_counter()
+    assert snapshot.treatments_for("Meningioma") == []  # served from the loaded data
+    assert time.perf_counter() - start < 0.2
+    deadline = time.time() + 5
+    while not snapshot.treatments_for("Meningioma") and time.time() < deadline:
+        time.sleep(0.05)
+    assert snapshot.treatments_for("Meningioma") == ["Chirurgie"]
+
+
+def test_concurrent_first_lookups_all_see_the_data():
+    snapshot = TreatmentSnapshot(slow_driver(0.2), first_load_timeout=5)
+    answers = []
+    threads = [threading.Thread(target=lambda: answers.append(snapshot.treatments_for("GBM")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert answers == [["Chirurgie + Radiothérapie"]] * 8
+
+
+def test_extract_tumor_type():
+    assert extract_tumor_type("WHO Grade: IV\nProbable type: **Glioblastoma (GBM) / Astrocytoma**") == "Glioblastoma"
+    assert extract_tumor_type("Probable type: Undetermined") is None
@@ -0,0 +1,107 @@
+# tests/test_upload_store.py - Memory/disk tiers of the upload store
+import os
+import threading
+
+import pytest
+
+import upload_store
+from upload_store import UploadStore
+
+KB = 1024
+
+
+def blob(i: int, size: int = 10 * KB) -> bytes:
+    return bytes([i % 256]) * size
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path), max_bytes=25 * KB, disk_max_bytes=25 * KB)
+
+
+def test_put_is_content_addressed(store):
+    ref = store.put(blob(1), "scan.PNG")
+    assert ref == store.put(blob(1))
+    assert ref.startswith(upload_store.REF_PREFIX)
+    assert store.get(ref) == blob(1)
+    assert store.extension(ref) == ".png"
+    assert store.stats()["memory_entries"] == 1
+
+
+def test_memory_eviction_spills_to_disk(store, tmp_path):
+    refs = [store.put(blob(i)) for i in range(3)]
+    stats = store.stats()
+    assert stats["memory_bytes"] <= 25 * KB
+    assert stats["disk_entries"] == 1
+    assert os.listdir(tmp_path) == [refs[0][len("upload:"):] + ".png"]
+    # Still readable, whatever tier it is in
+    assert [store.get(ref) for ref in refs] == [blob(i) for i in range(3)]
+
+
+def test_disk_keeps_the_most_recent_files(store):
+    refs = [store.put(blob(i)) for i in range(8)]
+    stats = store.stats()
+    assert stats["disk_bytes"] <= 25 * KB
+    assert store.get(refs[0]) is None
+    assert not store.contains(refs[0])
+    assert store.get(refs[-1]) == blob(7)
+    with pytest.raises(FileNotFoundError):
+        upload_store.resolve(refs[0])
+
+
+def test_pinned_files_survive_trimming(store):
+    first = store.put(blob(0))
+    with store.pinned_path(first) as path:
+        for i in range(1, 10):
+            store.put(blob(i))
+        assert os.path.exists(path)
+        with open(path, "rb") as f:
+            assert f.read() == blob(0)
+    assert store.stats()["disk_bytes"] <= 25 * KB
+
+
+def test_released_pins_are_trimmed(tmp_path):
+    store = UploadStore(str(tmp_path), max_bytes=0, disk_max_bytes=15 * KB)
+    first, second = store.put(blob(0)), store.put(blob(1))
+    with store.pinned_path(first) as first_path, store.pinned_path(second) as second_path:
+        store.put(blob(2))
+        # Both pinned files are kept over the budget
+        assert os.path.exists(first_path) and os.path.exists(second_path)
+    # Released pins are trimmed back to the budget
+    assert store.stats()["disk_bytes"] <= 15 * KB
+    assert [os.path.exists(first_path), os.path.exists(second_path)].count(True) == 1
+
+
+def test_pinned_path_of_unknown_upload(store):
+    with store.pinned_path("upload:" + "0" * 32) as path:
+        assert path is None
+
+
+def test_disk_write_does_not_hold_the_lock(store, monkeypatch):
+    writing, release = threading.Event(), threading.Event()
+    write = store._write
+
+    def slow_write(*args):
+        writing.set()
+        release.wait(5)
+        return write(*args)
+
+    monkeypatch.setattr(store, "_write", slow_write)
+    refs = [store.put(blob(i)) for i in range(2)]
+    spiller = threading.Thread(target=store.put, args=(blob(2),))
+    spiller.start()
+    assert writing.wait(5)
+    # The store answers while the evicted entry is being written, evicted one included
+    assert store.get(refs[1]) == blob(1)
+    assert store.get(refs[0]) == blob(0)
+    assert store.extension(refs[0]) == ".png"
+    release.set()
+    spiller.join()
+    assert store.stats()["disk_entries"] == 1
+
+
+def test_disk_index_is_rebuilt_on_restart(store, tmp_path):
+    refs = [store.put(blob(i)) for i in range(3)]
+    restarted = UploadStore(str(tmp_path), max_bytes=25 * KB, disk_max_bytes=25 * KB)
+    assert restarted.get(refs[0]) == blob(0)
+    assert restarted.stats()["disk_entries"] == 1
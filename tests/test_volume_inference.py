@@ -0,0 +1,147 @@
+# tests/test_volume_inference.py - NIfTI header parsing, streamed slice reads and volume caching
+import gzip
+import struct
+
+import numpy as np
+import pytest
+
+import registry
+import upload_store
+from tools.volume_inference import (
+    classify_volume, iter_slice_batches, preview_slice, read_nifti_header, read_slice,
+)
+
+
+def write_nifti(path, voxels, endian="<", datatype=16, slope=0.0, offset=352.0):
+    """Write a minimal single-file NIfTI-1 volume (gzipped for .gz paths)."""
+    header = bytearray(348)
+    struct.pack_into(endian + "i", header, 0, 348)
+    struct.pack_into(endian + "8h", header, 40, voxels.ndim, *voxels.shape, *[1] * (7 - voxels.ndim))
+    struct.pack_into(endian + "h", header, 70, datatype)
+    struct.pack_into(endian + "f", header, 108, offset)
+    struct.pack_into(endian + "2f", header, 112, slope, 0.0)
+    header[344:348] = b"n+1\0"
+    dtype = np.dtype(endian + {16: "f4", 4: "i2"}[datatype])
+    data = bytes(header) + b"\0" * (int(offset) - 348) + voxels.astype(dtype).tobytes(order="F")
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def volume(shape=(32, 24, 10), seed=0):
+    voxels = np.random.default_rng(seed).random(shape).astype(np.float32)
+    voxels[:4] = 0.0  # Some background
+    return voxels
+
+
+@pytest.mark.parametrize("name", ["scan.nii", "scan.nii.gz"])
+@pytest.mark.parametrize("endian", ["<", ">"])
+def test_header(tmp_path, name, endian):
+    path = write_nifti(tmp_path / name, volume(), endian=endian, slope=2.0)
+    header = read_nifti_header(path)
+    assert header["shape"] == (32, 24, 10)
+    assert header["dtype"] == np.dtype(endian + "f4")
+    assert header["offset"] == 352
+    assert header["slope"] == 2.0
+
+
+def test_zero_slope_means_no_scaling(tmp_path):
+    assert read_nifti_header(write_nifti(tmp_path / "scan.nii", volume()))["slope"] == 1.0
+
+
+@pytest.mark.parametrize("corrupt, message", [
+    (lambda data: data[:200], "Truncated NIfTI header"),
+    (lambda data: b"\0" * 4 + data[4:], "Not a NIfTI-1 file"),
+    (lambda data: data[:344] + b"ni1\0" + data[348:], "single-file"),
+    (lambda data: data[:70] + struct.pack("<h", 32) + data[72:], "Unsupported NIfTI datatype"),
+    (lambda data: data[:108] + struct.pack("<f", 100.0) + data[112:], "Invalid NIfTI voxel offset"),
+])
+def test_invalid_headers(tmp_path, corrupt, message):
+    path = tmp_path / "scan.nii"
+    write_nifti(path, volume())
+    path.write_bytes(corrupt(path.read_bytes()))
+    with pytest.raises(ValueError, match=message):
+        read_nifti_header(str(path))
+
+
+def test_4d_volumes_are_rejected(tmp_path):
+    path = write_nifti(tmp_path / "scan.nii", np.zeros((4, 4, 3, 2), dtype=np.float32))
+    with pytest.raises(ValueError, match="Expected a 3D volume"):
+        read_nifti_header(path)
+
+
+@pytest.mark.parametrize("name", ["scan.nii", "scan.nii.gz"])
+@pytest.mark.parametrize("batch_size", [1, 3, 16])
+def test_slice_batches_cover_the_volume_in_order(tmp_path, name, batch_size):
+    voxels = volume()
+    path = write_nifti(tmp_path / name, voxels, endian=">", datatype=4)
+    header = read_nifti_header(path)
+    batches = list(iter_slice_batches(path, header, batch_size))
+    assert [start for start, _ in batches] == list(range(0, 10, batch_size))
+    assert np.array_equal(np.concatenate([chunk for _, chunk in batches], axis=2), voxels.astype(np.int16))
+
+
+@pytest.mark.parametrize("name", ["scan.nii", "scan.nii.gz"])
+def test_read_slice(tmp_path, name):
+    voxels = volume()
+    path = write_nifti(tmp_path / name, voxels)
+    header = read_nifti_header(path)
+    assert np.array_equal(read_slice(path, header, 7), voxels[:, :, 7])
+    with pytest.raises(ValueError, match="out of range"):
+        read_slice(path, header, 10)
+    # Displayed like a 2D export: rotated so that anterior points up
+    assert preview_slice(path).shape == (24, 32)
+
+
+@pytest.mark.parametrize("name", ["scan.nii", "scan.nii.gz"])
+def test_truncated_volume(tmp_path, name):
+    path = tmp_path / name
+    write_nifti(path, volume())
+    opener = gzip.open if name.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        data = f.read()
+    with opener(path, "wb") as f:
+        f.write(data[:-3000])
+    header = read_nifti_header(str(path))
+    with pytest.raises(ValueError, match="Truncated NIfTI volume at slice 9"):
+        list(iter_slice_batches(str(path), header, 4))
+
+
+def test_classify_volume(tmp_path):
+    from benchmarks.fakes import FakeClassifierModel
+
+    voxels = volume()
+    voxels[:, :, 0] = 0.0  # No signal: skipped
+    path = write_nifti(tmp_path / "scan.nii.gz", voxels)
+    result = classify_volume(path, FakeClassifierModel(), batch_size=4, top_k=2)
+    assert result["slices"] == 10
+    assert result["evaluated"] == 9
+    assert result["slice_probabilities"][0] is None
+    assert len(result["top_slices"]) == 2
+    assert result["volume_probability"] == pytest.approx(np.mean([p for _, p in result["top_slices"]]))
+    # The batch size only changes how slices are grouped
+    assert classify_volume(path, FakeClassifierModel(), batch_size=16, top_k=2)["slice_probabilities"] == \
+        pytest.approx(result["slice_probabilities"])
+
+
+@pytest.mark.parametrize("as_source", ["path", "upload"])
+def test_volume_predictions_are_cached_by_content(tmp_path, as_source):
+    from benchmarks.fakes import FakeClassifierModel
+    from tools import classifier_tool
+
+    path = write_nifti(tmp_path / "scan.nii.gz", volume(seed=1))
+    with open(path, "rb") as f:
+        ref = upload_store.store.put(f.read(), "scan.nii.gz")
+    source = {"path": path, "upload": ref}[as_source]
+
+    registry.override("vgg19", FakeClassifierModel())
+    try:
+        classifier_tool.prediction_cache.clear()
+        first = classifier_tool.classify_image(path)
+        assert "Suspicious slices" in first
+        hits = classifier_tool.prediction_cache.stats()["hits_memory"]
+        assert classifier_tool.classify_image(source) == first
+        assert classifier_tool.prediction_cache.stats()["hits_memory"] == hits + 1
+    finally:
+        registry.invalidate("vgg19")
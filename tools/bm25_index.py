@@ -0,0 +1,125 @@
+# tools/bm25_index.py - Inverted index with BM25 scoring over a passage corpus
+import json
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this
+to was were will with what which who how if not no than then there these those
+""".split())
+
+
+def tokenize(text: str) -> list:
+    """Lowercase, strip accents and split into word tokens, dropping stopwords."""
+    text = text or ""
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def load_corpus(path: str) -> list:
+    """Load passages from a JSONL file with a `text` and an optional `title` field."""
+    passages = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                passages.append({"title": row.get("title", ""), "text": row["text"]})
+    return passages
+
+
+class BM25Index:
+    """Okapi BM25 over an in-memory inverted index.
+
+    Each term's postings are two numpy arrays (passage ids and term
+    frequencies), so a query only touches the passages containing its
+    terms and scores them with vectorized arithmetic.
+    """
+
+    def __init__(self, passages: list, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            passages: List of {"title", "text"} dicts
+            k1: Term frequency saturation
+            b: Length normalization strength
+        """
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+
+        postings = {}  # token -> ([passage ids], [term frequencies])
+        lengths = np.zeros(len(passages), dtype=np.float32)
+        for doc_id, passage in enumerate(passages):
+            tokens = tokenize(f"{passage.get('title', '')} {passage['text']}")
+            lengths[doc_id] = len(tokens)
+            for token, count in Counter(tokens).items():
+                entry = postings.get(token)
+                if entry is None:
+                    entry = postings[token] = ([], [])
+                entry[0].append(doc_id)
+                entry[1].append(count)
+
+        n_docs = max(len(passages), 1)
+        avg_length = float(lengths.mean()) if len(passages) else 1.0
+        # Per-passage part of the BM25 denominator, computed once
+        self._length_norm = (k1 * (1 - b + b * lengths / max(avg_length, 1.0))).astype(np.float32)
+        self._postings = {}
+        for token, (doc_ids, freqs) in postings.items():
+            df = len(doc_ids)
+            idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            self._postings[token] = (
+                np.array(doc_ids, dtype=np.int32),
+                np.array(freqs, dtype=np.float32),
+                np.float32(idf),
+            )
+
+    def __len__(self):
+        return len(self.passages)
+
+    def search(self, query: str, top_k: int = 3) -> list:
+        """Return the `top_k` best passages as (score, passage) pairs, best first."""
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        for token in set(tokenize(query)):
+            if token not in self._postings:
+                continue
+            doc_ids, freqs, idf = self._postings[token]
+            # Doc ids are unique within a posting list, so fancy += is safe
+            scores[doc_ids] += idf * freqs * (self.k1 + 1) / (freqs + self._length_norm[doc_ids])
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(float(scores[i]), self.passages[i]) for i in candidates]
+
+
+def build_context(results: list, max_tokens: int) -> str:
+    """Join ranked passages until the token budget is spent.
+
+    The best passage is returned truncated if it alone exceeds the budget;
+    "" if the budget is zero or negative.
+    """
+    max_tokens = max(0, max_tokens)
+    parts, used = [], 0
+    for _, passage in results:
+        text = passage["text"].strip()
+        if passage.get("title"):
+            text = f"[{passage['title']}]\n{text}"
+        cost = estimate_tokens(text)
+        if used + cost > max_tokens:
+            if not parts and max_tokens:
+                parts.append(text[:max_tokens * 4])
+            break
+        parts.append(text)
+        used += cost
+    return "\n\n".join(parts)
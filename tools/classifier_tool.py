@@ -1,64 +1,245 @@
 # tools/classifier_tool.py
 from crewai.tools import tool
-import tensorflow as tf
 import numpy as np
-from PIL import Image
 import os
+import registry
+import tracing
+import upload_store
+from tools.inference_queue import InferenceQueue
+from tools.preprocessing import preprocess_batch
+from tools.prediction_cache import PredictionCache, model_fingerprint
+from tools.model_backends import CLASSIFIER_BACKEND, backend_model_path, load_backend_model
+from tools.volume_inference import (
+    VOLUME_EXTENSIONS, VOLUME_MIN_FOREGROUND, VOLUME_TOP_K, classify_volume, format_top_slices, is_volume_path,
+)
 
-MODEL_PATH = "models/best_model_VGG19.keras"
-classifier_model = None
+MODEL_PATH = backend_model_path(CLASSIFIER_BACKEND)
+# Micro-batching window shared by all concurrent classify_brain_mri calls; it
+# only opens when requests queue up, a lone request is served at once
+MAX_BATCH_SIZE = int(os.getenv("CLASSIFIER_MAX_BATCH_SIZE", "8"))
+MAX_BATCH_WAIT_MS = float(os.getenv("CLASSIFIER_MAX_BATCH_WAIT_MS", "10"))
+# Prediction cache: in-memory LRU, plus a SQLite tier when a path is configured
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "1024"))
+PREDICTION_CACHE_DB = os.getenv("PREDICTION_CACHE_DB")
+PREDICTION_CACHE_DISK_ENTRIES = int(os.getenv("PREDICTION_CACHE_DISK_ENTRIES", "100000"))
+PREDICTION_CACHE_DISK_MB = float(os.getenv("PREDICTION_CACHE_DISK_MB", "64"))
+_loaded_fingerprint = None
 
-if os.path.exists(MODEL_PATH):
+
+def _load_local_model():
     try:
-        print(f"[INFO] Loading VGG19 model from {MODEL_PATH}...")
-        classifier_model = tf.keras.models.load_model(MODEL_PATH)
+        print(f"[INFO] Loading VGG19 model from {MODEL_PATH} ({CLASSIFIER_BACKEND})...")
+        model = load_backend_model(CLASSIFIER_BACKEND)
         print("Model loaded successfully")
+        return model
     except Exception as e:
         print(f"Model loading error: {e}")
-else:
-    print(f"MISSING MODEL: {MODEL_PATH}")
+        return None
+
+
+def _load_classifier_model():
+    global _loaded_fingerprint
+    _loaded_fingerprint = model_fingerprint(MODEL_PATH)
+    # A local model server (model_server.py) spares this process its own copy
+    import model_server
+    client = model_server.connect(fallback=_load_local_model)
+    if client is not None:
+        print(f"[INFO] Using the model server at {model_server.MODEL_SERVER_ADDRESS}")
+        return client
+    # TensorFlow is only imported once the model is actually needed
+    if not os.path.exists(MODEL_PATH):
+        print(f"MISSING MODEL: {MODEL_PATH}")
+        return None
+    return _load_local_model()
+
+
+registry.register("vgg19", _load_classifier_model)
+
+
+def get_classifier_model():
+    """Return the VGG19 model of CLASSIFIER_BACKEND, loading it on first use.
 
-def preprocess_image(image_path: str) -> np.ndarray:
+    The model is reloaded when the model file changes on disk.
+    """
+    # A model set with registry.override (no fingerprint) is kept as is
+    if (registry.is_loaded("vgg19") and _loaded_fingerprint is not None
+            and model_fingerprint(MODEL_PATH) != _loaded_fingerprint):
+        previous = registry.get("vgg19")
+        registry.invalidate("vgg19")
+        # A model server client holds a connection and a shared memory segment
+        if hasattr(previous, "close"):
+            previous.close()
+    return registry.get("vgg19")
+
+
+def __getattr__(name):
+    # Keeps `classifier_tool.classifier_model` working without loading at import
+    if name == "classifier_model":
+        return get_classifier_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def preprocess_image(image_path) -> np.ndarray:
     """Preprocess MRI image for model prediction.
 
     Args:
-        image_path: Path to the image file
+        image_path: Path to the image file, raw bytes or binary file-like object
 
     Returns:
-        Preprocessed image array ready for prediction
+        Preprocessed float32 image array of shape (1, 224, 224, 3)
     """
-    img = Image.open(image_path).convert("RGB")
-    img = img.resize((224, 224))
-    arr = np.array(img) / 255.0
-    return np.expand_dims(arr, axis=0)
+    return preprocess_batch([image_path])
 
-@tool("classify_brain_mri")
-def classify_brain_mri(image_path: str) -> str:
-    """
-    Classify a brain MRI image to detect the presence of a tumor using a trained VGG19 model.
+prediction_cache = PredictionCache(
+    MODEL_PATH,
+    max_memory_entries=PREDICTION_CACHE_SIZE,
+    disk_path=PREDICTION_CACHE_DB,
+    max_disk_entries=PREDICTION_CACHE_DISK_ENTRIES,
+    max_disk_bytes=int(PREDICTION_CACHE_DISK_MB * 1024 * 1024)
+)
+
+inference_queue = InferenceQueue(
+    get_classifier_model,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_BATCH_WAIT_MS
+)
+
+def interpret_prediction(prediction: float) -> tuple:
+    """Turn a tumor probability into a diagnosis and its confidence.
 
     Args:
-        image_path (str): Path to the MRI image (PNG, JPG, or JPEG)
+        prediction: Sigmoid output of the model (tumor probability)
 
     Returns:
-        str: Formatted result with diagnosis, confidence, and tumor probability
+        (diagnosis, confidence in percent)
     """
-    if not os.path.exists(image_path):
-        return f"ERROR: Image not found → {image_path}"
+    has_tumor = prediction > 0.5
+    diagnosis = "Tumor detected" if has_tumor else "No tumor detected"
+    confidence = prediction * 100 if has_tumor else (1 - prediction) * 100
+    return diagnosis, confidence
 
-    if classifier_model is None:
-        return "ERROR: VGG19 model not loaded. Place 'best_model_VGG19.keras' in the 'models/' folder"
+def format_prediction(prediction: float) -> str:
+    """Format a tumor probability as the three-line classification result.
 
-    try:
-        img_array = preprocess_image(image_path)
-        prediction = float(classifier_model.predict(img_array, verbose=0)[0][0])
-        has_tumor = prediction > 0.5
-        diagnosis = "Tumor detected" if has_tumor else "No tumor detected"
-        confidence = prediction * 100 if has_tumor else (1 - prediction) * 100
+    Args:
+        prediction: Sigmoid output of the model (tumor probability)
 
-        return f"""Diagnosis: {diagnosis}
+    Returns:
+        Formatted result with diagnosis, confidence, and tumor probability
+    """
+    diagnosis, confidence = interpret_prediction(prediction)
+
+    return f"""Diagnosis: {diagnosis}
 Confidence: {confidence:.1f}%
 Tumor probability: {prediction * 100:.1f}%"""
 
-    except Exception as e:
-        return f"Prediction error: {str(e)}"
\ No newline at end of file
+def _is_volume(source) -> bool:
+    if upload_store.is_ref(source):
+        return upload_store.store.extension(source) in VOLUME_EXTENSIONS
+    return isinstance(source, str) and is_volume_path(source)
+
+
+def _content_for_cache(source):
+    # Content hash identifying the image without decoding it, the same for an
+    # upload reference and the same bytes given directly or as a file; None
+    # for file-like objects
+    if upload_store.is_ref(source):
+        return source[len(upload_store.REF_PREFIX):]
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return upload_store.content_key(source)
+    if isinstance(source, str):
+        return upload_store.file_content_key(source)
+    return None
+
+
+def _classify_volume_source(source) -> dict:
+    if not upload_store.is_ref(source):
+        return classify_volume(source, get_classifier_model())
+    # Volumes are read from a file; the upload is pinned so the upload store
+    # does not trim it during inference
+    with upload_store.store.pinned_path(source) as path:
+        if path is None:
+            raise FileNotFoundError(f"Image not found → {source}")
+        return classify_volume(path, get_classifier_model())
+
+
+def classify_volume_file(source) -> str:
+    """Classify a NIfTI volume (path or upload reference) slice by slice
+    (see tools/volume_inference.py).
+
+    The volume probability and its suspicious slices are cached under the
+    content hash of the file, so a volume seen before is not read again.
+    """
+    with tracing.span("tool.classify_brain_mri", backend=CLASSIFIER_BACKEND, volume=True) as current:
+        try:
+            fingerprint = prediction_cache.fingerprint()
+            # The slice selection settings change the result of a volume
+            content = f"volume:{_content_for_cache(source)}:{VOLUME_TOP_K}:{VOLUME_MIN_FOREGROUND}"
+            cache_key = prediction_cache.key_for(content, fingerprint)
+            cached = prediction_cache.get(cache_key, with_detail=True)
+            current.set("cache_hit", cached is not None)
+            if cached is None:
+                result = _classify_volume_source(source)
+                current.set("slices_evaluated", result["evaluated"])
+                cached = (result["volume_probability"], format_top_slices(result["top_slices"]))
+                prediction_cache.put(cache_key, cached[0], fingerprint, detail=cached[1])
+        except Exception as e:
+            current.status = "error"
+            current.error = str(e)
+            return f"Prediction error: {str(e)}"
+        probability, top_slices = cached
+        return format_prediction(probability) + f"\nSuspicious slices: {top_slices}"
+
+
+def classify_image(source) -> str:
+    """Classify a brain MRI given as a path, an "upload:<hash>" reference,
+    raw bytes or a binary file-like object. NIfTI volumes (.nii, .nii.gz)
+    are classified slice by slice.
+
+    Returns:
+        str: Formatted result with diagnosis, confidence, and tumor probability
+    """
+    if isinstance(source, str) and not upload_store.exists(source):
+        return f"ERROR: Image not found → {source}"
+
+    if get_classifier_model() is None:
+        return f"ERROR: VGG19 model not loaded. Place '{os.path.basename(MODEL_PATH)}' in the 'models/' folder"
+
+    if _is_volume(source):
+        return classify_volume_file(source)
+
+    with tracing.span("tool.classify_brain_mri", backend=CLASSIFIER_BACKEND) as current:
+        try:
+            fingerprint = prediction_cache.fingerprint()
+            content = _content_for_cache(source)
+            cache_key = prediction_cache.key_for(content, fingerprint) if content is not None else None
+            prediction = prediction_cache.get(cache_key) if cache_key else None
+            current.set("cache_hit", prediction is not None)
+            if prediction is None:
+                with tracing.span("classify.preprocess"):
+                    img_array = preprocess_image(upload_store.resolve(source))
+                if cache_key is None:
+                    cache_key = prediction_cache.key_for(img_array, fingerprint)
+                with tracing.span("classify.predict"):
+                    prediction = float(inference_queue.predict(img_array)[0])
+                prediction_cache.put(cache_key, prediction, fingerprint)
+            return format_prediction(prediction)
+
+        except Exception as e:
+            current.status = "error"
+            current.error = str(e)
+            return f"Prediction error: {str(e)}"
+
+
+@tool("classify_brain_mri")
+def classify_brain_mri(image_path: str) -> str:
+    """
+    Classify a brain MRI image to detect the presence of a tumor using a trained VGG19 model.
+
+    Args:
+        image_path (str): Path to the MRI image (PNG, JPG, JPEG, or a NIfTI .nii/.nii.gz volume)
+            or "upload:<hash>" reference
+
+    Returns:
+        str: Formatted result with diagnosis, confidence, and tumor probability
+    """
+    return classify_image(image_path)
@@ -0,0 +1,266 @@
+# tools/embedding_index.py - Memory-mapped embedding index for semantic retrieval
+"""Dense passage retrieval over a float32 matrix memory-mapped from disk.
+
+Index layout (one directory):
+    vectors.f32      N x D float32, L2-normalized, rows grouped by cluster
+    passages.jsonl   one {"title", "text"} per row, same order
+    meta.json        dimension, count, embedder spec, cluster offsets
+    centroids.npy    optional coarse clusters (IVF) for large corpora
+
+The matrix is opened read-only with np.memmap, so every process searching
+the same index shares the OS page cache instead of loading its own copy.
+
+Build an index offline:
+    python -m tools.embedding_index --corpus passages.jsonl --out models/embedding_index \
+        [--model path/to/local/sentence-transformer | --vectors vectors.npy] [--clusters 64]
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import tempfile
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from tools.bm25_index import load_corpus, tokenize
+
+HASHING_DIM = 512
+
+
+class HashingEmbedder:
+    """Dependency-free embedder: signed feature hashing of unigrams and bigrams.
+
+    Captures lexical overlap only, but is deterministic and fully offline.
+    """
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+        self.spec = f"hashing:{dim}"
+
+    def embed(self, texts: list) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = Counter(tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])])
+            for feature, count in features.items():
+                h = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                vectors[row, h % self.dim] += sign * (1.0 + math.log(count))
+        return normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Wraps a sentence-transformers model stored on local disk."""
+
+    def __init__(self, model_path: str):
+        from sentence_transformers import SentenceTransformer  # optional dependency
+        self.model = SentenceTransformer(model_path, device="cpu")
+        self.spec = f"sentence-transformers:{model_path}"
+
+    def embed(self, texts: list) -> np.ndarray:
+        vectors = self.model.encode(list(texts), batch_size=64, convert_to_numpy=True)
+        return normalize(vectors.astype(np.float32))
+
+
+def make_embedder(spec: str = None):
+    """Build an embedder from its spec ("hashing:512" or "sentence-transformers:<path>")."""
+    kind, _, arg = (spec or f"hashing:{HASHING_DIM}").partition(":")
+    if kind == "hashing":
+        return HashingEmbedder(int(arg or HASHING_DIM))
+    if kind == "sentence-transformers":
+        return SentenceTransformerEmbedder(arg)
+    raise ValueError(f"Unknown embedder: {spec}")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10, sample_size: int = 20000, seed: int = 0):
+    """Spherical k-means on a sample; returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(n_clusters):
+            members = sample[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = normalize(centroids)
+    return centroids
+
+
+@contextmanager
+def _exclusive_lock(path: str):
+    """Hold an exclusive lock on the file `path` (created if needed), across processes."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def build_index(passages: list, out_dir: str, embedder=None, vectors: np.ndarray = None,
+                n_clusters: int = 0, batch_size: int = 256):
+    """Embed passages and write a memory-mappable index directory.
+
+    Args:
+        passages: List of {"title", "text"} dicts
+        out_dir: Index directory (replaced atomically)
+        embedder: Embedder for the passages, and later for queries
+        vectors: Precomputed passage vectors (N x D), instead of embedding
+        n_clusters: Number of coarse clusters; 0 disables the IVF layer
+        batch_size: Passages embedded per call
+    """
+    embedder = embedder or HashingEmbedder()
+    if vectors is None:
+        texts = [f"{p.get('title', '')} {p['text']}" for p in passages]
+        vectors = np.concatenate([
+            embedder.embed(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)
+        ]) if texts else np.zeros((0, HASHING_DIM), dtype=np.float32)
+    vectors = normalize(np.asarray(vectors, dtype=np.float32))
+    if len(vectors) != len(passages):
+        raise ValueError(f"{len(vectors)} vectors for {len(passages)} passages")
+
+    offsets = [0, len(passages)]
+    centroids = None
+    if n_clusters and len(passages) > n_clusters:
+        centroids = _kmeans(vectors, n_clusters)
+        assignment = np.concatenate([
+            np.argmax(vectors[i:i + 65536] @ centroids.T, axis=1)
+            for i in range(0, len(vectors), 65536)
+        ])
+        # Group rows by cluster so each cluster is one contiguous slice
+        order = np.argsort(assignment, kind="stable")
+        vectors, passages = vectors[order], [passages[i] for i in order]
+        offsets = np.searchsorted(assignment[order], np.arange(n_clusters + 1)).tolist()
+
+    out_dir = out_dir.rstrip("/\\")
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    # A private directory next to the index: concurrent builds never share one
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(out_dir) + ".tmp-")
+    try:
+        os.chmod(tmp_dir, 0o755)
+        vectors.tofile(os.path.join(tmp_dir, "vectors.f32"))
+        with open(os.path.join(tmp_dir, "passages.jsonl"), "w", encoding="utf-8") as f:
+            for passage in passages:
+                f.write(json.dumps(passage, ensure_ascii=False) + "\n")
+        if centroids is not None:
+            np.save(os.path.join(tmp_dir, "centroids.npy"), centroids)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({
+                "count": len(passages),
+                "dim": int(vectors.shape[1]),
+                "embedder": embedder.spec,
+                "offsets": offsets,
+            }, f)
+
+        # Swap by renames: the previous index is moved aside whole, so processes
+        # that memory-mapped its files keep reading them until they reopen
+        old_dir = tmp_dir + ".old"
+        with _exclusive_lock(out_dir + ".lock"):
+            if os.path.exists(out_dir):
+                os.replace(out_dir, old_dir)
+            os.replace(tmp_dir, out_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class EmbeddingIndex:
+    """Read-only, memory-mapped view of an index built by `build_index`."""
+
+    def __init__(self, index_dir: str, embedder=None, n_probe: int = 4):
+        """
+        Args:
+            index_dir: Directory written by `build_index`
+            embedder: Query embedder (default: the one recorded at build time)
+            n_probe: Clusters scanned per query when the index has an IVF layer
+        """
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.vectors = np.memmap(
+            os.path.join(index_dir, "vectors.f32"), dtype=np.float32, mode="r",
+            shape=(self.meta["count"], self.meta["dim"])
+        ) if self.meta["count"] else np.zeros((0, self.meta["dim"]), dtype=np.float32)
+        self.passages = load_corpus(os.path.join(index_dir, "passages.jsonl"))
+        self.offsets = self.meta["offsets"]
+        centroids_path = os.path.join(index_dir, "centroids.npy")
+        self.centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+        self.embedder = embedder or make_embedder(self.meta["embedder"])
+        self.n_probe = n_probe
+
+    def __len__(self):
+        return len(self.passages)
+
+    def search_vector(self, query: np.ndarray, top_k: int = 3) -> list:
+        """Return (cosine score, passage) pairs for a normalized query vector, best first."""
+        if self.centroids is None:
+            ranges = [(0, len(self.passages))]
+        else:
+            probe = np.argsort(-(self.centroids @ query))[:self.n_probe]
+            ranges = [(self.offsets[c], self.offsets[c + 1]) for c in sorted(probe)]
+
+        scores, rows = [], []
+        for start, end in ranges:
+            if end > start:
+                scores.append(self.vectors[start:end] @ query)
+                rows.append(np.arange(start, end))
+        if not scores:
+            return []
+        scores, rows = np.concatenate(scores), np.concatenate(rows)
+
+        keep = np.flatnonzero(scores > 0)
+        if len(keep) > top_k:
+            keep = keep[np.argpartition(-scores[keep], top_k - 1)[:top_k]]
+        keep = keep[np.argsort(-scores[keep], kind="stable")]
+        return [(float(scores[i]), self.passages[rows[i]]) for i in keep]
+
+    def search(self, query: str, top_k: int = 3) -> list:
+        """Embed a text query and return its `top_k` passages, like BM25Index.search."""
+        return self.search_vector(self.embedder.embed([query])[0], top_k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a memory-mapped embedding index")
+    parser.add_argument("--corpus", required=True, help="JSONL passages ({\"title\", \"text\"})")
+    parser.add_argument("--out", required=True, help="Index directory")
+    parser.add_argument("--model", help="Local sentence-transformers model directory")
+    parser.add_argument("--vectors", help="Precomputed passage vectors (.npy, one row per passage)")
+    parser.add_argument("--embedder", help="Query embedder spec when using --vectors")
+    parser.add_argument("--clusters", type=int, default=0, help="Coarse clusters (0 = exhaustive search)")
+    args = parser.parse_args()
+
+    passages = load_corpus(args.corpus)
+    if args.model:
+        embedder = SentenceTransformerEmbedder(args.model)
+    else:
+        embedder = make_embedder(args.embedder)
+    vectors = np.load(args.vectors, mmap_mode="r") if args.vectors else None
+    build_index(passages, args.out, embedder=embedder, vectors=vectors, n_clusters=args.clusters)
+    print(f"✅ Index written to {args.out}: {len(passages)} passages ({embedder.spec})")
+
+
+if __name__ == "__main__":
+    main()
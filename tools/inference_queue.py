@@ -0,0 +1,108 @@
+# tools/inference_queue.py
+import threading
+import time
+import queue
+import numpy as np
+
+
+class _PendingRequest:
+    """A single caller waiting for its slot of a batched forward pass."""
+
+    __slots__ = ("inputs", "done", "result", "error")
+
+    def __init__(self, inputs: np.ndarray):
+        self.inputs = inputs
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceQueue:
+    """Micro-batching queue in front of a Keras-like model.
+
+    Concurrent callers of `predict` are gathered for at most `max_wait_ms`
+    (or until `max_batch_size` requests are waiting), then served by a single
+    batched `model.predict` call. Each caller gets back its own output row.
+    A request found alone in the queue is served at once: the window only
+    opens when a second request is already queued.
+    """
+
+    def __init__(self, model_getter, max_batch_size: int = 8, max_wait_ms: float = 10.0):
+        """
+        Args:
+            model_getter: Callable returning the model (anything with a Keras-style
+                `predict(batch, verbose=0)` method)
+            max_batch_size: Maximum number of requests served by one forward pass
+            max_wait_ms: Maximum time a batch of queued requests waits for more
+        """
+        self.model_getter = model_getter
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._requests = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def predict(self, inputs: np.ndarray) -> np.ndarray:
+        """Run one sample through the model as part of a shared batch.
+
+        Args:
+            inputs: Preprocessed sample of shape (H, W, C) or (1, H, W, C)
+
+        Returns:
+            Model output row for this sample
+        """
+        if inputs.ndim == 4:
+            inputs = inputs[0]
+        request = _PendingRequest(inputs)
+        self._ensure_worker()
+        self._requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="InferenceQueue", daemon=True
+                )
+                self._worker.start()
+
+    def _collect_batch(self) -> list:
+        batch = [self._requests.get()]
+        if self.max_batch_size == 1:
+            return batch
+        try:
+            batch.append(self._requests.get_nowait())
+        except queue.Empty:
+            return batch  # No concurrent request: waiting would only add latency
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._requests.get_nowait())
+                else:
+                    batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                model = self.model_getter()
+                inputs = np.stack([r.inputs for r in batch]).astype(np.float32, copy=False)
+                outputs = model.predict(inputs, verbose=0)
+                for request, output in zip(batch, outputs):
+                    request.result = output
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            finally:
+                for request in batch:
+                    request.done.set()
@@ -1,17 +1,33 @@
-from crewai.tools import tool
+# tools/medical_knowledge_tool.py - Medical knowledge retrieval for the agents
+import os
+import re
 
-@tool("search_medical_knowledge")
-def search_medical_knowledge(query: str) -> str:
-    """
-    Search medical knowledge base for information about brain tumors.
-    This simulates a GraphRAG system for medical information retrieval.
+from crewai.tools import tool
 
-    Args:
-        query: Medical query about brain tumors
-    """
-    # Medical knowledge base
-    knowledge_base = {
-        "tumor_types": """
+import registry
+import tracing
+from tools.bm25_index import BM25Index, build_context, estimate_tokens, load_corpus
+
+# "bm25" (keyword ranking) or "embedding" (memory-mapped semantic index)
+MEDICAL_KNOWLEDGE_BACKEND = os.getenv("MEDICAL_KNOWLEDGE_BACKEND", "bm25")
+# JSONL passages ({"title", "text"}) replacing the built-in knowledge base
+MEDICAL_CORPUS_PATH = os.getenv("MEDICAL_CORPUS_PATH")
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", os.path.join("models", "embedding_index"))
+# Local sentence-transformers model directory (hashing embedder if unset)
+EMBEDDING_MODEL_PATH = os.getenv("EMBEDDING_MODEL_PATH")
+EMBEDDING_CLUSTERS = int(os.getenv("EMBEDDING_CLUSTERS", "0"))
+EMBEDDING_NPROBE = int(os.getenv("EMBEDDING_NPROBE", "4"))
+# Append the Neo4j treatments/analyses of tumors found in the results
+KNOWLEDGE_GRAPH_EXPANSION = os.getenv("KNOWLEDGE_GRAPH_EXPANSION", "0") == "1"
+KNOWLEDGE_TOP_K = int(os.getenv("KNOWLEDGE_TOP_K", "3"))
+# Upper bound on the tokens returned to the agent prompt
+KNOWLEDGE_MAX_TOKENS = int(os.getenv("KNOWLEDGE_MAX_TOKENS", "400"))
+# Largest fraction of that budget the graph facts may take
+KNOWLEDGE_GRAPH_SHARE = float(os.getenv("KNOWLEDGE_GRAPH_SHARE", "0.3"))
+
+# Built-in medical knowledge base
+KNOWLEDGE_BASE = {
+    "tumor_types": """
 Primary brain tumor types:
 1. Gliomas (50% of cases)
    - Glioblastoma (Grade IV): most aggressive, median survival 15 months
@@ -26,9 +42,9 @@ Primary brain tumor types:
 3. Pituitary adenomas (10%)
    - Often functional
    - Medical or surgical treatment
-        """,
+    """,
 
-        "diagnostic_procedures": """
+    "diagnostic_procedures": """
 Recommended additional examinations:
 1. Brain MRI with gadolinium injection (gold standard)
 2. Magnetic resonance spectroscopy (MRS)
@@ -36,9 +52,9 @@ Recommended additional examinations:
 4. Stereotactic biopsy if necessary
 5. Complete neurological tests
 6. Blood tests (tumor markers)
-        """,
+    """,
 
-        "treatment_protocols": """
+    "treatment_protocols": """
 Treatment protocols:
 1. Surgery:
    - Maximal resection if possible
@@ -54,9 +70,9 @@ Treatment protocols:
    - Adjuvant and neoadjuvant protocols
 
 4. Targeted therapies and immunotherapy (clinical trials)
-        """,
+    """,
 
-        "prognosis": """
+    "prognosis": """
 Prognostic factors:
 1. Tumor histological type
 2. Tumor grade (WHO I-IV)
@@ -70,26 +86,143 @@ Prognostic factors:
 - Grade I Meningioma: >90%
 - Grade II Astrocytoma: 50-70%
 - Glioblastoma: 5-10%
-        """
-    }
-
-    # Search in knowledge base
-    results = []
-    query_lower = query.lower()
+    """
+}
 
-    if "type" in query_lower or "classification" in query_lower:
-        results.append(knowledge_base["tumor_types"])
 
-    if "diagnostic" in query_lower or "examination" in query_lower:
-        results.append(knowledge_base["diagnostic_procedures"])
+def split_passages(title: str, text: str) -> list:
+    """Split a knowledge section into passages.
 
-    if "treatment" in query_lower or "therapy" in query_lower:
-        results.append(knowledge_base["treatment_protocols"])
+    A numbered item with sub-points becomes its own passage; runs of
+    one-line items stay together. Each passage keeps its heading line.
+    """
+    blocks, header = [], ""
+    for line in text.strip().splitlines():
+        if not line.strip():
+            continue
+        if re.match(r"\d+\.\s", line):
+            blocks.append([header, [line.strip()]])
+        elif not line[0].isspace() and not line.startswith("-") and line.rstrip().endswith(":"):
+            header = line.strip()
+            blocks.append([header, []])
+        elif blocks:
+            blocks[-1][1].append(line.rstrip())
+
+    passages, current = [], None
+    for block_header, lines in blocks:
+        standalone = len(lines) > 1
+        if current is None or standalone or current[0] != block_header or current[2]:
+            current = [block_header, [], standalone]
+            passages.append(current)
+        current[1].extend(lines)
+    return [
+        {"title": title, "text": "\n".join([h] + lines).strip()}
+        for h, lines, _ in passages if lines
+    ]
+
+
+def load_passages() -> list:
+    """Passages of MEDICAL_CORPUS_PATH, or of the built-in knowledge base."""
+    if MEDICAL_CORPUS_PATH:
+        passages = load_corpus(MEDICAL_CORPUS_PATH)
+        print(f"[INFO] Medical corpus loaded: {len(passages)} passages from {MEDICAL_CORPUS_PATH}")
+        return passages
+    return [
+        passage
+        for key, text in KNOWLEDGE_BASE.items()
+        for passage in split_passages(key.replace("_", " "), text)
+    ]
+
+
+def _load_bm25_index():
+    return BM25Index(load_passages())
+
+
+def _load_embedding_index():
+    from tools.embedding_index import EmbeddingIndex, build_index, make_embedder
+    if not os.path.exists(os.path.join(EMBEDDING_INDEX_DIR, "meta.json")):
+        spec = f"sentence-transformers:{EMBEDDING_MODEL_PATH}" if EMBEDDING_MODEL_PATH else None
+        build_index(load_passages(), EMBEDDING_INDEX_DIR, embedder=make_embedder(spec),
+                    n_clusters=EMBEDDING_CLUSTERS)
+        print(f"[INFO] Embedding index built in {EMBEDDING_INDEX_DIR}")
+    return EmbeddingIndex(EMBEDDING_INDEX_DIR, n_probe=EMBEDDING_NPROBE)
+
+
+registry.register("bm25_index", _load_bm25_index)
+registry.register("embedding_index", _load_embedding_index)
+
+
+def get_knowledge_index():
+    """Return the shared index of MEDICAL_KNOWLEDGE_BACKEND, built on first use."""
+    if MEDICAL_KNOWLEDGE_BACKEND == "embedding":
+        return registry.get("embedding_index")
+    return registry.get("bm25_index")
+
+
+def graph_context(texts: list) -> str:
+    """Neo4j treatments and analyses of the tumor types mentioned in `texts`."""
+    from treatment_snapshot import TUMOR_ALIASES, get_snapshot, normalize_name
+    snapshot = get_snapshot()
+    haystack = f" {' '.join(normalize_name(t) for t in texts)} "
+    known = set(snapshot.treatments) | set(snapshot.analyses)
+    tumors = {name for name in known if f" {name} " in haystack}
+    tumors |= {canonical for alias, canonical in TUMOR_ALIASES.items()
+               if canonical in known and f" {alias} " in haystack}
+
+    lines = []
+    for tumor in sorted(tumors):
+        facts = []
+        if snapshot.treatments.get(tumor):
+            facts.append("treated by " + ", ".join(snapshot.treatments[tumor]))
+        if snapshot.analyses.get(tumor):
+            facts.append("detected by " + ", ".join(snapshot.analyses[tumor]))
+        lines.append(f"- {tumor}: {'; '.join(facts)}")
+    return "[knowledge graph]\n" + "\n".join(lines) if lines else ""
+
+
+def truncate_lines(text: str, max_tokens: int) -> str:
+    """Keep the header line of `text` and the following lines that fit in `max_tokens`.
+
+    Returns:
+        The kept lines in order, or "" if no line fits besides the header
+    """
+    header, *lines = text.splitlines()
+    kept, used = [header], estimate_tokens(header + "\n")
+    for line in lines:
+        cost = estimate_tokens(line + "\n")
+        if used + cost > max_tokens:
+            continue  # Shorter facts further down may still fit
+        kept.append(line)
+        used += cost
+    return "\n".join(kept) if len(kept) > 1 else ""
 
-    if "prognosis" in query_lower or "survival" in query_lower:
-        results.append(knowledge_base["prognosis"])
 
-    if not results:
-        results = list(knowledge_base.values())
+@tool("search_medical_knowledge")
+def search_medical_knowledge(query: str) -> str:
+    """
+    Search medical knowledge base for information about brain tumors.
+    Returns the most relevant passages (BM25 or embedding ranking), optionally
+    expanded with Neo4j relations, within a token budget.
 
-    return "\n\n".join(results)
\ No newline at end of file
+    Args:
+        query: Medical query about brain tumors
+    """
+    with tracing.span("tool.search_medical_knowledge", backend=MEDICAL_KNOWLEDGE_BACKEND) as current:
+        results = get_knowledge_index().search(query, top_k=KNOWLEDGE_TOP_K)
+        current.set("results", len(results))
+
+        graph = ""
+        if KNOWLEDGE_GRAPH_EXPANSION:
+            try:
+                graph = graph_context([query] + [p["text"] for _, p in results])
+            except Exception as e:
+                print(f"[WARN] Knowledge graph expansion skipped: {e}")
+
+        if not results and not graph:
+            return "No matching medical knowledge found for this query."
+        if graph:
+            graph = truncate_lines(graph, int(KNOWLEDGE_MAX_TOKENS * KNOWLEDGE_GRAPH_SHARE))
+        context = build_context(results, KNOWLEDGE_MAX_TOKENS - (estimate_tokens(graph) if graph else 0))
+        output = "\n\n".join(part for part in (context, graph) if part)
+        current.set("context_tokens", estimate_tokens(output))
+        return output or "No matching medical knowledge found for this query."
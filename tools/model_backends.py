@@ -0,0 +1,96 @@
+# tools/model_backends.py - Keras and TFLite backends of the VGG19 classifier
+import os
+import threading
+
+import numpy as np
+
+import registry
+
+KERAS_MODEL_PATH = "models/best_model_VGG19.keras"
+BACKEND_MODEL_PATHS = {
+    "keras": KERAS_MODEL_PATH,
+    "tflite-fp16": "models/best_model_VGG19_fp16.tflite",
+    "tflite-int8": "models/best_model_VGG19_int8.tflite",
+}
+# "keras" (float32 model) or a quantized export: "tflite-fp16", "tflite-int8"
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "keras")
+# Interpreter threads for the TFLite backends (0 = let TFLite decide)
+TFLITE_NUM_THREADS = int(os.getenv("TFLITE_NUM_THREADS", str(os.cpu_count() or 1)))
+
+
+def backend_model_path(backend: str) -> str:
+    """Model file used by a backend ("keras", "tflite-fp16" or "tflite-int8")."""
+    if backend not in BACKEND_MODEL_PATHS:
+        raise ValueError(f"Unknown classifier backend: {backend} (expected one of {', '.join(BACKEND_MODEL_PATHS)})")
+    return BACKEND_MODEL_PATHS[backend]
+
+
+def _interpreter_class():
+    # The slim tflite-runtime wheel is enough on inference nodes
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        Interpreter = registry.timed_import("tensorflow").lite.Interpreter
+    return Interpreter
+
+
+class TFLiteClassifier:
+    """TFLite interpreter exposing the Keras `predict(batch, verbose=0)` call.
+
+    Quantized input/output tensors are converted from/to float32, so callers
+    get the same probabilities as with the Keras model.
+    """
+
+    def __init__(self, model_path: str, num_threads: int = TFLITE_NUM_THREADS):
+        self.model_path = model_path
+        self.interpreter = _interpreter_class()(
+            model_path=model_path, num_threads=num_threads or None
+        )
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size: int):
+        shape = list(self._input["shape"])
+        shape[0] = batch_size
+        self.interpreter.resize_tensor_input(self._input["index"], shape)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = batch_size
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        """Run a float32 (N, 224, 224, 3) batch and return float32 (N, 1) outputs."""
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self._resize(batch.shape[0])
+
+            scale, zero_point = self._input["quantization"]
+            if scale:
+                batch = np.clip(np.round(batch / scale + zero_point),
+                                np.iinfo(self._input["dtype"]).min,
+                                np.iinfo(self._input["dtype"]).max)
+            self.interpreter.set_tensor(self._input["index"], batch.astype(self._input["dtype"]))
+            self.interpreter.invoke()
+            outputs = self.interpreter.get_tensor(self._output["index"])
+
+            scale, zero_point = self._output["quantization"]
+            if scale:
+                outputs = (outputs.astype(np.float32) - zero_point) * scale
+            return outputs.astype(np.float32)
+
+
+def load_backend_model(backend: str):
+    """Load the classifier of a backend.
+
+    Returns:
+        A model with a Keras-like `predict(batch, verbose=0)` method
+    """
+    path = backend_model_path(backend)
+    if backend == "keras":
+        tf = registry.timed_import("tensorflow")
+        return tf.keras.models.load_model(path)
+    return TFLiteClassifier(path)
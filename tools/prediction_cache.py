@@ -0,0 +1,211 @@
+# tools/prediction_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+def model_fingerprint(model_path: str) -> str:
+    """Identify a model file by absolute path, modification time and size."""
+    path = os.path.abspath(model_path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return f"{path}:missing"
+    return f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class PredictionCache:
+    """Content-addressed cache of model predictions.
+
+    Entries are keyed by a hash of the image content (the hash of the raw
+    file bytes, so a hit needs no decoding, or else the preprocessed pixels)
+    and the fingerprint of the model file, so a changed model never serves
+    stale predictions. An in-memory LRU tier is always used; a SQLite tier,
+    bounded in entries and in bytes, is added when `disk_path` is given.
+    A prediction may carry a text detail (e.g. the suspicious slices of a
+    volume).
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        max_memory_entries: int = 1024,
+        disk_path: str = None,
+        max_disk_entries: int = 100_000,
+        max_disk_bytes: int = None
+    ):
+        self.model_path = model_path
+        self.max_memory_entries = max_memory_entries
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._db = None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS predictions (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    detail TEXT
+                )
+            """)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(predictions)")]
+            if "detail" not in columns:  # Database of an earlier version
+                self._db.execute("ALTER TABLE predictions ADD COLUMN detail TEXT")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON predictions (accessed)")
+            self._db.commit()
+
+    def fingerprint(self) -> str:
+        """Return the current model fingerprint, dropping entries of older models."""
+        current = model_fingerprint(self.model_path)
+        if current != self._fingerprint:
+            with self._lock:
+                self._memory.clear()
+                if self._db is not None:
+                    self._db.execute("DELETE FROM predictions WHERE fingerprint != ?", (current,))
+                    self._db.commit()
+                self._fingerprint = current
+        return current
+
+    def key_for(self, inputs, fingerprint: str = None) -> str:
+        """Build the cache key of an image.
+
+        Args:
+            inputs: Raw (encoded) image bytes, a content hash string (see
+                upload_store.content_key), or a preprocessed array
+            fingerprint: Model fingerprint (default: the current one); pass
+                the same value to `put`
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update((fingerprint or self.fingerprint()).encode())
+        if isinstance(inputs, np.ndarray):
+            digest.update(str(inputs.shape).encode())
+            digest.update(np.ascontiguousarray(inputs, dtype=np.float32).data)
+        elif isinstance(inputs, str):
+            digest.update(b"hash:" + inputs.encode())
+        else:
+            digest.update(b"raw:")
+            digest.update(inputs)
+        return digest.hexdigest()
+
+    def get(self, key: str, with_detail: bool = False):
+        """Return the cached prediction for `key`, or None on a miss.
+
+        With `with_detail`, a hit is returned as (prediction, detail).
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                entry = self._memory[key]
+                return entry if with_detail else entry[0]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, detail FROM predictions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE predictions SET accessed = ? WHERE key = ?", (time.time(), key)
+                    )
+                    self._db.commit()
+                    self.hits_disk += 1
+                    self._remember(key, row[0], row[1])
+                    return tuple(row) if with_detail else row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: float, fingerprint: str = None, detail: str = None):
+        """Store a prediction in every tier.
+
+        Args:
+            fingerprint: Model fingerprint the key was built with (default:
+                the current one); predictions of a model replaced meanwhile
+                are dropped
+            detail: Text stored with the prediction
+        """
+        with self._lock:
+            fingerprint = fingerprint or self._fingerprint
+            if fingerprint != self._fingerprint:
+                return
+            self._remember(key, value, detail)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions (key, fingerprint, value, accessed, detail) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, fingerprint, value, time.time(), detail)
+                )
+                count = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+                if count > self.max_disk_entries:
+                    self._db.execute(
+                        """DELETE FROM predictions WHERE key IN (
+                            SELECT key FROM predictions ORDER BY accessed LIMIT ?
+                        )""",
+                        (count - self.max_disk_entries,)
+                    )
+                if self.max_disk_bytes:
+                    self._trim_disk_bytes()
+                self._db.commit()
+
+    def _disk_bytes(self) -> int:
+        # Pages in use: deleted rows go to the freelist and are reused
+        pragma = lambda name: self._db.execute(f"PRAGMA {name}").fetchone()[0]
+        return (pragma("page_count") - pragma("freelist_count")) * pragma("page_size")
+
+    def _trim_disk_bytes(self):
+        # Called with the lock held: drop the least recently used tenth until under budget
+        while self._disk_bytes() > self.max_disk_bytes:
+            count = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            if count <= 1:
+                break
+            self._db.execute(
+                "DELETE FROM predictions WHERE key IN (SELECT key FROM predictions ORDER BY accessed LIMIT ?)",
+                (max(1, count // 10),)
+            )
+
+    def _remember(self, key: str, value: float, detail: str = None):
+        self._memory[key] = (value, detail)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """Remove every cached prediction."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and tier sizes."""
+        with self._lock:
+            disk_entries = disk_bytes = None
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+                disk_bytes = self._disk_bytes()
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_bytes,
+            }
@@ -0,0 +1,102 @@
+# tools/preprocessing.py
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+IMAGE_SIZE = (224, 224)
+DECODE_WORKERS = int(os.getenv("PREPROCESS_WORKERS", str(min(8, os.cpu_count() or 1))))
+# Reduced-size JPEG decoding is faster but changes pixels slightly, so it is opt-in
+JPEG_DRAFT = os.getenv("PREPROCESS_JPEG_DRAFT", "0") == "1"
+
+# uint8 -> float32 lookup table. float32(x / 255.0) is exactly what the model
+# received from the former `np.array(img) / 255.0` once TensorFlow cast it.
+_SCALE_LUT = (np.arange(256, dtype=np.float64) / 255.0).astype(np.float32)
+
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="preprocess")
+    return _executor
+
+
+def open_image(source) -> Image.Image:
+    """Open an image from a path, raw bytes or a binary file-like object."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(source))
+    return Image.open(source)
+
+
+def load_resized(source, draft: bool = JPEG_DRAFT) -> Image.Image:
+    """Decode an image and resize it to the model input size.
+
+    Args:
+        source: Path, raw bytes or binary file-like object
+        draft: Let the JPEG decoder downscale while decoding (not bit-identical)
+
+    Returns:
+        224x224 RGB PIL image
+    """
+    img = open_image(source)
+    if draft:
+        img.draft("RGB", IMAGE_SIZE)
+    return img.convert("RGB").resize(IMAGE_SIZE)
+
+
+def preprocess_into(source, out: np.ndarray, draft: bool = JPEG_DRAFT) -> np.ndarray:
+    """Decode one image and write the scaled pixels into `out`.
+
+    Args:
+        source: Path, raw bytes or binary file-like object
+        out: float32 array of shape (224, 224, 3) to fill
+        draft: See `load_resized`
+
+    Returns:
+        `out`
+    """
+    pixels = np.asarray(load_resized(source, draft))
+    np.take(_SCALE_LUT, pixels, out=out, mode="clip")
+    return out
+
+
+def preprocess_pixels_into(pixels: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """Resize a uint8 grayscale or RGB array and write the scaled pixels into `out`.
+
+    Same resizing and scaling as `preprocess_into`, for images that are
+    already decoded (e.g. slices of a volume).
+    """
+    img = Image.fromarray(np.ascontiguousarray(pixels, dtype=np.uint8))
+    np.take(_SCALE_LUT, np.asarray(img.convert("RGB").resize(IMAGE_SIZE)), out=out, mode="clip")
+    return out
+
+
+def preprocess_batch(paths_or_buffers, draft: bool = JPEG_DRAFT, out: np.ndarray = None) -> np.ndarray:
+    """Preprocess several MRI images into one contiguous model input batch.
+
+    Images are decoded in a thread pool and written straight into a
+    preallocated float32 buffer.
+
+    Args:
+        paths_or_buffers: Paths, raw bytes or binary file-like objects
+        draft: See `load_resized`
+        out: Optional preallocated float32 array of shape (N, 224, 224, 3)
+
+    Returns:
+        float32 array of shape (N, 224, 224, 3) with values in [0, 1]
+    """
+    sources = list(paths_or_buffers)
+    if out is None:
+        out = np.empty((len(sources), *IMAGE_SIZE, 3), dtype=np.float32)
+
+    if len(sources) == 1:
+        preprocess_into(sources[0], out[0], draft)
+    elif sources:
+        # list() re-raises the first decoding error, if any
+        list(_get_executor().map(
+            lambda i: preprocess_into(sources[i], out[i], draft), range(len(sources))
+        ))
+    return out
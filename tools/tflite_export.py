@@ -0,0 +1,185 @@
+# tools/tflite_export.py - Quantized TFLite export of the VGG19 classifier
+"""Convert the Keras model to TFLite (float16 and int8) and check parity.
+
+Usage:
+    python -m tools.tflite_export --calibration data/calibration [--samples 200]
+    python -m tools.tflite_export --report-only --eval data/validation --report parity.json
+
+The int8 model uses post-training quantization calibrated on MRIs of the
+calibration folder; inputs and outputs stay float32. The parity report runs
+every backend in its own process over the evaluation images and compares
+probabilities and diagnoses with the Keras model, along with per-image
+latency and resident memory.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+import registry
+from tools.model_backends import BACKEND_MODEL_PATHS, KERAS_MODEL_PATH, load_backend_model
+from tools.preprocessing import preprocess_batch
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def list_images(folder: str, limit: int = None) -> list:
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, files in os.walk(folder)
+        for name in files if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    return paths[:limit] if limit else paths
+
+
+def export_tflite(quantization: str, calibration_paths: list = None) -> str:
+    """Convert the Keras model and write the TFLite file of a backend.
+
+    Args:
+        quantization: "fp16" or "int8"
+        calibration_paths: MRIs feeding the int8 representative dataset
+
+    Returns:
+        Path of the written .tflite file
+    """
+    tf = registry.timed_import("tensorflow")
+    model = tf.keras.models.load_model(KERAS_MODEL_PATH)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantization == "fp16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        if not calibration_paths:
+            raise ValueError("int8 quantization needs calibration images")
+
+        def representative_dataset():
+            for path in calibration_paths:
+                yield [preprocess_batch([path])]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    else:
+        raise ValueError(f"Unknown quantization: {quantization}")
+
+    out_path = BACKEND_MODEL_PATHS[f"tflite-{quantization}"]
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+    print(f"✅ {out_path} written ({os.path.getsize(out_path) / 1e6:.1f} MB)")
+    return out_path
+
+
+def _rss_mb() -> float:
+    """Current resident set size of this process, in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource  # Peak RSS where /proc is unavailable
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _measure_backend(backend: str, paths: list) -> dict:
+    """Run one backend over `paths` (called in a fresh process)."""
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    model = load_backend_model(backend)
+    load_seconds = time.perf_counter() - start
+
+    probabilities, latencies = [], []
+    model.predict(preprocess_batch(paths[:1]), verbose=0)  # Warm-up, not timed
+    for path in paths:
+        batch = preprocess_batch([path])
+        start = time.perf_counter()
+        probabilities.append(float(model.predict(batch, verbose=0)[0][0]))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "probabilities": probabilities,
+        "load_seconds": round(load_seconds, 2),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        "rss_mb": round(_rss_mb() - rss_before, 1),
+        "model_mb": round(os.path.getsize(BACKEND_MODEL_PATHS[backend]) / 1e6, 1),
+    }
+
+
+def parity_report(paths: list) -> dict:
+    """Compare every available backend with the Keras model on `paths`."""
+    backends = [b for b, path in BACKEND_MODEL_PATHS.items() if os.path.exists(path)]
+    if "keras" not in backends:
+        raise SystemExit(f"ERROR: {KERAS_MODEL_PATH} is required as the reference model")
+
+    # One process per backend keeps the RSS numbers independent
+    context = multiprocessing.get_context("spawn")
+    measures = {}
+    for backend in backends:
+        with context.Pool(1) as pool:
+            measures[backend] = pool.apply(_measure_backend, (backend, paths))
+
+    reference = np.array(measures["keras"]["probabilities"])
+    report = {"images": len(paths), "backends": {}}
+    for backend, measure in measures.items():
+        probs = np.array(measure.pop("probabilities"))
+        diff = np.abs(probs - reference)
+        report["backends"][backend] = {
+            **measure,
+            "max_abs_diff": round(float(diff.max()), 5),
+            "mean_abs_diff": round(float(diff.mean()), 5),
+            "diagnosis_agreement": round(float(np.mean((probs > 0.5) == (reference > 0.5))), 4),
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"\nParity on {report['images']} images (reference: keras)")
+    print(f"{'backend':<12} {'size MB':>8} {'RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'max |Δp|':>9} {'agree':>7}")
+    for backend, r in report["backends"].items():
+        print(f"{backend:<12} {r['model_mb']:>8} {r['rss_mb']:>8} {r['latency_ms_p50']:>8} "
+              f"{r['latency_ms_p95']:>8} {r['max_abs_diff']:>9} {r['diagnosis_agreement']:>7.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the VGG19 classifier to quantized TFLite")
+    parser.add_argument("--calibration", help="Folder of MRIs used for int8 calibration")
+    parser.add_argument("--samples", type=int, default=200, help="Calibration images used")
+    parser.add_argument("--quantization", nargs="+", choices=["fp16", "int8"], default=["fp16", "int8"])
+    parser.add_argument("--eval", help="Folder of MRIs for the parity report (default: calibration folder)")
+    parser.add_argument("--report", help="Write the parity report as JSON to this path")
+    parser.add_argument("--report-only", action="store_true", help="Skip the export, only compare")
+    args = parser.parse_args()
+
+    if not os.path.exists(KERAS_MODEL_PATH):
+        raise SystemExit(f"ERROR: {KERAS_MODEL_PATH} not found")
+
+    if not args.report_only:
+        calibration = list_images(args.calibration, args.samples) if args.calibration else []
+        for quantization in args.quantization:
+            if quantization == "int8" and not calibration:
+                print("[WARN] int8 skipped: --calibration folder with images required")
+                continue
+            export_tflite(quantization, calibration)
+
+    eval_folder = args.eval or args.calibration
+    if not eval_folder:
+        return
+    paths = list_images(eval_folder, args.samples)
+    if not paths:
+        raise SystemExit(f"ERROR: no images in {eval_folder}")
+    report = parity_report(paths)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
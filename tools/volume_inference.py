@@ -0,0 +1,236 @@
+# tools/volume_inference.py - Slice-by-slice VGG19 inference on NIfTI volumes
+"""Classify a 3D MRI volume without exporting its slices.
+
+Axial slices are contiguous in a NIfTI-1 file, so they are read
+sequentially, VOLUME_BATCH_SIZE at a time; a .nii.gz is decompressed on the
+fly, once, never to disk. Slices are normalized and preprocessed exactly
+like 2D uploads and go through the model in fixed-size batches, so peak
+memory depends on VOLUME_BATCH_SIZE, not on the volume size. Per-slice
+tumor probabilities are aggregated into a volume result with the most
+suspicious slice indices.
+
+Usage:
+    python -m tools.volume_inference scan.nii.gz [--batch-size 16] [--top-k 3]
+"""
+import argparse
+import gzip
+import os
+import struct
+
+import numpy as np
+
+import tracing
+from tools.preprocessing import IMAGE_SIZE, preprocess_pixels_into
+
+VOLUME_EXTENSIONS = (".nii", ".nii.gz")
+VOLUME_BATCH_SIZE = int(os.getenv("VOLUME_BATCH_SIZE", "16"))
+# Volume probability = mean of the top-k slice probabilities
+VOLUME_TOP_K = int(os.getenv("VOLUME_TOP_K", "3"))
+# Slices with less non-background signal than this fraction are skipped
+VOLUME_MIN_FOREGROUND = float(os.getenv("VOLUME_MIN_FOREGROUND", "0.05"))
+
+NIFTI_HEADER_SIZE = 348
+NIFTI_DTYPES = {
+    2: "u1", 4: "i2", 8: "i4", 16: "f4", 64: "f8",
+    256: "i1", 512: "u2", 768: "u4", 1024: "i8", 1280: "u8",
+}
+
+
+def is_volume_path(path: str) -> bool:
+    return str(path).lower().endswith(VOLUME_EXTENSIONS)
+
+
+def _open_raw(path: str):
+    # .nii.gz is decompressed as it is read
+    return gzip.open(path, "rb") if path.lower().endswith(".gz") else open(path, "rb")
+
+
+def read_nifti_header(path: str) -> dict:
+    """Parse the fields of a NIfTI-1 header needed to read the voxels.
+
+    Raises:
+        ValueError: If the file is not a single-file NIfTI-1 volume
+    """
+    with _open_raw(path) as f:
+        header = f.read(NIFTI_HEADER_SIZE)
+    if len(header) < NIFTI_HEADER_SIZE:
+        raise ValueError(f"Truncated NIfTI header: {path}")
+
+    for endian in ("<", ">"):
+        if struct.unpack(endian + "i", header[:4])[0] == NIFTI_HEADER_SIZE:
+            break
+    else:
+        raise ValueError(f"Not a NIfTI-1 file: {path}")
+    if header[344:347] != b"n+1":
+        raise ValueError(f"Only single-file NIfTI-1 (.nii) volumes are supported: {path}")
+
+    dim = struct.unpack(endian + "8h", header[40:56])
+    datatype = struct.unpack(endian + "h", header[70:72])[0]
+    if datatype not in NIFTI_DTYPES:
+        raise ValueError(f"Unsupported NIfTI datatype {datatype}: {path}")
+    if dim[0] < 3 or any(d > 1 for d in dim[4:dim[0] + 1]):
+        raise ValueError(f"Expected a 3D volume, got dimensions {dim[1:dim[0] + 1]}: {path}")
+    slope, intercept = struct.unpack(endian + "2f", header[112:120])
+    offset = struct.unpack(endian + "f", header[108:112])[0]
+    if not np.isfinite(offset) or offset < NIFTI_HEADER_SIZE:
+        raise ValueError(f"Invalid NIfTI voxel offset {offset}: {path}")
+
+    return {
+        "shape": tuple(int(d) for d in dim[1:4]),
+        "dtype": np.dtype(endian + NIFTI_DTYPES[datatype]),
+        "offset": int(offset),
+        # A zero slope means "no scaling"
+        "slope": slope if slope != 0.0 and np.isfinite(slope) else 1.0,
+        "intercept": intercept if np.isfinite(intercept) else 0.0,
+    }
+
+
+def iter_slice_batches(path: str, header: dict, batch_size: int = VOLUME_BATCH_SIZE):
+    """Read the axial slices of a volume in order, `batch_size` at a time.
+
+    Voxels are stored with x varying fastest and z slowest, so each chunk of
+    slices is one contiguous read.
+
+    Yields:
+        (index of the first slice, (X, Y, n) voxel array)
+
+    Raises:
+        ValueError: If the file ends before the last slice
+    """
+    width, height, depth = header["shape"]
+    slice_bytes = width * height * header["dtype"].itemsize
+    with _open_raw(path) as f:
+        # For .nii.gz, seeking forward decompresses and discards the extension bytes
+        f.seek(header["offset"])
+        for start in range(0, depth, batch_size):
+            count = min(batch_size, depth - start)
+            data = f.read(count * slice_bytes)
+            if len(data) < count * slice_bytes:
+                raise ValueError(f"Truncated NIfTI volume at slice {start + len(data) // slice_bytes}: {path}")
+            yield start, np.frombuffer(data, dtype=header["dtype"]).reshape((width, height, count), order="F")
+
+
+def read_slice(path: str, header: dict, z: int) -> np.ndarray:
+    """Read the single axial slice `z` of a volume as an (X, Y) array."""
+    width, height, depth = header["shape"]
+    if not 0 <= z < depth:
+        raise ValueError(f"Slice {z} out of range 0-{depth - 1}: {path}")
+    slice_bytes = width * height * header["dtype"].itemsize
+    with _open_raw(path) as f:
+        f.seek(header["offset"] + z * slice_bytes)
+        data = f.read(slice_bytes)
+    if len(data) < slice_bytes:
+        raise ValueError(f"Truncated NIfTI volume at slice {z}: {path}")
+    return np.frombuffer(data, dtype=header["dtype"]).reshape((width, height), order="F")
+
+
+def normalize_slice(voxels: np.ndarray, slope: float = 1.0, intercept: float = 0.0):
+    """Window an axial slice to uint8, like an exported grayscale image.
+
+    Intensities are clipped to the 1st-99th percentile of the slice
+    foreground and scaled to 0-255. The slice is rotated so that anterior
+    points up, as in radiological 2D exports.
+
+    Returns:
+        (uint8 2D array, foreground fraction)
+    """
+    values = np.asarray(voxels, dtype=np.float32) * slope + intercept
+    background = values.min()
+    foreground = values > background
+    fraction = float(foreground.mean())
+    if not foreground.any():
+        return np.zeros(values.shape[::-1], dtype=np.uint8), 0.0
+    low, high = np.percentile(values[foreground], (1, 99))
+    if high <= low:
+        high = low + 1.0
+    scaled = np.clip((values - low) / (high - low), 0.0, 1.0) * 255.0
+    return np.rot90(scaled).astype(np.uint8), fraction
+
+
+def classify_volume(path: str, model, batch_size: int = VOLUME_BATCH_SIZE, top_k: int = VOLUME_TOP_K,
+                    min_foreground: float = VOLUME_MIN_FOREGROUND) -> dict:
+    """Run every axial slice of a volume through the classifier.
+
+    Args:
+        path: .nii or .nii.gz file
+        model: Object with a Keras-like `predict(batch, verbose=0)`
+        batch_size: Slices per model call; the batch buffer is reused and the
+            last batch is zero-padded so the model always sees one shape
+        top_k: Number of most suspicious slices reported and averaged
+        min_foreground: Skip slices with a smaller non-background fraction
+
+    Returns:
+        dict with the volume probability, the top slices as
+        (index, probability) pairs and the per-slice probabilities
+        (None for skipped slices)
+    """
+    header = read_nifti_header(path)
+    depth = header["shape"][2]
+    probabilities = [None] * depth
+    batch = np.zeros((batch_size, *IMAGE_SIZE, 3), dtype=np.float32)
+    indices = []
+
+    def flush():
+        outputs = np.asarray(model.predict(batch, verbose=0), dtype=np.float32).reshape(batch_size, -1)
+        for row, index in enumerate(indices):
+            probabilities[index] = float(outputs[row, 0])
+        indices.clear()
+
+    with tracing.span("classify.volume", slices=depth, batch_size=batch_size):
+        for start, voxels in iter_slice_batches(path, header, batch_size):
+            for i in range(voxels.shape[2]):
+                pixels, fraction = normalize_slice(voxels[:, :, i], header["slope"], header["intercept"])
+                if fraction < min_foreground:
+                    continue
+                preprocess_pixels_into(pixels, batch[len(indices)])
+                indices.append(start + i)
+                if len(indices) == batch_size:
+                    flush()
+        if indices:
+            batch[len(indices):] = 0.0
+            flush()
+
+    evaluated = [(z, p) for z, p in enumerate(probabilities) if p is not None]
+    if not evaluated:
+        raise ValueError(f"No slice with enough signal in {os.path.basename(path)}")
+    top = sorted(evaluated, key=lambda item: item[1], reverse=True)[:max(1, top_k)]
+    return {
+        "shape": header["shape"],
+        "slices": depth,
+        "evaluated": len(evaluated),
+        "volume_probability": float(np.mean([p for _, p in top])),
+        "top_slices": top,
+        "slice_probabilities": probabilities,
+    }
+
+
+def preview_slice(path: str, z: int = None) -> np.ndarray:
+    """Normalized axial slice of a volume (the middle one by default), for display."""
+    header = read_nifti_header(path)
+    z = header["shape"][2] // 2 if z is None else z
+    return normalize_slice(read_slice(path, header, z), header["slope"], header["intercept"])[0]
+
+
+def format_top_slices(top_slices) -> str:
+    return ", ".join(f"{z} ({p * 100:.1f}%)" for z, p in top_slices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify a NIfTI MRI volume slice by slice")
+    parser.add_argument("volume", help=".nii or .nii.gz file")
+    parser.add_argument("--batch-size", type=int, default=VOLUME_BATCH_SIZE)
+    parser.add_argument("--top-k", type=int, default=VOLUME_TOP_K)
+    args = parser.parse_args()
+
+    from tools.classifier_tool import format_prediction, get_classifier_model
+    model = get_classifier_model()
+    if model is None:
+        raise SystemExit("VGG19 model not loaded")
+    result = classify_volume(args.volume, model, batch_size=args.batch_size, top_k=args.top_k)
+    print(format_prediction(result["volume_probability"]))
+    print(f"Suspicious slices: {format_top_slices(result['top_slices'])}")
+    print(f"[INFO] {result['evaluated']}/{result['slices']} slices evaluated, volume shape {result['shape']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+# tracing.py - Spans for agents, tools, LLM requests and Neo4j queries
+"""Lightweight tracing and metrics.
+
+Spans nest through a context variable, so an agent span contains the tool,
+LLM and Neo4j spans run inside it (threads started with
+`contextvars.copy_context` keep the parent). Finished spans are:
+    - appended to a rotating JSONL trace file (TRACE_PATH)
+    - kept in memory for the last TRACE_KEEP traces (waterfall views)
+    - aggregated into Prometheus histograms, rendered by `prometheus_text`
+      and written to METRICS_PATH (textfile collector) when it is set
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+TRACE_PATH = os.getenv("TRACE_PATH", ".cache/traces/trace.jsonl")
+TRACE_MAX_MB = float(os.getenv("TRACE_MAX_MB", "10"))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "3"))
+# Number of recent traces kept in memory
+TRACE_KEEP = int(os.getenv("TRACE_KEEP", "50"))
+# Prometheus textfile, rewritten when a trace finishes (disabled if unset)
+METRICS_PATH = os.getenv("METRICS_PATH")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_traces = OrderedDict()
+_traces_lock = threading.Lock()
+_metrics_lock = threading.Lock()
+_durations = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1) + [0.0])  # buckets, +Inf, sum
+_errors = defaultdict(int)
+_tokens = defaultdict(int)
+_trace_logger = None
+_logger_lock = threading.Lock()
+
+
+class Span:
+    """One timed operation; attributes are set with `set`."""
+
+    def __init__(self, name: str, parent=None, attributes: dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self._start_perf = time.perf_counter()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "thread": threading.current_thread().name,
+            "attributes": self.attributes,
+        }
+
+
+def _get_logger():
+    global _trace_logger
+    with _logger_lock:
+        if _trace_logger is None:
+            os.makedirs(os.path.dirname(os.path.abspath(TRACE_PATH)), exist_ok=True)
+            handler = RotatingFileHandler(
+                TRACE_PATH, maxBytes=int(TRACE_MAX_MB * 1024 * 1024),
+                backupCount=TRACE_BACKUPS, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("braintumor.trace")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _trace_logger = logger
+    return _trace_logger
+
+
+def _record(span: Span):
+    record = span.to_dict()
+    with _traces_lock:
+        _traces.setdefault(span.trace_id, []).append(record)
+        _traces.move_to_end(span.trace_id)
+        while len(_traces) > TRACE_KEEP:
+            _traces.popitem(last=False)
+
+    with _metrics_lock:
+        histogram = _durations[span.name]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if span.duration <= bound:
+                histogram[i] += 1
+        histogram[len(DURATION_BUCKETS)] += 1  # +Inf, i.e. the count
+        histogram[-1] += span.duration
+        if span.status == "error":
+            _errors[span.name] += 1
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if kind in span.attributes:
+                _tokens[(span.attributes.get("agent") or "", kind)] += int(span.attributes[kind])
+
+    try:
+        _get_logger().info(json.dumps(record, ensure_ascii=False, default=str))
+    except Exception as e:
+        print(f"[WARN] Trace write failed: {e}")
+
+    if METRICS_PATH and span.parent_id is None:
+        write_metrics_file(METRICS_PATH)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a block as a child of the current span (or as a new trace).
+
+    Yields:
+        The Span, so the block can add attributes with `span.set`
+    """
+    if not TRACE_ENABLED:
+        yield Span(name, attributes=attributes)
+        return
+    current = Span(name, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current._start_perf
+        _current_span.reset(token)
+        _record(current)
+
+
+def traced(name: str):
+    """Decorator running the function inside `span(name)`."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(**attributes):
+    """Add attributes to the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def current_trace_id():
+    current = _current_span.get()
+    return current.trace_id if current else None
+
+
+def get_trace(trace_id: str) -> list:
+    """Finished spans of a trace, ordered by start time."""
+    with _traces_lock:
+        spans = list(_traces.get(trace_id, []))
+    return sorted(spans, key=lambda s: s["start"])
+
+
+def last_trace(root_name: str = None) -> list:
+    """Spans of the most recent finished trace (optionally with this root span name)."""
+    with _traces_lock:
+        candidates = [
+            spans for spans in reversed(_traces.values())
+            if any(s["parent_id"] is None and (root_name is None or s["name"] == root_name) for s in spans)
+        ]
+    return sorted(candidates[0], key=lambda s: s["start"]) if candidates else []
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def prometheus_text() -> str:
+    """Metrics in the Prometheus text exposition format."""
+    lines = [
+        "# HELP braintumor_span_duration_seconds Duration of traced operations",
+        "# TYPE braintumor_span_duration_seconds histogram",
+    ]
+    with _metrics_lock:
+        durations = {name: list(values) for name, values in _durations.items()}
+        errors = dict(_errors)
+        tokens = dict(_tokens)
+
+    for name, values in sorted(durations.items()):
+        label = f'span="{_label(name)}"'
+        for bound, count in zip(DURATION_BUCKETS, values):
+            lines.append(f'braintumor_span_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'braintumor_span_duration_seconds_bucket{{{label},le="+Inf"}} {values[len(DURATION_BUCKETS)]}')
+        lines.append(f"braintumor_span_duration_seconds_sum{{{label}}} {values[-1]:.6f}")
+        lines.append(f"braintumor_span_duration_seconds_count{{{label}}} {values[len(DURATION_BUCKETS)]}")
+
+    lines += [
+        "# HELP braintumor_span_errors_total Traced operations that raised",
+        "# TYPE braintumor_span_errors_total counter",
+    ]
+    for name, count in sorted(errors.items()):
+        lines.append(f'braintumor_span_errors_total{{span="{_label(name)}"}} {count}')
+
+    lines += [
+        "# HELP braintumor_llm_tokens_total LLM tokens by agent and kind",
+        "# TYPE braintumor_llm_tokens_total counter",
+    ]
+    for (agent, kind), count in sorted(tokens.items()):
+        lines.append(f'braintumor_llm_tokens_total{{agent="{_label(agent)}",kind="{kind}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_file(path: str):
+    """Atomically write the Prometheus metrics (node-exporter textfile format)."""
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(prometheus_text())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[WARN] Metrics write failed: {e}")
@@ -0,0 +1,200 @@
+# treatment_snapshot.py - In-process snapshot of tumor -> treatment / analysis relations
+import os
+import re
+import threading
+import time
+import unicodedata
+
+import registry
+import tracing
+
+SNAPSHOT_TTL = float(os.getenv("NEO4J_SNAPSHOT_TTL", "600"))
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv("NEO4J_SNAPSHOT_CHECK_INTERVAL", "30"))
+# Longest a lookup waits for the initial load before answering without it
+SNAPSHOT_FIRST_LOAD_TIMEOUT = float(os.getenv("NEO4J_SNAPSHOT_FIRST_LOAD_TIMEOUT", "5"))
+
+# French names used in the graph -> canonical English names
+TUMOR_ALIASES = {
+    "glioblastome": "glioblastoma",
+    "glioblastome multiforme": "glioblastoma",
+    "glioblastoma multiforme": "glioblastoma",
+    "gbm": "glioblastoma",
+    "gliome": "glioma",
+    "meningiome": "meningioma",
+    "astrocytome": "astrocytoma",
+    "oligodendrogliome": "oligodendroglioma",
+    "adenome hypophysaire": "pituitary adenoma",
+    "adenome de l'hypophyse": "pituitary adenoma",
+    "medulloblastome": "medulloblastoma",
+    "ependymome": "ependymoma",
+    "schwannome vestibulaire": "vestibular schwannoma",
+}
+
+SNAPSHOT_QUERY = """
+MATCH (t)-[r:TRAITE_PAR|DETECTE_PAR]->(x)
+RETURN t.name AS tumor, type(r) AS relation, x.name AS target
+"""
+
+# Node and relationship counts come from the count store, so this is cheap;
+# the GraphMeta marker (see neo4j_connector.mark_graph_updated) reveals
+# in-place property edits, which leave the counts unchanged
+CHANGE_TOKEN_QUERY = """
+CALL { MATCH (n) RETURN count(n) AS nodes }
+CALL { MATCH ()-[r]->() RETURN count(r) AS rels }
+CALL { MATCH (m:GraphMeta) RETURN max(m.updated_at) AS updated_at }
+RETURN nodes, rels, updated_at
+"""
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, strip accents and punctuation, and map French aliases."""
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"[^a-z0-9' ]+", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return TUMOR_ALIASES.get(text, text)
+
+
+def extract_tumor_type(clinical_text: str):
+    """Return the tumor type of a "Probable type: ..." line, or None."""
+    for line in (clinical_text or "").splitlines():
+        key, sep, value = line.partition(":")
+        if sep and "type" in key.lower():
+            # "Glioblastoma (GBM) / Astrocytoma" -> "Glioblastoma"
+            value = re.split(r"[(/,;]", value)[0].strip().strip("*").strip()
+            if value and value.lower() not in ("undetermined", "unknown", "none", "n/a"):
+                return value
+    return None
+
+
+def _read_relations(tx):
+    with tracing.span("neo4j.query", query="snapshot_relations") as current:
+        relations = [(r["tumor"], r["relation"], r["target"]) for r in tx.run(SNAPSHOT_QUERY)]
+        current.set("rows", len(relations))
+        return relations
+
+
+def read_change_token(tx):
+    """Cheap version stamp of the graph: changes when nodes, relationships or
+    the last-modified marker change. For `session.execute_read`."""
+    with tracing.span("neo4j.query", query="change_token"):
+        record = tx.run(CHANGE_TOKEN_QUERY).single()
+        return (record["nodes"], record["rels"], record["updated_at"]) if record else None
+
+
+class TreatmentSnapshot:
+    """Indexed copy of the tumor relations of the knowledge graph.
+
+    Lookups are dict reads with no network round trip. Until the snapshot is
+    first loaded, a lookup waits for the running load, at most
+    `first_load_timeout` seconds; afterwards it is refreshed in the
+    background when the graph's change token (node and relationship counts,
+    last-modified marker) changes or the TTL expires. If Neo4j is
+    unavailable, the last loaded data (or nothing) keeps being served.
+    """
+
+    def __init__(self, driver_getter, ttl_seconds: float = SNAPSHOT_TTL, check_seconds: float = SNAPSHOT_CHECK_INTERVAL,
+                 first_load_timeout: float = SNAPSHOT_FIRST_LOAD_TIMEOUT):
+        self.driver_getter = driver_getter
+        self.ttl_seconds = ttl_seconds
+        self.check_seconds = check_seconds
+        self.first_load_timeout = first_load_timeout
+        self.treatments = {}
+        self.analyses = {}
+        self.change_token = None
+        self.loaded_at = None
+        self.checked_at = None
+        self.last_error = None
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """True once the snapshot was loaded at least once."""
+        return self.loaded_at is not None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload the snapshot from Neo4j if it changed or expired.
+
+        Returns:
+            True if the snapshot is usable (fresh or stale), False if it was never loaded
+        """
+        if not self._refresh_lock.acquire(blocking=self.loaded_at is None):
+            return True  # Another thread is already refreshing
+        return self._refresh_locked(force)
+
+    def _refresh_locked(self, force: bool = False) -> bool:
+        # Called with the refresh lock held; releases it
+        try:
+            now = time.time()
+            with self.driver_getter().session() as session:
+                token = session.execute_read(read_change_token)
+                expired = self.loaded_at is None or now - self.loaded_at > self.ttl_seconds
+                if force or expired or token != self.change_token:
+                    self._index(session.execute_read(_read_relations))
+                    self.change_token = token
+                    self.loaded_at = now
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"[WARN] Neo4j snapshot refresh failed, serving last snapshot: {e}")
+        finally:
+            self.checked_at = time.time()
+            self._refresh_lock.release()
+        return self.loaded_at is not None
+
+    def _index(self, relations):
+        treatments, analyses = {}, {}
+        for tumor, relation, target in relations:
+            if not tumor or not target:
+                continue
+            index = treatments if relation == "TRAITE_PAR" else analyses
+            bucket = index.setdefault(normalize_name(tumor), [])
+            if target not in bucket:
+                bucket.append(target)
+        # Swap whole dicts so readers never see a half-built index
+        self.treatments, self.analyses = treatments, analyses
+
+    def refresh_in_background(self):
+        """Start a refresh in a daemon thread unless one is already running."""
+        # The lock is taken here, so concurrent lookups start a single thread
+        if self._refresh_lock.acquire(blocking=False):
+            threading.Thread(target=self._refresh_locked, name="neo4j-snapshot", daemon=True).start()
+
+    def _refresh_if_due(self):
+        if self.checked_at is None or time.time() - self.checked_at > self.check_seconds:
+            self.refresh_in_background()
+        if self.loaded_at is None:
+            # Never loaded: wait for the running load (the refresh lock is
+            # released when it ends); once loaded, lookups never block
+            if self._refresh_lock.acquire(timeout=self.first_load_timeout):
+                self._refresh_lock.release()
+
+    def treatments_for(self, tumor_name: str) -> list:
+        """Treatments linked to a tumor type (French or English name)."""
+        self._refresh_if_due()
+        return list(self.treatments.get(normalize_name(tumor_name), []))
+
+    def analyses_for(self, tumor_name: str) -> list:
+        """Analyses that detect a tumor type (French or English name)."""
+        self._refresh_if_due()
+        return list(self.analyses.get(normalize_name(tumor_name), []))
+
+
+def _load_snapshot():
+    def driver_getter():
+        from neo4j_connector import driver
+        return driver
+
+    snapshot = TreatmentSnapshot(driver_getter)
+    snapshot.refresh_in_background()
+    return snapshot
+
+
+registry.register("treatment_snapshot", _load_snapshot)
+
+
+def get_snapshot() -> TreatmentSnapshot:
+    """Return the shared snapshot; its first load from Neo4j starts in the background."""
+    return registry.get("treatment_snapshot")
@@ -0,0 +1,308 @@
+# upload_store.py - Content-addressed store of uploaded MRI images
+"""Uploads are kept as raw bytes under their content hash and referenced as
+"upload:<hash>" strings, which travel through the pipeline in place of file
+paths. The classifier decodes them straight from memory.
+
+The store is bounded twice:
+    - memory: LRU of raw bytes (UPLOAD_STORE_MAX_MB)
+    - disk (UPLOAD_STORE_DIR): entries evicted from memory, or whose path is
+      requested with `pinned_path`, are written there; the oldest files are
+      deleted beyond UPLOAD_STORE_DISK_MAX_MB, except those in use
+"""
+import hashlib
+import os
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+UPLOAD_STORE_DIR = os.getenv("UPLOAD_STORE_DIR", os.path.join("temp", "uploads"))
+UPLOAD_STORE_MAX_MB = float(os.getenv("UPLOAD_STORE_MAX_MB", "256"))
+UPLOAD_STORE_DISK_MAX_MB = float(os.getenv("UPLOAD_STORE_DISK_MAX_MB", "1024"))
+
+REF_PREFIX = "upload:"
+KEY_LENGTH = 32  # Hex characters of the SHA-256 content hash
+IMAGE_SIGNATURES = {b"\x89PNG": ".png", b"\xff\xd8": ".jpg"}
+
+
+def content_key(data: bytes) -> str:
+    """Content hash of upload bytes, as used in "upload:<hash>" references."""
+    return hashlib.sha256(data).hexdigest()[:KEY_LENGTH]
+
+
+def file_content_key(path: str) -> str:
+    """`content_key` of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:KEY_LENGTH]
+
+
+def is_ref(source) -> bool:
+    """Check whether `source` is an "upload:<hash>" reference."""
+    return isinstance(source, str) and source.startswith(REF_PREFIX)
+
+
+def guess_extension(data: bytes, filename: str = None) -> str:
+    """File extension of an upload, from its name or else its signature."""
+    name = (filename or "").lower()
+    if name.endswith(".nii.gz"):
+        return ".nii.gz"
+    ext = os.path.splitext(name)[1]
+    if ext:
+        return ext
+    if data[344:347] == b"n+1":
+        return ".nii"
+    return next((e for sig, e in IMAGE_SIGNATURES.items() if data.startswith(sig)), ".png")
+
+
+class UploadStore:
+    """Bounded, content-addressed upload store (memory LRU spilling to disk).
+
+    Disk files are tracked in an in-memory index (filled once from the files
+    already in `directory`), so lookups and eviction never list the directory.
+    Files are written outside the lock, and files being read or handed out by
+    `pinned_path` are pinned: trimming the disk skips them.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, disk_max_bytes: int):
+        """
+        Args:
+            directory: Where entries are written when they leave memory
+            max_bytes: Memory budget of the raw upload bytes
+            disk_max_bytes: Disk budget of `directory`
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()  # key -> (bytes, extension)
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # key -> (path, size), least recently used first
+        self._disk_bytes = 0
+        self._spilling = {}  # key -> (bytes, extension) evicted from memory, being written
+        self._pins = Counter()  # key -> users of its disk file
+        self._lock = threading.Lock()
+        self._scan_disk()
+
+    def put(self, data: bytes, filename: str = None) -> str:
+        """Store upload bytes and return their "upload:<hash>" reference."""
+        data = bytes(data)
+        key = content_key(data)
+        spilled = []
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+            else:
+                self._memory[key] = (data, guess_extension(data, filename))
+                self._memory_bytes += len(data)
+                spilled = self._evict()
+        for evicted in spilled:
+            self._spill(*evicted)
+        return REF_PREFIX + key
+
+    def get(self, ref: str):
+        """Bytes of a reference, or None once it was evicted from memory and disk."""
+        key = ref[len(REF_PREFIX):] if is_ref(ref) else ref
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry[0]
+            entry = self._spilling.get(key)
+            if entry is not None:
+                return entry[0]
+            path = self._disk_path(key)
+            if path is None:
+                return None
+            self._pins[key] += 1
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # Keeps the LRU order across restarts
+        except OSError:
+            with self._lock:
+                self._forget_disk(key)  # Deleted behind our back
+            return None
+        finally:
+            with self._lock:
+                self._unpin(key)
+        return data
+
+    def contains(self, ref: str) -> bool:
+        """Check that a reference is still stored, without reading it."""
+        key = ref[len(REF_PREFIX):] if is_ref(ref) else ref
+        with self._lock:
+            return key in self._memory or key in self._spilling or key in self._disk
+
+    def extension(self, ref: str):
+        """Stored file extension of a reference (e.g. ".png", ".nii.gz"), or None."""
+        key = ref[len(REF_PREFIX):] if is_ref(ref) else ref
+        with self._lock:
+            entry = self._memory.get(key) or self._spilling.get(key)
+            if entry is not None:
+                return entry[1]
+            path = self._disk_path(key)
+        return os.path.basename(path)[len(key):] if path else None
+
+    @contextmanager
+    def pinned_path(self, ref: str):
+        """Path of a reference on disk, writing it there first if needed.
+
+        The file is not trimmed from the disk before the block exits.
+
+        Yields:
+            The file path, or None if the upload is no longer stored
+        """
+        key = ref[len(REF_PREFIX):] if is_ref(ref) else ref
+        with self._lock:
+            path = self._disk_path(key)
+            entry = self._memory.get(key) or self._spilling.get(key)
+            pinned = path is not None or entry is not None
+            if pinned:
+                self._pins[key] += 1
+        if not pinned:
+            yield None
+            return
+        try:
+            if path is None:
+                path = self._write(key, *entry)
+                with self._lock:
+                    self._add_disk(key, path, len(entry[0]))
+                    self._trim_disk()
+            yield path
+        finally:
+            with self._lock:
+                self._unpin(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def _evict(self) -> list:
+        # Called with the lock held. Returns the (key, bytes, extension)
+        # entries to write to disk; they stay readable from `_spilling` until
+        # `_spill` (outside the lock) has written them
+        spilled = []
+        while self._memory_bytes > self.max_bytes and len(self._memory) > 1:
+            key, (data, ext) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(data)
+            if key not in self._disk:
+                self._spilling[key] = (data, ext)
+                spilled.append((key, data, ext))
+        return spilled
+
+    def _spill(self, key: str, data: bytes, ext: str):
+        try:
+            path = self._write(key, data, ext)
+        except OSError as e:
+            print(f"[WARN] Could not write upload {key} to disk: {e}")
+            with self._lock:
+                self._spilling.pop(key, None)
+            return
+        with self._lock:
+            self._spilling.pop(key, None)
+            self._add_disk(key, path, len(data))
+            self._trim_disk()
+
+    def _write(self, key: str, data: bytes, ext: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, key + ext)
+        tmp_path = f"{path}.tmp{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def _scan_disk(self):
+        # Files left by an earlier run, least recently used first
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and ".tmp" not in entry.name and len(entry.name) > KEY_LENGTH:
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.name, entry.path, stat.st_size))
+        except OSError:
+            return
+        for _, name, path, size in sorted(entries):
+            self._add_disk(name[:KEY_LENGTH], path, size)
+
+    # The helpers below are called with the lock held
+
+    def _disk_path(self, key: str):
+        entry = self._disk.get(key)
+        if entry is None:
+            return None
+        self._disk.move_to_end(key)
+        return entry[0]
+
+    def _add_disk(self, key: str, path: str, size: int):
+        self._forget_disk(key)
+        self._disk[key] = (path, size)
+        self._disk_bytes += size
+
+    def _forget_disk(self, key: str):
+        entry = self._disk.pop(key, None)
+        if entry is not None:
+            self._disk_bytes -= entry[1]
+
+    def _unpin(self, key: str):
+        self._pins[key] -= 1
+        if self._pins[key] <= 0:
+            del self._pins[key]
+            # Pinned files may have kept the disk over budget
+            self._trim_disk()
+
+    def _trim_disk(self):
+        # Pinned files are skipped, and the most recently written file is kept
+        # even if it alone exceeds the budget. Deleting stays under the lock: a
+        # concurrent rewrite of the same key must not lose its new file
+        for key in list(self._disk):
+            if self._disk_bytes <= self.disk_max_bytes or len(self._disk) <= 1:
+                break
+            if key in self._pins:
+                continue
+            path, size = self._disk.pop(key)
+            self._disk_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+store = UploadStore(
+    UPLOAD_STORE_DIR,
+    max_bytes=int(UPLOAD_STORE_MAX_MB * 1024 * 1024),
+    disk_max_bytes=int(UPLOAD_STORE_DISK_MAX_MB * 1024 * 1024)
+)
+
+
+def resolve(source):
+    """Turn an upload reference into its bytes; paths and buffers pass through.
+
+    Raises:
+        FileNotFoundError: If the referenced upload was evicted
+    """
+    if not is_ref(source):
+        return source
+    data = store.get(source)
+    if data is None:
+        raise FileNotFoundError(f"Upload no longer stored: {source}")
+    return data
+
+
+def exists(source) -> bool:
+    """Check that an upload reference or a path can still be read."""
+    if is_ref(source):
+        return store.contains(source)
+    return isinstance(source, str) and os.path.exists(source)
+
+
+def display_name(source) -> str:
+    """Short name of an upload reference or a path, for logs and spans."""
+    return source if is_ref(source) else os.path.basename(str(source))
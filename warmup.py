@@ -0,0 +1,176 @@
+# warmup.py - Boot-time warm-up of the LLM, the VGG19 model and the agents
+"""Make the first analysis after a deploy or an idle period as fast as the
+following ones.
+
+`start()` runs, in a background thread:
+    - agents: imports CrewAI and fills the agent pool (one set of agents per
+      worker) and the shared LLM clients
+    - knowledge: builds the medical knowledge index
+    - classifier: loads the VGG19 model and runs a dummy forward pass
+      (graph tracing / interpreter allocation happen here, not on a scan)
+    - llm: loads the Ollama model with a long keep-alive and sends a short
+      warm-up prompt
+
+Ollama unloads a model `keep_alive` after its last request, and every
+request resets that timer to the server default (5 minutes) unless it sets
+its own. LiteLLM does not forward keep_alive on /api/generate, so a
+background thread re-sends an empty load request with OLLAMA_KEEP_ALIVE
+every OLLAMA_KEEPALIVE_INTERVAL seconds.
+
+`readiness()` reports the state of each component for /readyz and the UI.
+"""
+import json
+import os
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+import registry
+
+# How long Ollama keeps the model loaded after a request ("-1" = forever)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Seconds between keep-alive refreshes (0 disables them)
+OLLAMA_KEEPALIVE_INTERVAL = float(os.getenv("OLLAMA_KEEPALIVE_INTERVAL", "240"))
+WARMUP_PROMPT = "Reply with the single word OK."
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "300"))
+
+COMPONENTS = ("agents", "knowledge", "classifier", "llm")
+
+_status = {name: {"state": "pending", "seconds": None, "error": None} for name in COMPONENTS}
+_status_lock = threading.Lock()
+_started = False
+_warmup_thread = None
+_keepalive_thread = None
+
+
+def _ollama_request(payload: dict) -> dict:
+    from config import LLM_BASE_URL
+    request = urllib.request.Request(
+        LLM_BASE_URL.rstrip("/") + "/api/generate",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=WARMUP_TIMEOUT) as response:
+        return json.loads(response.read() or b"{}")
+
+
+def _ollama_model() -> str:
+    from config import LLM_MODEL
+    return LLM_MODEL.split("/", 1)[-1]
+
+
+def preload_ollama():
+    """Load the Ollama model with OLLAMA_KEEP_ALIVE and run a warm-up prompt."""
+    model = _ollama_model()
+    # An empty prompt only loads the model
+    _ollama_request({"model": model, "prompt": "", "keep_alive": OLLAMA_KEEP_ALIVE, "stream": False})
+    _ollama_request({
+        "model": model,
+        "prompt": WARMUP_PROMPT,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "stream": False,
+        "options": {"num_predict": 4},
+    })
+
+
+def warm_classifier():
+    """Load the VGG19 model and run one dummy batch through the inference queue."""
+    from tools.classifier_tool import get_classifier_model, inference_queue
+    if get_classifier_model() is None:
+        raise RuntimeError("VGG19 model unavailable")
+    inference_queue.predict(np.zeros((1, 224, 224, 3), dtype=np.float32))
+
+
+def warm_agents():
+    """Fill the agent pool: one set of agents per worker, and their LLM clients."""
+    import crew.tasks  # CrewAI, the tools and the task module
+    from crew.agents import get_agent_pool
+    get_agent_pool().prefill()
+
+
+def warm_knowledge():
+    from tools.medical_knowledge_tool import get_knowledge_index
+    get_knowledge_index()
+
+
+def _set(name: str, **fields):
+    with _status_lock:
+        _status[name].update(fields)
+
+
+def _run_step(name: str, step):
+    _set(name, state="loading")
+    start = time.perf_counter()
+    try:
+        step()
+    except Exception as e:
+        _set(name, state="failed", seconds=time.perf_counter() - start, error=str(e))
+        print(f"[WARN] Warm-up of {name} failed: {e}")
+        return False
+    _set(name, state="ready", seconds=time.perf_counter() - start)
+    registry.record(f"warm-up {name}", time.perf_counter() - start)
+    return True
+
+
+def _keep_alive_loop():
+    while True:
+        time.sleep(OLLAMA_KEEPALIVE_INTERVAL)
+        try:
+            _ollama_request({"model": _ollama_model(), "prompt": "", "keep_alive": OLLAMA_KEEP_ALIVE, "stream": False})
+        except Exception as e:
+            print(f"[WARN] Ollama keep-alive failed: {e}")
+
+
+def _start_keep_alive():
+    global _keepalive_thread
+    if OLLAMA_KEEPALIVE_INTERVAL <= 0:
+        return
+    if _keepalive_thread is None or not _keepalive_thread.is_alive():
+        _keepalive_thread = threading.Thread(target=_keep_alive_loop, name="ollama-keepalive", daemon=True)
+        _keepalive_thread.start()
+
+
+def _run():
+    _run_step("agents", warm_agents)
+    _run_step("knowledge", warm_knowledge)
+    _run_step("classifier", warm_classifier)
+    if registry.is_overridden("llm"):
+        # Stub LLM: there is no Ollama model to load
+        _set("llm", state="skipped")
+    elif _run_step("llm", preload_ollama):
+        _start_keep_alive()
+
+
+def start(background: bool = True):
+    """Warm every component once per process.
+
+    Args:
+        background: Run in a daemon thread instead of blocking the caller
+
+    Returns:
+        The warm-up thread when running in background, None otherwise
+    """
+    global _started, _warmup_thread
+    _started = True
+    if not background:
+        _run()
+        return None
+    with _status_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_run, name="warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+def readiness() -> dict:
+    """Warm-up state of each component; ready once all are ready (or skipped)."""
+    with _status_lock:
+        components = {name: dict(status) for name, status in _status.items()}
+    return {
+        "ready": all(c["state"] in ("ready", "skipped") for c in components.values()),
+        "started": _started,
+        "components": components,
+    }